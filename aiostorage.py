@@ -0,0 +1,136 @@
+# ==================================================
+# ASYNC STORAGE
+# Coroutine counterparts of storage.py for the ASGI mode
+# (asgi.py). MySQL goes through aiomysql's pool; SQLite has
+# no non-blocking driver, so its calls run on a small thread
+# pool over the regular SQLiteBackend.
+# ==================================================
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiomysql    # optional: pip install aiomysql
+except ImportError:
+    aiomysql = None
+
+from pool import PoolTimeout
+from storage import SQLiteBackend
+
+
+class AsyncMySQLBackend:
+    dialect = "mysql"
+
+    def __init__(self, config, size=10, timeout=5.0, recycle=1800):
+        if aiomysql is None:
+            raise RuntimeError("DB_BACKEND=mysql in ASGI mode needs the aiomysql package")
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pool = None
+        self._lock = asyncio.Lock()
+        self._timeouts = 0
+
+    async def _pool(self):
+        if self.pool is None:
+            async with self._lock:
+                if self.pool is None:
+                    config = dict(self.config)
+                    config["db"] = config.pop("database")
+                    # Autocommit: a pooled connection never keeps an old
+                    # REPEATABLE READ snapshot between requests
+                    self.pool = await aiomysql.create_pool(
+                        minsize=1, maxsize=self.size, pool_recycle=self.recycle,
+                        autocommit=True, **config,
+                    )
+        return self.pool
+
+    async def _acquire(self):
+        pool = await self._pool()
+        try:
+            return await asyncio.wait_for(pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(f"No connection available within {self.timeout}s")
+
+    async def fetchall(self, sql, params=()):
+        # -> (column names, row tuples)
+        conn = await self._acquire()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, tuple(params))
+                rows = list(await cur.fetchall())
+                return [c[0] for c in cur.description], rows
+        finally:
+            self.pool.release(conn)
+
+    async def fetchone(self, sql, params=()):
+        columns, rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def execute(self, sql, params=()):
+        conn = await self._acquire()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, tuple(params))
+                return cur.rowcount
+        finally:
+            self.pool.release(conn)
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    def stats(self):
+        pool = self.pool
+        return {
+            "backend": "aiomysql",
+            "size": self.size,
+            "open": pool.size if pool else 0,
+            "idle": pool.freesize if pool else 0,
+            "timeouts": self._timeouts,
+        }
+
+
+class AsyncSQLiteBackend:
+    dialect = "sqlite"
+
+    def __init__(self, path, pragmas=None, timeout=5.0, threads=4):
+        # One cached connection per pool thread
+        self.backend = SQLiteBackend(path, pragmas=pragmas, timeout=timeout, max_idle=1)
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="sqlite")
+
+    def _fetchall(self, sql, params):
+        with self.backend.acquire() as db:
+            cur = db.cursor()
+            cur.execute(sql, params)
+            return [c[0] for c in cur.description], cur.fetchall()
+
+    def _execute(self, sql, params):
+        with self.backend.acquire() as db:
+            cur = db.cursor()
+            cur.execute(sql, params)
+            db.commit()
+            return cur.rowcount
+
+    async def fetchall(self, sql, params=()):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._fetchall, sql, tuple(params))
+
+    async def fetchone(self, sql, params=()):
+        columns, rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def execute(self, sql, params=()):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._execute, sql, tuple(params))
+
+    async def close(self):
+        self.executor.shutdown(wait=True)
+
+    def stats(self):
+        return {**self.backend.stats(), "threads": self.threads}
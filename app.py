@@ -4,130 +4,1212 @@
 # Restaurant-style clean structure
 # ==================================================
 
-from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for
-from flask_bcrypt import Bcrypt
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, g, has_app_context, has_request_context, stream_with_context
+from flask import before_render_template, template_rendered
+from flask.cli import AppGroup
+from contextlib import contextmanager
 from functools import wraps
+import base64
 import datetime
+import hashlib
+import json
+import threading
+import time
+import os
+import random
+import tempfile
+import click
+import csv
+import io
+import zlib
 import jwt
-import mysql.connector
+from jinja2 import FileSystemBytecodeCache
 import xml.etree.ElementTree as ET
 from mysql.connector import Error
+from config import Config
+from pool import PoolTimeout
+from search_index import SearchIndex
+from catalog import CatalogSnapshot
+from suggest import SuggestIndex
+from facets import FacetCounts
+from cache import LocalBackend, LRUCache, ResponseCache, SharedBackend
+from compression import compress, negotiate, precompress
+from formats import MIMETYPES, TABULAR, available, pack, table
+from hashing import HashQueueFull, PasswordHasher
+from metrics import COUNT_BUCKETS, Registry, TimedConnection
+from profiler import ProfileStore, Sampler
+from importer import CatalogImporter, detect_format, iter_file
+import migrate
+from replicas import ReplicaRouter
+from storage import MySQLBackend, SQLiteBackend
+
+try:
+    import redis    # optional: shared response cache across workers
+except ImportError:
+    redis = None
 
 
 # ==================================================
 # APP SETUP
 # ==================================================
 app = Flask(__name__)
-bcrypt = Bcrypt(app)
-app.config.update(SECRET_KEY="supersecretkey", JWT_EXP_HOURS=2)
+app.config.from_object(Config)      # DB_BACKEND, SQLITE_PATH, MYSQL_* (env overridable)
+app.config.update(
+    SECRET_KEY="supersecretkey", JWT_EXP_HOURS=2,
+    DB_POOL_SIZE=10,        # max open connections per process
+    DB_POOL_TIMEOUT=5,      # seconds to wait for a free connection before 503
+    DB_POOL_RECYCLE=1800,   # reconnect connections older than this (seconds)
+    SQLITE_PRAGMAS={},      # overrides for storage.SQLITE_PRAGMAS
+    REPLICA_STRATEGY="round_robin",   # or "least_latency"
+    REPLICA_MAX_LAG=5,      # seconds behind the primary before a replica is skipped
+    REPLICA_CHECK_INTERVAL=10,        # seconds between replica health / lag checks
+    READ_YOUR_WRITES=5,     # seconds a session reads from the primary after it writes
+    ASGI_THREADS=16,        # threads running the plain Flask routes under asgi.py
+    ASGI_DB_THREADS=4,      # SQLite calls under asgi.py (aiomysql uses DB_POOL_SIZE)
+    METRICS_ENABLED=False,  # per-route / per-stage timings at /metrics
+    PROFILE_SAMPLE_RATE=0.0,          # fraction of requests to profile
+    PROFILE_HEADER="X-Profile",       # "X-Profile: 1" profiles one request ...
+    PROFILE_ADMINS=[],                # ... when the token's user is listed here
+    PROFILE_INTERVAL=0.005,           # seconds between stack samples
+    PROFILE_MAX_CONCURRENT=4,         # requests sampled at once; extra ones are skipped
+    PROFILE_DIR=os.path.join(app.instance_path, "profiles"),
+    PROFILE_KEEP=200,                 # newest .folded files kept in PROFILE_DIR
+    COMPRESS_ENABLED=True,  # gzip / deflate / br (with the brotli package) by Accept-Encoding
+    COMPRESS_MIN_SIZE=1024, # bytes; smaller bodies aren't worth the CPU
+    COMPRESS_LEVELS={       # zlib-scale level per content type, for uncached responses
+        "application/json": 6,
+        "application/x-ndjson": 6,
+        "application/x-msgpack": 6,
+        "application/vnd.library.columnar+json": 6,
+        "application/xml": 4,   # tag soup shrinks ~8x already at 4; 6+ mostly costs CPU
+        "text/html": 4,
+        "text/csv": 6,
+        "text/plain": 6,
+    },
+    COMPRESS_CACHED_LEVEL=9,          # cached bodies are compressed once, so use the max
+    PAGE_SIZE=50,           # default ?limit= for list endpoints
+    PAGE_MAX=500,           # upper bound for ?limit=
+    STREAM_BATCH=500,       # rows pulled per fetchmany() when streaming
+    CATALOG_SNAPSHOT=False, # serve /books, /authors, /books/<id> from memory (catalog.py)
+    CATALOG_RECONCILE_INTERVAL=30,    # seconds between checks against catalog_meta
+    CATALOG_VERSION_TTL=1,  # seconds the suggest / facet / search indexes trust their last catalog_meta read
+    SUGGEST_LIMIT=10,       # default suggestions per /books/suggest response
+    CACHE_ENABLED=True,     # response cache for catalog reads
+    CACHE_SIZE=1024,        # max cached responses per process
+    CACHE_TTL=60,           # seconds
+    CACHE_REDIS_URL=None,   # e.g. "redis://localhost:6379/0" to share across workers
+    BCRYPT_LOG_ROUNDS=12,   # cost factor; older hashes are upgraded on login
+    HASH_WORKERS=2,         # bcrypt processes (0 = run inline)
+    HASH_QUEUE_MAX=32,      # queued + running hash jobs before 429
+    HASH_TIMEOUT=10,        # seconds
+    TOKEN_CACHE_SIZE=10000, # verified JWTs kept in memory
+    TOKEN_CACHE_TTL=300,    # cap for tokens without an exp claim
+    SEND_FILE_MAX_AGE_DEFAULT=31536000,   # static files are versioned, cache for a year
+    IMPORT_CHUNK_SIZE=1000, # rows per executemany() + commit during bulk import
+    BATCH_MAX_OPS=1000,     # operations per /books/batch or /authors/batch request
+    BATCH_MODE="atomic",    # "atomic": all or nothing, "partial": apply what succeeds
+    LOAN_BATCH_MAX=50,      # copies per /loans/checkout request
+    LOAN_RETRIES=3,         # attempts when a checkout / return hits a lock timeout or deadlock
+    IDEMPOTENCY_TTL=86400,  # seconds an Idempotency-Key is remembered
+)
+
+# ==================================================
+# TEMPLATES + STATIC
+# ==================================================
+# Compiled templates are kept in memory by Jinja; the bytecode
+# cache also skips compiling them again after a restart. No directory
+# argument: Jinja then uses a per-user 0700 one and checks its owner,
+# so nobody else can plant bytecode for it to load.
+app.jinja_options = {
+    **app.jinja_options,
+    "bytecode_cache": FileSystemBytecodeCache(),
+}
+
+_static_versions = {}
+
+def static_url(filename):
+    # ?v=<content hash> lets the browser cache the file for a year
+    if filename not in _static_versions:
+        with open(os.path.join(app.static_folder, filename), "rb") as fh:
+            _static_versions[filename] = hashlib.sha1(fh.read()).hexdigest()[:12]
+    return url_for("static", filename=filename, v=_static_versions[filename])
+
+app.jinja_env.globals["static_url"] = static_url
+
+# Compile the page templates once at startup
+for _name in ("books.html", "authors.html", "search.html"):
+    app.jinja_env.get_template(_name)
 
 # ==================================================
 # DATABASE CONFIG
 # ==================================================
 DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "root",
-    "database": "library_db"
+    "host": app.config["MYSQL_HOST"],
+    "user": app.config["MYSQL_USER"],
+    "password": app.config["MYSQL_PASSWORD"],
+    "database": app.config["MYSQL_DB"],
 }
 
+def mysql_config(target):
+    # DB_CONFIG pointed at target ("db2" / "db2:3307"), if given
+    config = dict(DB_CONFIG)
+    if target:
+        host, _, port = target.partition(":")
+        config["host"] = host
+        if port:
+            config["port"] = int(port)
+    return config
+
+def make_backend(target):
+    # target: MySQL host ("db2" / "db2:3307") or SQLite path
+    if app.config["DB_BACKEND"] == "sqlite":
+        return SQLiteBackend(
+            target or app.config["SQLITE_PATH"],
+            pragmas=app.config["SQLITE_PRAGMAS"],
+            timeout=app.config["DB_POOL_TIMEOUT"],
+        )
+    if app.config["DB_BACKEND"] == "mysql":
+        return MySQLBackend(
+            mysql_config(target),
+            size=app.config["DB_POOL_SIZE"],
+            timeout=app.config["DB_POOL_TIMEOUT"],
+            recycle=app.config["DB_POOL_RECYCLE"],
+        )
+    raise ValueError(f"unknown DB_BACKEND {app.config['DB_BACKEND']!r}")
+
+_storage = None
+_router = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = make_backend(None)
+    return _storage
+
+def get_router():
+    # None when no DB_REPLICAS are configured
+    global _router
+    if _router is None and app.config["DB_REPLICAS"]:
+        primary = get_storage()
+        with _storage_lock:
+            if _router is None:
+                _router = ReplicaRouter(
+                    primary,
+                    [(target, make_backend(target)) for target in app.config["DB_REPLICAS"]],
+                    strategy=app.config["REPLICA_STRATEGY"],
+                    max_lag=app.config["REPLICA_MAX_LAG"],
+                    check_interval=app.config["REPLICA_CHECK_INTERVAL"],
+                )
+    return _router
+
 def get_db():
-    return mysql.connector.connect(**DB_CONFIG)
+    # db.close() hands the connection back to the pool / thread cache.
+    # Inside @read_replica routes reads go to a replica when one is usable.
+    start = time.perf_counter()
+    router = get_router()
+    if router and has_request_context() and g.get("db_read_only") and not wrote_recently():
+        db, replica = router.acquire()
+        g.db_replica = g.get("db_replica") or replica is not None
+    else:
+        db = get_storage().acquire()
+    if timing_request():
+        record_stage("db_connect", time.perf_counter() - start)
+        db = TimedConnection(db, record_stage)
+    if has_app_context():
+        g.setdefault("db_conns", []).append(db)
+    return db
+
+@app.teardown_appcontext
+def release_db(exc):
+    # Safety net for routes that bail out before db.close()
+    for db in g.pop("db_conns", []):
+        db.close()
+
+def db_busy():
+    resp = jsonify({"error": "Database busy, try again shortly"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "1"
+    return resp
+
+@app.errorhandler(PoolTimeout)
+def pool_exhausted(e):
+    return db_busy()
+
+def read_replica(f):
+    # Marks a route as read-only so get_db() may use a replica
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.db_read_only = True
+        return f(*args, **kwargs)
+    return decorated
+
+def token_user():
+    # The user the request's JWT was issued to, if token_required checked one
+    claims = g.get("claims") if has_request_context() else None
+    return claims.get("user") if claims else None
+
+def note_write():
+    # Read-your-writes: this user (by token) and this session read from the
+    # primary for a while. The cookie covers other workers; the token covers
+    # clients that don't keep cookies.
+    router = get_router()
+    if router is None:
+        return
+    router.note_write(token_user(), app.config["READ_YOUR_WRITES"])
+    if has_request_context():
+        session["db_wrote_at"] = time.time()
+
+def wrote_recently():
+    if get_router().user_wrote_recently(token_user()):
+        return True
+    wrote_at = session.get("db_wrote_at")
+    return wrote_at is not None and time.time() - wrote_at < app.config["READ_YOUR_WRITES"]
 
 # ==================================================
 # DB INIT
 # ==================================================
 
 def init_db():
-    db = get_db(); cur = db.cursor()
+    # Schema lives in migrations/; this applies anything pending
+    db = get_db()
+    try:
+        migrate.upgrade(db, log=print)
+    finally:
+        db.close()
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        username VARCHAR(100) UNIQUE,
-        password VARCHAR(255)
-    )""")
+db_cli = AppGroup("db", help="Schema migrations.")
+app.cli.add_command(db_cli)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS authors (
-        author_id INT AUTO_INCREMENT PRIMARY KEY,
-        first_name VARCHAR(100),
-        last_name VARCHAR(100)
-    )""")
+@db_cli.command("upgrade")
+@click.option("--target", type=int, help="Stop after this version.")
+def db_upgrade(target):
+    """Apply pending migrations."""
+    db = get_db()
+    try:
+        if not migrate.upgrade(db, target, click.echo):
+            click.echo("Already up to date.")
+    finally:
+        db.close()
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS books (
-        book_id INT AUTO_INCREMENT PRIMARY KEY,
-        title VARCHAR(255),
-        author_id INT,
-        genre VARCHAR(100),
-        publish_year INT,
-        available_copies INT,
-        date_added DATE,
-        FOREIGN KEY (author_id) REFERENCES authors(author_id)
-    )""")
+@db_cli.command("downgrade")
+@click.option("--target", type=int, help="Revert everything newer than this version.")
+def db_downgrade(target):
+    """Revert migrations (the latest one by default)."""
+    db = get_db()
+    try:
+        if target is None:
+            applied = [m["version"] for m in migrate.status(db) if m["applied"]]
+            target = applied[-2] if len(applied) > 1 else 0
+        migrate.downgrade(db, target, click.echo)
+    finally:
+        db.close()
+
+@db_cli.command("status")
+def db_status():
+    """List migrations and whether they are applied."""
+    db = get_db()
+    try:
+        for m in migrate.status(db):
+            click.echo(f"[{'x' if m['applied'] else ' '}] {m['version']:04d}_{m['name']}")
+    finally:
+        db.close()
+
+@db_cli.command("prune-keys")
+def db_prune_keys():
+    """Delete Idempotency-Key records older than IDEMPOTENCY_TTL."""
+    db = get_db()
+    try:
+        cur = db.cursor()
+        cur.execute("DELETE FROM idempotency_keys WHERE created_at < %s", (idempotency_cutoff(),))
+        db.commit()
+        click.echo(f"Deleted {cur.rowcount} key(s).")
+    finally:
+        db.close()
+
+@db_cli.command("check-indexes")
+def db_check_indexes():
+    """EXPLAIN the hot catalog queries; exit 1 if one can't use its index."""
+    db = get_db()
+    try:
+        results = migrate.check_indexes(db)
+    finally:
+        db.close()
+    for r in results:
+        click.echo(f"{'ok  ' if r['ok'] else 'FAIL'} {r['query']}: wants {r['index']}, usable {r['usable']}")
+    if not all(r["ok"] for r in results):
+        raise click.exceptions.Exit(1)
+
+# ==================================================
+# PASSWORD HASHING
+# ==================================================
 
-    db.commit(); db.close()
+_hasher = None
+_hasher_lock = threading.Lock()
+
+def get_hasher():
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher(
+                    rounds=app.config["BCRYPT_LOG_ROUNDS"],
+                    workers=app.config["HASH_WORKERS"],
+                    max_queue=app.config["HASH_QUEUE_MAX"],
+                    timeout=app.config["HASH_TIMEOUT"],
+                )
+    return _hasher
+
+@app.errorhandler(HashQueueFull)
+def hash_queue_full(e):
+    # Also HashTimeout: a job that waited out HASH_TIMEOUT behind a full pool
+    resp = jsonify({"error": "Too many login attempts in progress, try again shortly"})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = "1"
+    return resp
 
 # ==================================================
 # XML + RESPONSE HELPER
 # ==================================================
 
-def to_xml(data, root="items"):
+def xml_item(row, parent=None, tag="item"):
+    # Nested dicts become child elements, lists of dicts <k><item/>...</k>
+    item = ET.Element(tag) if parent is None else ET.SubElement(parent, tag)
+    for k, v in row.items():
+        if isinstance(v, dict):
+            xml_item(v, item, k)
+        elif isinstance(v, list):
+            child = ET.SubElement(item, k)
+            for entry in v:
+                xml_item(entry, child)
+        else:
+            ET.SubElement(item, k).text = str(v)
+    return item
+
+
+def to_xml(data, root="items", meta=None):
+    # A single dict (detail views) becomes <root><field/>...</root>
+    if isinstance(data, dict):
+        root_el = xml_item(data)
+        root_el.tag = root
+        return ET.tostring(root_el, encoding="utf-8")
+
     root_el = ET.Element(root)
+    for k, v in (meta or {}).items():
+        if v is not None:
+            root_el.set(k, str(v))
     for row in data:
-        item = ET.SubElement(root_el, "item")
-        for k, v in row.items():
-            ET.SubElement(item, k).text = str(v)
+        xml_item(row, root_el)
     return ET.tostring(root_el, encoding="utf-8")
 
 
-def respond(data, root="items"):
+class NotAcceptable(Exception):
+    pass
+
+@app.errorhandler(NotAcceptable)
+def not_acceptable(e):
+    return jsonify({"error": str(e)}), 406
+
+# Accept types that mean "data, not a page" (browsers list application/xml too)
+DATA_TYPES = ("application/json", MIMETYPES["msgpack"], MIMETYPES["columnar"])
+
+def response_format():
+    # "html" unless the client asked for data (?format= or a data type in Accept)
+    accept = request.headers.get("Accept", "").lower()
+    if not (request.args.get("format") or any(t in accept for t in DATA_TYPES)):
+        return "html"
+    return data_format()
+
+
+def data_format():
+    # Explicit ?format= wins, then the Accept header; JSON otherwise
     fmt = request.args.get("format", "").lower()
+    if fmt in MIMETYPES:
+        if not available(fmt):
+            raise NotAcceptable(f"format={fmt} is not available on this server")
+        return fmt
     accept = request.headers.get("Accept", "").lower()
+    for fmt in ("msgpack", "columnar", "xml"):
+        if MIMETYPES[fmt] in accept and available(fmt):
+            return fmt
+    return "json"
+
+
+def as_dicts(columns, rows):
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def encode_table(fmt, columns, rows, root, meta):
+    # msgpack sends row arrays unless ?layout=columns; columnar is always by column
+    layout = "columns" if fmt == "columnar" or request.args.get("layout") == "columns" else "rows"
+    body = table(columns, rows, root, meta, layout)
+    if fmt == "msgpack":
+        return app.response_class(pack(body), mimetype=MIMETYPES["msgpack"])
+    return app.response_class(app.json.dumps(body, separators=(",", ":")), mimetype=MIMETYPES["columnar"])
+
+
+def respond(data, root="items", meta=None, columns=None):
+    # meta (e.g. next_cursor) wraps JSON as {root: [...], **meta}
+    # and becomes attributes on the XML root element. columns names
+    # the fields of a list's items, so an empty list keeps its header
+    with stage("serialize"):
+        fmt = data_format()
+        if fmt == "xml":
+            return app.response_class(
+                to_xml(data, root, meta),
+                mimetype="application/xml"
+            )
+
+        if fmt in TABULAR and isinstance(data, list):
+            columns = list(data[0]) if data else list(columns or [])
+            return encode_table(fmt, columns, [tuple(row.values()) for row in data], root, meta)
+
+        if fmt == "msgpack":
+            return app.response_class(
+                pack(data if meta is None else {root: data, **meta}),
+                mimetype=MIMETYPES["msgpack"]
+            )
+
+        return jsonify(data if meta is None else {root: data, **meta})
+
+
+def respond_rows(columns, rows, root="items", meta=None):
+    # Fast path for cursor tuples: the tabular formats encode them
+    # as they are, dicts are only built for JSON / XML
+    with stage("serialize"):
+        fmt = data_format()
+        if fmt in TABULAR:
+            return encode_table(fmt, columns, rows, root, meta)
+        data = as_dicts(columns, rows)
+    return respond(data, root, meta)
+
+
+# ==================================================
+# STREAMING (large result sets)
+# ==================================================
+
+def wants_stream():
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def iter_batches(cur):
+    while True:
+        rows = cur.fetchmany(app.config["STREAM_BATCH"])
+        if not rows:
+            return
+        yield rows
+
+
+def stream_query(sql, params=()):
+    # Runs the query up front (so pool/SQL errors still get a proper status)
+    # and returns a generator of row batches read from an unbuffered cursor.
+    db = get_db()
+    cur = db.cursor(dictionary=True)
+    try:
+        cur.execute(sql, params)
+    except Exception:
+        db.close()
+        raise
 
-    # Explicit XML
+    def batches():
+        try:
+            yield from iter_batches(cur)
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+            db.close()
+
+    return batches()
+
+
+def stream_json(batches, root):
+    yield '{"%s":[' % root
+    first = True
+    for rows in batches:
+        chunk = ",".join(app.json.dumps(row) for row in rows)
+        yield chunk if first else "," + chunk
+        first = False
+    yield '],"next_cursor":null}'
+
+
+def stream_xml(batches, root):
+    yield f"<{root}>"
+    for rows in batches:
+        yield "".join(ET.tostring(xml_item(row), encoding="unicode") for row in rows)
+    yield f"</{root}>"
+
+
+def respond_stream(batches, root="items"):
+    # Same envelope as respond(), written chunk by chunk
+    fmt = data_format()
+    if fmt in TABULAR:
+        raise BadQuery("stream=1 supports format=json and format=xml only")
     if fmt == "xml":
-        return app.response_class(
-            to_xml(data, root),
-            mimetype="application/xml"
-        )
+        body, mimetype = stream_xml(batches, root), "application/xml"
+    else:
+        body, mimetype = stream_json(batches, root), "application/json"
+    return app.response_class(stream_with_context(body), mimetype=mimetype)
 
-    # Explicit JSON
-    if fmt == "json":
-        return jsonify(data)
 
-    # Header-based fallback
-    if "application/xml" in accept:
-        return app.response_class(
-            to_xml(data, root),
-            mimetype="application/xml"
-        )
+# ==================================================
+# PAGINATION + FILTERS (keyset)
+# ==================================================
 
-    return jsonify(data)
+class BadQuery(Exception):
+    pass
+
+@app.errorhandler(BadQuery)
+def bad_query(e):
+    return jsonify({"error": str(e)}), 400
+
+# Only indexed columns are sortable; the id breaks ties
+BOOK_SORTS = {"book_id": "b.book_id", "title": "b.title", "publish_year": "b.publish_year"}
+AUTHOR_SORTS = {"author_id": "author_id", "last_name": "last_name"}
+
+def int_arg(name):
+    raw = request.args.get(name, "").strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise BadQuery(f"'{name}' must be an integer")
+
+def page_limit():
+    limit = int_arg("limit") or app.config["PAGE_SIZE"]
+    return max(1, min(limit, app.config["PAGE_MAX"]))
+
+def sort_args(sorts, default):
+    sort = request.args.get("sort", default)
+    if sort not in sorts:
+        raise BadQuery(f"'sort' must be one of: {', '.join(sorts)}")
+    return sort, request.args.get("order", "asc").lower() == "desc"
+
+def make_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def encode_cursor(row, sort, id_key):
+    return make_cursor([row[id_key]] if sort == id_key else [row[sort], row[id_key]])
+
+def decode_cursor():
+    raw = request.args.get("cursor", "").strip()
+    if not raw:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)))
+    except ValueError:
+        raise BadQuery("Invalid cursor")
+    if not isinstance(values, list) or not values or not isinstance(values[-1], int):
+        raise BadQuery("Invalid cursor")
+    return values
+
+def keyset(sort_col, id_col, cursor, desc):
+    # WHERE fragment resuming after the cursor row.
+    # NULL sort values come first ascending / last descending (MySQL order).
+    if cursor is None:
+        return None, []
+    op = "<" if desc else ">"
+    if sort_col == id_col:
+        if len(cursor) != 1:
+            raise BadQuery("Cursor does not match sort")
+        return f"{id_col} {op} %s", cursor
+    if len(cursor) != 2:
+        raise BadQuery("Cursor does not match sort")
+
+    value, last_id = cursor
+    if value is None:
+        if desc:
+            return f"({sort_col} IS NULL AND {id_col} < %s)", [last_id]
+        return f"({sort_col} IS NOT NULL OR {id_col} > %s)", [last_id]
+    clause = f"{sort_col} {op} %s OR ({sort_col} = %s AND {id_col} {op} %s)"
+    if desc:
+        clause += f" OR {sort_col} IS NULL"
+        return f"({clause})", [value, value, last_id]
+    # The redundant bound gives the planner a range on the sort column's
+    # index; without it SQLite may sort the whole join instead
+    return f"({sort_col} >= %s AND ({clause}))", [value, value, value, last_id]
+
+def order_by(sort_col, id_col, desc):
+    direction = "DESC" if desc else "ASC"
+    if sort_col == id_col:
+        return f"{id_col} {direction}"
+    return f"{sort_col} {direction}, {id_col} {direction}"
+
+def where_sql(where):
+    return "WHERE " + " AND ".join(where) if where else ""
+
+def book_filter_args():
+    # ?author=12 matches the id, ?author=Orw matches a last-name prefix
+    author = request.args.get("author", "").strip()
+    return {
+        "genre": request.args.get("genre", "").strip() or None,
+        "year_from": int_arg("year_from"),
+        "year_to": int_arg("year_to"),
+        "author_id": int(author) if author.isdigit() else None,
+        "author_prefix": author if author and not author.isdigit() else None,
+    }
+
+def book_filters():
+    where, params = [], []
+    f = book_filter_args()
+
+    if f["genre"]:
+        where.append("b.genre = %s"); params.append(f["genre"])
+    if f["year_from"] is not None:
+        where.append("b.publish_year >= %s"); params.append(f["year_from"])
+    if f["year_to"] is not None:
+        where.append("b.publish_year <= %s"); params.append(f["year_to"])
+    if f["author_id"] is not None:
+        where.append("b.author_id = %s"); params.append(f["author_id"])
+    elif f["author_prefix"]:
+        prefix = f["author_prefix"].replace("!", "!!").replace("%", "!%").replace("_", "!_")
+        where.append("a.last_name LIKE %s ESCAPE '!'"); params.append(prefix + "%")
+
+    return where, params
+
+def check_cursor(cursor, sort, id_key):
+    # keyset() does the same for the SQL path
+    if cursor is not None and len(cursor) != (1 if sort == id_key else 2):
+        raise BadQuery("Cursor does not match sort")
+
+def next_page(rows, limit, sort, id_key, columns=None):
+    # Rows were fetched with LIMIT limit+1; trims the probe row.
+    # Tuple rows come with their column names.
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1] if columns is None else dict(zip(columns, rows[-1]))
+    return encode_cursor(last, sort, id_key)
+
+def page_url(endpoint, cursor):
+    if cursor is None:
+        return None
+    return url_for(endpoint, **dict(request.args.to_dict(), cursor=cursor))
 
 
 # ==================================================
-# JWT DECORATOR
+# SEARCH INDEX
 # ==================================================
 
-def token_required(f):
+SEARCH_SQL = """
+    SELECT b.book_id, b.title,
+           CONCAT(a.first_name,' ',a.last_name) AS author,
+           b.genre, b.publish_year
+    FROM books b
+    JOIN authors a ON b.author_id=a.author_id
+"""
+
+SEARCH_COLUMNS = ("book_id", "title", "author", "genre", "publish_year", "score")
+
+search_index = SearchIndex()
+_search_lock = threading.Lock()
+
+def get_search_index():
+    # Built on first use and kept current by the write routes; reloaded
+    # once catalog_meta moved without them seeing it (other processes,
+    # imports, direct SQL), like get_facets()
+    version = known_version()
+    if index_behind(search_index, version):
+        with _search_lock:
+            if index_behind(search_index, version):
+                snapshot = get_catalog()
+                if snapshot is not None:
+                    version = snapshot.version
+                    search_index.load(snapshot.search_rows(), version)
+                    return search_index
+                # One transaction, so the documents match the version read with them
+                db = get_db(); cur = db.cursor(dictionary=True)
+                cur.execute(CATALOG_VERSION_SQL)
+                version = (cur.fetchone() or {"version": 0})["version"]
+                cur.execute(SEARCH_SQL)
+                search_index.load((row for rows in iter_batches(cur) for row in rows), version)
+                db.close()
+                remember_version(version)
+    return search_index
+
+def reindex_book(db, book_id):
+    # Call after the write has been committed
+    if not search_index.loaded:
+        return
+    cur = db.cursor(dictionary=True)
+    cur.execute(SEARCH_SQL + " WHERE b.book_id=%s", (book_id,))
+    row = cur.fetchone()
+    if row:
+        search_index.add(row)
+    else:
+        search_index.remove(book_id)
+
+
+# ==================================================
+# CATALOG SNAPSHOT (CATALOG_SNAPSHOT)
+# ==================================================
+# Write routes re-read what they changed after commit (catalog_changed).
+# Anything else that moves catalog_meta.version (other processes,
+# imports, direct SQL) is caught by the periodic reconciliation.
+
+CATALOG_AUTHORS_SQL = "SELECT author_id, first_name, last_name FROM authors"
+CATALOG_BOOKS_SQL = """
+    SELECT book_id, title, author_id, genre, publish_year, available_copies, updated_at
+    FROM books
+"""
+
+catalog = CatalogSnapshot()
+_catalog_lock = threading.Lock()
+_catalog_checked = 0.0          # monotonic time of the last reconciliation
+_catalog_reconciling = False
+
+def load_catalog(db):
+    # One transaction, so the rows match the version read with them
+    cur = db.cursor()
+    cur.execute(CATALOG_VERSION_SQL)
+    version, updated_at = cur.fetchone() or (0, None)
+    cur.execute(CATALOG_AUTHORS_SQL)
+    authors = cur.fetchall()
+    cur.execute(CATALOG_BOOKS_SQL)
+    catalog.load(authors, [row for rows in iter_batches(cur) for row in rows], version, updated_at)
+
+def get_catalog():
+    # None unless CATALOG_SNAPSHOT is on; loaded on first use
+    global _catalog_checked
+    if not app.config["CATALOG_SNAPSHOT"]:
+        return None
+    if not catalog.loaded:
+        with _catalog_lock:
+            if not catalog.loaded:
+                with get_storage().acquire() as db:
+                    load_catalog(db)
+                _catalog_checked = time.monotonic()
+    maybe_reconcile()
+    return catalog
+
+def reconcile_catalog():
+    # Reloads when the database's catalog version isn't the snapshot's
+    with get_storage().acquire() as db:
+        cur = db.cursor()
+        cur.execute(CATALOG_VERSION_SQL)
+        row = cur.fetchone()
+        if row and row[0] != catalog.version:
+            load_catalog(db)
+            search_index.loaded = False     # rebuilt from the new snapshot
+            suggest_index.loaded = False
+            invalidate("books", "authors", "search")
+
+def _reconcile_worker():
+    global _catalog_reconciling
+    try:
+        reconcile_catalog()
+    except Exception:
+        app.logger.exception("catalog reconciliation failed")
+    finally:
+        _catalog_reconciling = False
+
+def maybe_reconcile():
+    # At most one check per interval, off the request thread
+    global _catalog_checked, _catalog_reconciling
+    now = time.monotonic()
+    if now - _catalog_checked < app.config["CATALOG_RECONCILE_INTERVAL"]:
+        return
+    with _catalog_lock:
+        if _catalog_reconciling or now - _catalog_checked < app.config["CATALOG_RECONCILE_INTERVAL"]:
+            return
+        _catalog_checked = now
+        _catalog_reconciling = True
+    threading.Thread(target=_reconcile_worker, name="catalog-reconcile", daemon=True).start()
+
+def catalog_changed(db, books=(), authors=()):
+    # Call after the write has been committed: applies the rows as they now
+    # are to the snapshot, suggest index and facet counts (same row shapes)
+    models = [model for model in (catalog, suggest_index, facets) if model.loaded]
+    # The search index's rows were already applied by the caller (reindex_book)
+    versioned = [(model, model.version) for model in models + [search_index]
+                 if model.loaded and hasattr(model, "set_version")]
+    if not versioned and not models:
+        return
+    cur = db.cursor()
+    for sql, id_col, ids, kind in (
+        (CATALOG_AUTHORS_SQL, "author_id", list(authors), "author"),
+        (CATALOG_BOOKS_SQL, "book_id", list(books), "book"),
+    ):
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cur.execute(f"{sql} WHERE {id_col} IN ({','.join(['%s'] * len(chunk))})", chunk)
+            found = {row[0]: row for row in cur.fetchall()}
+            for model in models:
+                put, remove = getattr(model, "put_" + kind), getattr(model, "remove_" + kind)
+                for row_id in chunk:
+                    if row_id in found:
+                        put(found[row_id])
+                    else:
+                        remove(row_id)
+
+    if not versioned:
+        return
+    # Only our own write moved the version: the model is current.
+    # Otherwise leave it behind so the next version check reloads it.
+    cur.execute(CATALOG_VERSION_SQL)
+    row = cur.fetchone()
+    if row:
+        remember_version(row[0])
+    for model, before in versioned:
+        if row and before is not None and row[0] == before + 1:
+            model.set_version(*row)
+
+
+
+# ==================================================
+# SUGGEST (type-ahead)
+# ==================================================
+
+SUGGEST_COLUMNS = ("kind", "id", "text", "author", "score")
+
+suggest_index = SuggestIndex()
+_suggest_lock = threading.Lock()
+
+def get_suggest_index():
+    # Built on first use and kept current by catalog_changed(); reloaded
+    # once catalog_meta moved without it seeing it, like get_facets()
+    version = known_version()
+    if index_behind(suggest_index, version):
+        with _suggest_lock:
+            if index_behind(suggest_index, version):
+                # One transaction, so the names match the version read with them
+                db = get_db(); cur = db.cursor()
+                cur.execute(CATALOG_VERSION_SQL)
+                version = (cur.fetchone() or (0,))[0]
+                cur.execute(CATALOG_AUTHORS_SQL)
+                authors = cur.fetchall()
+                cur.execute(CATALOG_BOOKS_SQL)
+                suggest_index.load(authors, [row for rows in iter_batches(cur) for row in rows], version)
+                db.close()
+                remember_version(version)
+    return suggest_index
+
+
+
+# ==================================================
+# FACETS (/stats)
+# ==================================================
+
+facets = FacetCounts()
+_facets_lock = threading.Lock()
+
+def get_facets():
+    # Reloaded once catalog_meta moved without catalog_changed() seeing
+    # it: other processes, imports, direct SQL
+    version = known_version()
+    if index_behind(facets, version):
+        with _facets_lock:
+            if index_behind(facets, version):
+                # One transaction, so the counts match the version read with them
+                db = get_db(); cur = db.cursor()
+                cur.execute(CATALOG_VERSION_SQL)
+                version = (cur.fetchone() or (0,))[0]
+                cur.execute(CATALOG_AUTHORS_SQL)
+                authors = cur.fetchall()
+                cur.execute(CATALOG_BOOKS_SQL)
+                facets.load(authors, (book for rows in iter_batches(cur) for book in rows), version)
+                db.close()
+                remember_version(version)
+    return facets
+
+
+# ==================================================
+# COMPRESSION
+# ==================================================
+
+def compress_level(resp):
+    # None when resp shouldn't be compressed
+    if not app.config["COMPRESS_ENABLED"] or resp.status_code != 200:
+        return None
+    if resp.is_streamed or resp.direct_passthrough or "Content-Encoding" in resp.headers:
+        return None
+    if (resp.content_length or 0) < app.config["COMPRESS_MIN_SIZE"]:
+        return None
+    return app.config["COMPRESS_LEVELS"].get(resp.mimetype)
+
+def use_variant(resp, variants):
+    # Serves a precompressed body if the client accepts one of them
+    if variants:
+        resp.vary.add("Accept-Encoding")
+        encoding = negotiate(request.accept_encodings, tuple(variants))
+        if encoding:
+            resp.set_data(variants[encoding])
+            resp.headers["Content-Encoding"] = encoding
+    return resp
+
+@app.after_request
+def compress_response(resp):
+    level = compress_level(resp)
+    if level is not None:
+        resp.vary.add("Accept-Encoding")
+        encoding = negotiate(request.accept_encodings)
+        if encoding:
+            resp.set_data(compress(resp.get_data(), encoding, level))
+            resp.headers["Content-Encoding"] = encoding
+
+    # Encoded bytes differ from the identity body, so the ETag can only be weak
+    if resp.status_code == 304 and negotiate(request.accept_encodings):
+        resp.vary.add("Accept-Encoding")
+    if "Accept-Encoding" in resp.vary and negotiate(request.accept_encodings):
+        etag, weak = resp.get_etag()
+        if etag and not weak:
+            resp.set_etag(etag, weak=True)
+    return resp
+
+
+# ==================================================
+# RESPONSE CACHE
+# ==================================================
+# Entries carry tag versions; write routes bump the tags they affect:
+#   books / authors / search   every page of that listing
+#   books:sort:<s>, books:genre:<g>   /books pages by sort / genre filter
+#   book:<id>                  any page that contains that book
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if app.config["CACHE_REDIS_URL"] and redis is not None:
+                    backend = SharedBackend(
+                        redis.Redis.from_url(app.config["CACHE_REDIS_URL"]),
+                        ttl=app.config["CACHE_TTL"],
+                    )
+                else:
+                    backend = LocalBackend(app.config["CACHE_SIZE"], app.config["CACHE_TTL"])
+                _cache = ResponseCache(backend)
+    return _cache
+
+def set_cache_backend(backend):
+    # e.g. SharedBackend(MemoryClient()) to exercise the shared path locally
+    global _cache
+    _cache = ResponseCache(backend)
+
+def cache_key():
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.path}?{args}|{response_format()}"
+
+def cache_tags(*tags):
+    # Routes tag what they read; the versions are captured right away
+    snapshot = g.get("cache_snapshot")
+    if snapshot is not None:
+        snapshot.update(get_cache().snapshot(t for t in tags if t not in snapshot))
+
+def invalidate(*tags):
+    if app.config["CACHE_ENABLED"]:
+        get_cache().invalidate(*tags)
+
+def caching():
+    return app.config["CACHE_ENABLED"] and not wants_stream()
+
+def cache_hit(key):
+    hit = get_cache().get(key)
+    if hit is None:
+        return None
+    body, status, headers, variants = hit
+    return use_variant(app.response_class(body, status=status, headers=headers), variants)
+
+def cache_store(key, snapshot, resp):
+    # A replica may not have caught up with a write made here yet
+    stale = g.get("db_replica") and get_router().recent_write()
+    if resp.status_code == 200 and not resp.is_streamed and not stale:
+        headers = [(k, v) for k, v in resp.headers if k.lower() != "set-cookie"]
+        body = resp.get_data()
+        # Compressed once here instead of on every hit
+        variants = {}
+        if compress_level(resp) is not None:
+            variants = precompress(body, app.config["COMPRESS_CACHED_LEVEL"])
+        get_cache().set(key, (body, resp.status_code, headers, variants), snapshot)
+        use_variant(resp, variants)
+    return resp
+
+def cached(*tags):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not caching():
+                return f(*args, **kwargs)
+
+            key = cache_key()
+            hit = cache_hit(key)
+            if hit is not None:
+                return hit
+
+            g.cache_snapshot = get_cache().snapshot(tags)
+            resp = app.make_response(f(*args, **kwargs))
+            return cache_store(key, g.pop("cache_snapshot"), resp)
+        return decorated
+    return decorator
+
+
+# ==================================================
+# CONDITIONAL GET (ETag / Last-Modified)
+# ==================================================
+
+def touch_catalog(cur):
+    # Run inside the write's transaction
+    cur.execute("UPDATE catalog_meta SET version=version+1, updated_at=UTC_TIMESTAMP() WHERE id=1")
+    note_write()
+
+CATALOG_VERSION_SQL = "SELECT version, updated_at FROM catalog_meta WHERE id=1"
+
+def catalog_version():
+    # The snapshot's own version when reads come from it. A read is kept
+    # on g, so known_version() doesn't repeat it later in the request.
+    snapshot = get_catalog()
+    if snapshot is not None:
+        return snapshot.version, snapshot.updated_at
+    db = get_db(); cur = db.cursor()
+    cur.execute(CATALOG_VERSION_SQL)
+    row = cur.fetchone(); db.close()
+    row = row if row else (0, None)
+    remember_version(row[0], time.monotonic())
+    if has_request_context():
+        g.catalog_version = row[0]
+    return row
+
+# The in-memory indexes (search, suggest, facets) check catalog_meta
+# through known_version(): the snapshot's version when it's on, the
+# version this request already read for its ETag (catalog_version), else
+# a read shared by every request for CATALOG_VERSION_TTL seconds
+_known_version = [0.0, None]    # [monotonic time of the last read, newest version seen]
+_known_version_lock = threading.Lock()
+
+def remember_version(version, read_at=None):
+    # Versions only grow: keep the newest one seen
+    with _known_version_lock:
+        if _known_version[1] is None or version > _known_version[1]:
+            _known_version[1] = version
+        if read_at is not None:
+            _known_version[0] = read_at
+
+def known_version():
+    snapshot = get_catalog()
+    if snapshot is not None:
+        return snapshot.version
+    if has_request_context() and g.get("catalog_version") is not None:
+        return g.catalog_version
+    now = time.monotonic()
+    if _known_version[1] is None or now - _known_version[0] >= app.config["CATALOG_VERSION_TTL"]:
+        db = get_db(); cur = db.cursor()
+        cur.execute(CATALOG_VERSION_SQL)
+        row = cur.fetchone(); db.close()
+        remember_version(row[0] if row else 0, now)
+    return _known_version[1]
+
+def index_behind(model, version):
+    # A model ahead of a cached (older) read is current, not stale
+    return not model.loaded or model.version is None or (version is not None and model.version < version)
+
+def catalog_etag(version):
+    return hashlib.sha1(f"{version}|{cache_key()}".encode()).hexdigest()
+
+def not_modified(etag, modified):
+    # If-None-Match wins over If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)     # weak match: gzip'd copies too
+    ims = request.if_modified_since
+    return bool(ims and modified and modified.replace(tzinfo=datetime.timezone.utc) <= ims)
+
+def with_validators(resp, etag, modified):
+    resp.set_etag(etag)
+    # Dates have one-second resolution: another write can still land in
+    # the current second, so only a second that has passed is sent
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+    if modified and modified < now:
+        resp.last_modified = modified.replace(tzinfo=datetime.timezone.utc)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def conditional(f):
+    # 304 straight from the version counter: no join, no serialization
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get("Authorization")
-        if token and token.startswith("Bearer "):
-            token = token.replace("Bearer ", "")
-        else:
-            token = session.get("token")
+        version, modified = catalog_version()
+        etag = catalog_etag(version)
+        if not_modified(etag, modified):
+            return with_validators(app.response_class(status=304), etag, modified)
+
+        resp = app.make_response(f(*args, **kwargs))
+        if resp.status_code == 200:
+            with_validators(resp, etag, modified)
+        return resp
+    return decorated
 
-        if not token:
-            return jsonify({"error": "Token missing"}), 401
 
-        try:
-            jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
-        except:
-            return jsonify({"error": "Invalid or expired token"}), 401
+# ==================================================
+# JWT DECORATOR
+# ==================================================
 
+# Verified claims keyed by token digest, each entry expiring with its exp
+token_cache = LRUCache(maxsize=app.config["TOKEN_CACHE_SIZE"], ttl=app.config["TOKEN_CACHE_TTL"])
+revoked_tokens = {}     # digest -> unix time after which the token is dead anyway
+_revoked_lock = threading.Lock()
+
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def request_token():
+    token = request.headers.get("Authorization")
+    if token and token.startswith("Bearer "):
+        return token.replace("Bearer ", "")
+    return session.get("token")
+
+def verify_token(token):
+    digest = token_digest(token)
+    if digest in revoked_tokens:
+        raise jwt.InvalidTokenError("Token revoked")
+
+    claims = token_cache.get(digest)
+    if claims is None:
+        claims = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
+        ttl = claims["exp"] - time.time() if "exp" in claims else app.config["TOKEN_CACHE_TTL"]
+        if ttl > 0:
+            token_cache.set(digest, claims, ttl)
+    return claims
+
+def revoke_token(token):
+    # Takes effect immediately for this process
+    digest = token_digest(token)
+    token_cache.delete(digest)
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        claims = {}
+    now = time.time()
+    with _revoked_lock:
+        revoked_tokens[digest] = claims.get("exp", now + app.config["TOKEN_CACHE_TTL"])
+        # Drop entries whose tokens have expired on their own
+        for d, exp in list(revoked_tokens.items()):
+            if exp < now:
+                del revoked_tokens[d]
+
+def check_token():
+    # None when the request carries a valid token, else the 401 to send
+    token = request_token()
+
+    if not token:
+        return jsonify({"error": "Token missing"}), 401
+
+    try:
+        g.claims = verify_token(token)
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 401
+    return None
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        denied = check_token()
+        if denied is not None:
+            return denied
         return f(*args, **kwargs)
     return decorated
 
@@ -154,11 +1236,13 @@ def register():
     username = request.form["username"]
     password = request.form["password"]
 
+    # Hash before taking a DB connection
+    pw = get_hasher().hash(password)
+
     db = get_db()
     cur = db.cursor(dictionary=True)
 
     try:
-        pw = bcrypt.generate_password_hash(password).decode()
         cur.execute(
             "INSERT INTO users (username, password) VALUES (%s, %s)",
             (username, pw)
@@ -250,14 +1334,29 @@ def login():
     user = cur.fetchone()
     db.close()
 
-    if not user or not bcrypt.check_password_hash(
-        user["password"], request.form["password"]
-    ):
+    hasher = get_hasher()
+    if not user or not hasher.check(user["password"], request.form["password"]):
         return "<h3>Invalid credentials</h3>"
 
+    # Cost factor changed since this hash was made: upgrade it now
+    if hasher.needs_rehash(user["password"]):
+        try:
+            pw = hasher.hash(request.form["password"])
+        except HashQueueFull:
+            pw = None   # try again next login
+        if pw:
+            db = get_db(); cur = db.cursor()
+            cur.execute("UPDATE users SET password=%s WHERE id=%s", (pw, user["id"]))
+            db.commit(); db.close()
+
+    return login_success(user["username"])
+
+
+def login_success(username):
+    # Shared with the ASGI login (asgi.py)
     token = jwt.encode(
         {
-            "user": user["username"],
+            "user": username,
             "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=2)
         },
         app.config["SECRET_KEY"],
@@ -287,159 +1386,191 @@ def login():
     """
 
 
+@app.route("/logout")
+def logout():
+    token = request_token()
+    if token:
+        revoke_token(token)
+    session.pop("token", None)
+    return redirect(url_for("index"))
+
+
 # ==================================================
 # BOOKS (HTML + JSON + XML)
 # ==================================================
-@app.route("/books")
-@token_required
-def books():
-    db = get_db(); cur = db.cursor(dictionary=True)
-    cur.execute("""
+# Each listing is split into the query it runs and the page built
+# from its rows, so the ASGI views (asgi.py) can fetch with await.
+# With CATALOG_SNAPSHOT the rows come from memory instead (snapshot_*).
+
+def books_query():
+    sort, desc = sort_args(BOOK_SORTS, "book_id")
+    limit = page_limit()
+    where, params = book_filters()
+    cache_tags(f"books:sort:{sort}")
+    if request.args.get("genre", "").strip():
+        cache_tags(f"books:genre:{request.args['genre'].strip()}")
+    clause, extra = keyset(BOOK_SORTS[sort], "b.book_id", decode_cursor(), desc)
+    if clause:
+        where.append(clause); params += extra
+    # CROSS JOIN makes SQLite read books first, walking the sort index;
+    # only an author prefix should start from authors. MySQL reads it as JOIN.
+    join = "JOIN" if book_filter_args()["author_prefix"] else "CROSS JOIN"
+
+    sql = f"""
         SELECT b.book_id, b.title,
         CONCAT(a.first_name,' ',a.last_name) AS author,
         b.genre, b.publish_year, b.available_copies
-        FROM books b JOIN authors a ON b.author_id=a.author_id
-    """)
-    data = cur.fetchall(); db.close()
-
-    if request.args.get("format") or "application/json" in request.headers.get("Accept", ""):
-        return respond(data, "books")
-
-    return render_template_string("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Library Books</title>
-    <style>
-        body {
-            font-family: 'Segoe UI', Arial, sans-serif;
-            background-color: #121212;
-            color: #e0e0e0;
-            padding: 30px;
-        }
+        FROM books b {join} authors a ON b.author_id=a.author_id
+        {where_sql(where)}
+        ORDER BY {order_by(BOOK_SORTS[sort], "b.book_id", desc)}
+    """
+    return sql, params, sort, limit
+
+def books_page(columns, rows, sort, limit):
+    # rows were fetched with LIMIT limit+1
+    next_cursor = next_page(rows, limit, sort, "book_id", columns)
+    cache_tags(*(f"book:{row[0]}" for row in rows))     # book_id comes first
+
+    if response_format() != "html":
+        return respond_rows(columns, rows, "books", {"next_cursor": next_cursor})
+
+    return render_template("books.html", books=as_dicts(columns, rows), next_url=page_url("books", next_cursor))
+
+def snapshot_books(snapshot):
+    # Same arguments, errors and cache tags as books_query()
+    sort, desc = sort_args(BOOK_SORTS, "book_id")
+    limit = page_limit()
+    filters = book_filter_args()
+    cache_tags(f"books:sort:{sort}")
+    if filters["genre"]:
+        cache_tags(f"books:genre:{filters['genre']}")
+    cursor = decode_cursor()
+    check_cursor(cursor, sort, "book_id")
+    try:
+        columns, rows = snapshot.books(sort, desc, cursor, limit + 1, **filters)
+    except ValueError as e:
+        raise BadQuery(str(e))
+    return columns, rows, sort, limit
 
-        h1 {
-            color: #ffffff;
-            margin-bottom: 15px;
-        }
+def fetch_page(sql, params, limit):
+    db = get_db(); cur = db.cursor()
+    cur.execute(sql + " LIMIT %s", params + [limit + 1])
+    rows = cur.fetchall(); columns = [c[0] for c in cur.description]; db.close()
+    return columns, rows
 
-        a {
-            text-decoration: none;
-            color: #cfcfcf;
-        }
+@app.route("/books")
+@token_required
+@read_replica
+@conditional
+@cached("books")
+def books():
+    # ?stream=1 sends every matching row, batch by batch
+    stream = response_format() != "html" and wants_stream()
+    snapshot = get_catalog()
+    if snapshot is not None and not stream:
+        return books_page(*snapshot_books(snapshot))
+
+    sql, params, sort, limit = books_query()
+    if stream:
+        return respond_stream(stream_query(sql, params), "books")
+
+    return books_page(*fetch_page(sql, params, limit), sort, limit)
+
+def authors_query():
+    sort, desc = sort_args(AUTHOR_SORTS, "author_id")
+    limit = page_limit()
+    where, params = [], []
+    clause, extra = keyset(AUTHOR_SORTS[sort], "author_id", decode_cursor(), desc)
+    if clause:
+        where.append(clause); params += extra
+
+    sql = f"""
+        SELECT * FROM authors
+        {where_sql(where)}
+        ORDER BY {order_by(AUTHOR_SORTS[sort], "author_id", desc)}
+    """
+    return sql, params, sort, limit
 
-        a:hover {
-            color: #ffffff;
-        }
+def authors_page(columns, rows, sort, limit):
+    next_cursor = next_page(rows, limit, sort, "author_id", columns)
 
-        /* 🔴 BUTTON ONLY PINK */
-        .btn-pink {
-            display: inline-block;
-            background-color: #ff4d8d;
-            color: #fff;
-            padding: 10px 18px;
-            border-radius: 8px;
-            font-weight: 600;
-            margin-bottom: 25px;
-        }
+    if response_format() != "html":
+        return respond_rows(columns, rows, "authors", {"next_cursor": next_cursor})
 
-        .btn-pink:hover {
-            background-color: #e13c77;
-        }
+    return render_template("authors.html", authors=as_dicts(columns, rows), next_url=page_url("authors", next_cursor))
 
-        .book {
-            background-color: #1e1e1e;
-            border-radius: 12px;
-            padding: 16px 22px;
-            margin-bottom: 14px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.6);
-        }
-
-        .book-title {
-            font-size: 17px;
-            font-weight: 600;
-            color: #ffffff;
-        }
-
-        .book-meta {
-            font-size: 14px;
-            color: #aaaaaa;
-            margin-top: 4px;
-        }
+def snapshot_authors(snapshot):
+    sort, desc = sort_args(AUTHOR_SORTS, "author_id")
+    limit = page_limit()
+    cursor = decode_cursor()
+    check_cursor(cursor, sort, "author_id")
+    try:
+        columns, rows = snapshot.authors(sort, desc, cursor, limit + 1)
+    except ValueError as e:
+        raise BadQuery(str(e))
+    return columns, rows, sort, limit
 
-        .actions a {
-            margin-left: 12px;
-            font-size: 18px;
-            color: #bbbbbb;
-        }
+@app.route("/authors")
+@token_required
+@read_replica
+@conditional
+@cached("authors")
+def authors():
+    stream = response_format() != "html" and wants_stream()
+    snapshot = get_catalog()
+    if snapshot is not None and not stream:
+        return authors_page(*snapshot_authors(snapshot))
+
+    sql, params, sort, limit = authors_query()
+    if stream:
+        return respond_stream(stream_query(sql, params), "authors")
+
+    return authors_page(*fetch_page(sql, params, limit), sort, limit)
+
+BOOK_DETAIL_SQL = """
+    SELECT b.book_id, b.title,
+    CONCAT(a.first_name,' ',a.last_name) AS author,
+    b.genre, b.publish_year, b.available_copies, b.updated_at
+    FROM books b JOIN authors a ON b.author_id=a.author_id
+    WHERE b.book_id=%s
+"""
 
-        .actions a:hover {
-            color: #ffffff;
-        }
-    </style>
-</head>
+# Detail validators are the catalog's, like the listings': books.updated_at
+# has one-second resolution and misses changes to the author row, while
+# every catalog write moves catalog_meta.version
 
-<body>
-    <h1>📚 Library Books</h1>
-
-    <!-- PINK BUTTON -->
-    <a class="btn-pink" href="/books/add">➕ Add Book</a>
-
-    {% for b in books %}
-    <div class="book">
-        <div>
-            <div class="book-title">{{ b.title }}</div>
-            <div class="book-meta">
-                {{ b.author }} • {{ b.genre }} • {{ b.publish_year }}
-            </div>
-        </div>
+def snapshot_book_detail(snapshot, id):
+    version, modified = snapshot.version, snapshot.updated_at
+    etag = catalog_etag(version)
+    if not_modified(etag, modified):
+        return with_validators(app.response_class(status=304), etag, modified)
 
-        <div class="actions">
-            <a href="/books/edit/{{ b.book_id }}">✏️</a>
-            <a href="/books/delete/{{ b.book_id }}"
-               onclick="return confirm('Delete this book?')">🗑</a>
-        </div>
-    </div>
-    {% endfor %}
-</body>
-</html>
-""", books=data)
+    found = snapshot.book(id)
+    if found is None:
+        return jsonify({"error": "Book not found"}), 404
+    return with_validators(respond(dict(zip(*found)), "book"), etag, modified)
 
-@app.route("/authors")
+@app.route("/books/<int:id>")
 @token_required
-def authors():
-    db = get_db(); cur = db.cursor(dictionary=True)
-    cur.execute("SELECT * FROM authors")
-    data = cur.fetchall(); db.close()
-
-    if request.args.get("format") or "application/json" in request.headers.get("Accept",""):
-        return respond(data, "authors")
+@read_replica
+def book_detail(id):
+    suggest_index.record_view(id)
+    snapshot = get_catalog()
+    if snapshot is not None:
+        return snapshot_book_detail(snapshot, id)
+
+    # 304 from the version counter alone; a deleted book moved it too
+    version, modified = catalog_version()
+    etag = catalog_etag(version)
+    if not_modified(etag, modified):
+        return with_validators(app.response_class(status=304), etag, modified)
 
-    return render_template_string("""
-<!DOCTYPE html>
-<html>
-<head>
-<title>Authors</title>
-<style>
-body { background:#121212; color:#e0e0e0; font-family:Segoe UI; padding:30px }
-.card { background:#1e1e1e; padding:15px; border-radius:10px; margin-bottom:10px }
-.btn { background:#ff4d8d; color:white; padding:8px 14px; border-radius:8px }
-</style>
-</head>
-<body>
-<h1>✍️ Authors</h1>
-<a class="btn" href="/authors/add">➕ Add Author</a><br><br>
-{% for a in authors %}
-<div class="card">
-{{ a.first_name }} {{ a.last_name }}
-</div>
-{% endfor %}
-</body>
-</html>
-""", authors=data)
+    db = get_db(); cur = db.cursor(dictionary=True)
+    cur.execute(BOOK_DETAIL_SQL, (id,))
+    book = cur.fetchone(); db.close()
+    if not book:
+        return jsonify({"error": "Book not found"}), 404
+    return with_validators(respond(book, "book"), etag, modified)
 
 @app.route("/authors/add", methods=["GET","POST"])
 @token_required
@@ -462,62 +1593,61 @@ def add_author_page():
     db = get_db(); cur = db.cursor()
     cur.execute("INSERT INTO authors (first_name,last_name) VALUES (%s,%s)",
                 (request.form["first_name"], request.form["last_name"]))
-    db.commit(); db.close()
+    author_id = cur.lastrowid
+    touch_catalog(cur)
+    db.commit()
+    catalog_changed(db, authors=[author_id])
+    db.close()
+    invalidate("authors")
     return "<a href='/authors'>Back</a>"
 
 @app.route("/books/search")
 @token_required
+@read_replica
+@conditional
+@cached("search")
 def search_books():
     q = request.args.get("q", "").strip()
 
     # 🚫 prevent empty search
     if not q:
-        return render_template_string("""
-        <style>
-        body{background:#121212;color:#fff;font-family:Segoe UI;padding:30px}
-        a{color:#ff4d8d}
-        </style>
+        return render_template("search.html", q=q)
 
-        <h3>⚠ Please enter a search term</h3>
-        <a href="/books">← Back to Books</a>
-        """)
+    # Ranked results are paged by offset; the cursor wraps it
+    limit = page_limit()
+    cursor = decode_cursor()
+    offset = max(cursor[-1], 0) if cursor else 0
 
-    db = get_db()
-    cur = db.cursor(dictionary=True)
+    data, total = get_search_index().search(q, limit, offset)
+    next_cursor = make_cursor([offset + limit]) if offset + limit < total else None
 
-    cur.execute("""
-        SELECT b.book_id, b.title,
-               CONCAT(a.first_name,' ',a.last_name) AS author,
-               b.genre, b.publish_year
-        FROM books b
-        JOIN authors a ON b.author_id=a.author_id
-        WHERE b.title LIKE %s OR b.genre LIKE %s
-    """, (f"%{q}%", f"%{q}%"))
-
-    data = cur.fetchall()
-    db.close()
-
-    return render_template_string("""
-    <style>
-        body{background:#121212;color:#fff;font-family:Segoe UI;padding:30px}
-        .card{background:#1e1e1e;padding:15px;border-radius:10px;margin-bottom:10px}
-        a{color:#ff4d8d}
-    </style>
+    if response_format() != "html":
+        return respond(data, "books", {"total": total, "next_cursor": next_cursor}, SEARCH_COLUMNS)
 
-    <h2>🔍 Search Results for "{{ q }}"</h2>
-    <a href="/books">← Back to Books</a><br><br>
+    return render_template("search.html", books=data, q=q, next_url=page_url("search_books", next_cursor))
 
-    {% if books %}
-        {% for b in books %}
-        <div class="card">
-            <b>{{ b.title }}</b><br>
-            {{ b.author }} • {{ b.genre }} • {{ b.publish_year }}
-        </div>
-        {% endfor %}
-    {% else %}
-        <p>No matching books found.</p>
-    {% endif %}
-    """, books=data, q=q)
+@app.route("/books/suggest")
+@token_required
+def suggest_books():
+    # Type-ahead: ?prefix=orw -> titles and authors, most viewed first
+    limit = int_arg("limit") or app.config["SUGGEST_LIMIT"]
+    limit = max(1, min(limit, suggest_index.k))
+    prefix = request.args.get("prefix", "")
+    # prefix is echoed back so a client can drop answers to earlier keystrokes
+    return respond(get_suggest_index().suggest(prefix, limit), "suggestions", {"prefix": prefix}, SUGGEST_COLUMNS)
+
+@app.route("/stats")
+@token_required
+@conditional
+def catalog_facets():
+    # Counts per genre, decade and author (top ?top=, default 10) for the
+    # books /books would list with the same filters; q= narrows like search
+    top = int_arg("top")
+    top = 10 if top is None else max(0, min(top, app.config["PAGE_MAX"]))
+    filters = book_filter_args()
+    q = request.args.get("q", "").strip()
+    book_ids = get_search_index().matches(q) if q else None
+    return respond(get_facets().facets(book_ids=book_ids, top=top, **filters), "stats")
 
 
 
@@ -550,13 +1680,19 @@ def add_book():
     db = get_db(); cur = db.cursor()
     cur.execute("""
         INSERT INTO books
-        (title,author_id,genre,publish_year,available_copies)
-        VALUES (%s,%s,%s,%s,%s)
+        (title,author_id,genre,publish_year,available_copies,updated_at)
+        VALUES (%s,%s,%s,%s,%s,UTC_TIMESTAMP())
     """, (
         request.form["title"], request.form["author_id"], request.form["genre"],
         request.form["publish_year"], request.form["available_copies"],
     ))
-    db.commit(); db.close()
+    book_id = cur.lastrowid
+    touch_catalog(cur)
+    db.commit()
+    reindex_book(db, book_id)
+    catalog_changed(db, books=[book_id])
+    db.close()
+    invalidate("books", "search")
     return redirect(url_for("books"))
 
 
@@ -574,29 +1710,857 @@ def edit_book(id):
         <form method="POST">
             <input name="title" value="{book['title']}"><br><br>
             <input name="genre" value="{book['genre']}"><br><br>
-            <input name="available_copies" value="{book['available_copies']}"><br><br>
+            On hand: {book['available_copies']}
+            <input name="copies_delta" value="0" title="Copies added (+) or written off (-)"><br><br>
             <button>Update</button>
         </form>"""
 
-    cur.execute("""
-        UPDATE books SET title=%s, genre=%s, available_copies=%s
-        WHERE book_id=%s
-    """, (
-        request.form["title"], request.form["genre"], request.form["available_copies"], id
-    ))
-    db.commit(); db.close()
+    # Stock only moves by a delta, never to an absolute value, so an edit
+    # can't undo checkouts that landed after the form was loaded
+    try:
+        delta = int(request.form.get("copies_delta") or 0)
+    except ValueError:
+        db.close()
+        return jsonify({"error": "'copies_delta' must be an integer"}), 400
+
+    cur.execute("SELECT title, genre FROM books WHERE book_id=%s", (id,))
+    old = cur.fetchone()
+    if old is None:
+        db.close()
+        return jsonify({"error": "Book not found"}), 404
+    try:
+        cur.execute("""
+            UPDATE books SET title=%s, genre=%s, updated_at=UTC_TIMESTAMP()
+            WHERE book_id=%s
+        """, (
+            request.form["title"], request.form["genre"], id
+        ))
+        if delta:
+            cur.execute("""
+                UPDATE books SET available_copies=available_copies+%s
+                WHERE book_id=%s AND available_copies+%s>=0
+            """, (delta, id, delta))
+            if cur.rowcount != 1:
+                db.rollback(); db.close()
+                return jsonify({"error": "Fewer copies on hand than that"}), 409
+        touch_catalog(cur)
+        db.commit()
+    except Error as e:
+        db.rollback(); db.close()
+        if e.errno not in (1205, 1213):     # lock wait timeout, deadlock
+            raise
+        return db_busy()
+    reindex_book(db, id)
+    catalog_changed(db, books=[id])
+    db.close()
+
+    # Only pages that showed this book, or that it may now sort/filter into
+    stale = [f"book:{id}", "search"]
+    if old.get("title") != request.form["title"]:
+        stale.append("books:sort:title")
+    if old.get("genre") != request.form["genre"]:
+        stale += [f"books:genre:{old.get('genre')}", f"books:genre:{request.form['genre']}"]
+    invalidate(*stale)
     return redirect(url_for("books"))
 
 
+LOAN_HISTORY_DELETE_SQL = "DELETE FROM loans WHERE book_id=%s AND returned_at IS NOT NULL"
+
 @app.route("/books/delete/<int:id>")
 @token_required
 def delete_book(id):
+    # Returned loans go with the book; open ones block it (ON DELETE RESTRICT)
     db = get_db(); cur = db.cursor()
-    cur.execute("DELETE FROM books WHERE book_id=%s", (id,))
-    db.commit(); db.close()
+    try:
+        cur.execute(LOAN_HISTORY_DELETE_SQL, (id,))
+        cur.execute("DELETE FROM books WHERE book_id=%s", (id,))
+    except Error as e:
+        db.rollback(); db.close()
+        if e.errno not in (1451, 1452):     # still referenced (SQLite reports 1452)
+            raise
+        return jsonify({"error": "Book has copies out on loan"}), 409
+    touch_catalog(cur)
+    db.commit()
+    search_index.remove(id)
+    catalog_changed(db, books=[id])
+    db.close()
+    invalidate(f"book:{id}", "search")
     return redirect(url_for("books"))
 
 
+# ==================================================
+# BATCH WRITES (JSON)
+# ==================================================
+# POST {"operations": [{"op": "create", "data": {...}},
+#                      {"op": "update", "id": 5, "data": {...}},
+#                      {"op": "delete", "id": 7}],
+#       "mode": "atomic" | "partial"}
+# Applied in one transaction: creates, then updates, then deletes.
+
+BATCH_TABLES = {
+    "books": {
+        "table": "books", "id": "book_id", "touch_updated": True,
+        "fields": {"title": str, "author_id": int, "genre": str, "publish_year": int,
+                   "available_copies": int, "date_added": str},
+        "required": ("title", "author_id"),
+        # Starting stock only: later changes go through checkouts / returns,
+        # or /books/edit's copies_delta
+        "create_only": ("available_copies",),
+    },
+    "authors": {
+        "table": "authors", "id": "author_id", "touch_updated": False,
+        "fields": {"first_name": str, "last_name": str},
+        "required": ("first_name", "last_name"),
+    },
+}
+
+class BatchFailed(Exception):
+    def __init__(self, indexes, message):
+        super().__init__(message)
+        self.indexes = indexes
+
+def batch_fields(data, spec, partial):
+    if not isinstance(data, dict) or not data:
+        raise ValueError("'data' must be a non-empty object")
+    unknown = sorted(set(data) - set(spec["fields"]))
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}")
+    for name, value in data.items():
+        typ = spec["fields"][name]
+        if value is not None and (not isinstance(value, typ) or isinstance(value, bool)):
+            raise ValueError(f"'{name}' must be {'an integer' if typ is int else 'a string'}")
+    if not partial:
+        missing = [f for f in spec["required"] if data.get(f) in (None, "")]
+        if missing:
+            raise ValueError(f"missing field(s): {', '.join(missing)}")
+    return data
+
+def parse_batch_op(op, spec):
+    if not isinstance(op, dict) or op.get("op") not in ("create", "update", "delete"):
+        raise ValueError("'op' must be create, update or delete")
+    if op["op"] == "create":
+        return op["op"], None, batch_fields(op.get("data"), spec, partial=False)
+    if not isinstance(op.get("id"), int) or isinstance(op.get("id"), bool):
+        raise ValueError("'id' must be an integer")
+    if op["op"] == "update":
+        data = batch_fields(op.get("data"), spec, partial=True)
+        fixed = sorted(set(data) & set(spec.get("create_only", ())))
+        if fixed:
+            raise ValueError(f"field(s) can only be set on create: {', '.join(fixed)}")
+        return op["op"], op["id"], data
+    return op["op"], op["id"], None
+
+def apply_batch_group(cur, sql, items, partial):
+    # items: [(index, params)]. One executemany(); in partial mode a failing
+    # group is retried row by row behind savepoints. Returns {index: error}.
+    if partial:
+        cur.execute("SAVEPOINT batch_group")
+    try:
+        cur.executemany(sql, [p for _, p in items])
+    except Error as e:
+        if not partial:
+            raise BatchFailed([i for i, _ in items], str(e))
+        cur.execute("ROLLBACK TO SAVEPOINT batch_group")
+        failed = {}
+        for i, params in items:
+            cur.execute("SAVEPOINT batch_item")
+            try:
+                cur.execute(sql, params)
+                cur.execute("RELEASE SAVEPOINT batch_item")
+            except Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT batch_item")
+                failed[i] = str(e)
+        return failed
+    if partial:
+        cur.execute("RELEASE SAVEPOINT batch_group")
+    return {}
+
+def run_batch(kind):
+    spec = BATCH_TABLES[kind]
+    body = request.get_json(silent=True)
+    ops = body.get("operations") if isinstance(body, dict) else body
+    mode = (body.get("mode") if isinstance(body, dict) else None) or app.config["BATCH_MODE"]
+    if not isinstance(ops, list):
+        return jsonify({"error": "Expected a JSON list of operations"}), 400
+    if len(ops) > app.config["BATCH_MAX_OPS"]:
+        return jsonify({"error": f"At most {app.config['BATCH_MAX_OPS']} operations per batch"}), 413
+    if mode not in ("atomic", "partial"):
+        return jsonify({"error": "mode must be atomic or partial"}), 400
+    partial = mode == "partial"
+
+    results = [{"index": i, "op": op.get("op") if isinstance(op, dict) else None} for i, op in enumerate(ops)]
+    def fail(i, message, status="error"):
+        results[i].update(status=status, error=message)
+
+    creates, updates, deletes = [], [], []
+    for i, op in enumerate(ops):
+        try:
+            action, row_id, data = parse_batch_op(op, spec)
+        except ValueError as e:
+            fail(i, str(e))
+            continue
+        results[i]["id"] = row_id
+        {"create": creates, "update": updates, "delete": deletes}[action].append((i, row_id, data))
+
+    def finish(committed):
+        for r in results:
+            if "status" not in r:
+                r["status"] = "rolled_back" if not committed else "ok"
+        failed = sum(1 for r in results if r["status"] in ("error", "not_found"))
+        body = {"mode": mode, "committed": committed,
+                "succeeded": len(results) - failed if committed else 0,
+                "failed": failed, "results": results}
+        return jsonify(body), 200 if committed else 422
+
+    if not partial and any("status" in r for r in results):
+        return finish(False)
+
+    table, id_col = spec["table"], spec["id"]
+    stamp = ", updated_at=UTC_TIMESTAMP()" if spec["touch_updated"] else ""
+    db = get_db(); cur = db.cursor()
+    try:
+        # Missing rows are per-item errors, checked with one IN query per 500 ids
+        wanted = sorted({row_id for _, row_id, _ in updates + deletes})
+        existing = set()
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            cur.execute(f"SELECT {id_col} FROM {table} WHERE {id_col} IN ({','.join(['%s'] * len(chunk))})", chunk)
+            existing.update(r[0] for r in cur.fetchall())
+        for i, row_id, _ in updates + deletes:
+            if row_id not in existing:
+                fail(i, f"{kind[:-1]} {row_id} not found", "not_found")
+        if not partial and any("status" in r for r in results):
+            db.rollback()
+            return finish(False)
+
+        # Creates run one by one so every item gets its new id
+        for i, _, data in creates:
+            cols = sorted(data)
+            sql = (f"INSERT INTO {table} ({','.join(cols)}{', updated_at' if stamp else ''}) "
+                   f"VALUES ({','.join(['%s'] * len(cols))}{', UTC_TIMESTAMP()' if stamp else ''})")
+            if partial:
+                cur.execute("SAVEPOINT batch_item")
+            try:
+                cur.execute(sql, [data[c] for c in cols])
+            except Error as e:
+                if not partial:
+                    raise BatchFailed([i], str(e))
+                cur.execute("ROLLBACK TO SAVEPOINT batch_item")
+                fail(i, str(e))
+                continue
+            if partial:
+                cur.execute("RELEASE SAVEPOINT batch_item")
+            results[i].update(status="created", id=cur.lastrowid)
+
+        # Updates with the same set of columns share one executemany()
+        groups = {}
+        for i, row_id, data in updates:
+            if row_id in existing:
+                groups.setdefault(tuple(sorted(data)), []).append((i, [data[c] for c in sorted(data)] + [row_id]))
+        for cols, items in groups.items():
+            sql = f"UPDATE {table} SET {', '.join(c + '=%s' for c in cols)}{stamp} WHERE {id_col}=%s"
+            failed = apply_batch_group(cur, sql, items, partial)
+            for i, _ in items:
+                if i in failed:
+                    fail(i, failed[i])
+                else:
+                    results[i]["status"] = "updated"
+
+        items = [(i, (row_id,)) for i, row_id, _ in deletes if row_id in existing]
+        if items and kind == "books":
+            cur.executemany(LOAN_HISTORY_DELETE_SQL, [p for _, p in items])
+        if items:
+            failed = apply_batch_group(cur, f"DELETE FROM {table} WHERE {id_col}=%s", items, partial)
+            for i, _ in items:
+                if i in failed:
+                    fail(i, failed[i])
+                else:
+                    results[i]["status"] = "deleted"
+
+        touch_catalog(cur)
+        db.commit()
+    except BatchFailed as e:
+        db.rollback()
+        for i in e.indexes:
+            fail(i, str(e))
+        return finish(False)
+    finally:
+        db.close()
+
+    # Keep the search index, catalog snapshot and response cache in step
+    done = [r for r in results if r["status"] in ("created", "updated", "deleted")]
+    if kind == "books":
+        db = get_db()
+        for r in done:
+            if r["status"] == "deleted":
+                search_index.remove(r["id"])
+            else:
+                reindex_book(db, r["id"])
+        catalog_changed(db, books=[r["id"] for r in done])
+        db.close()
+        invalidate("books", "search", *(f"book:{r['id']}" for r in done))
+    elif done:
+        if any(r["status"] != "created" for r in done):
+            search_index.loaded = False     # author names appear in book results
+            invalidate("books", "search")
+        db = get_db()
+        catalog_changed(db, authors=[r["id"] for r in done])
+        db.close()
+        invalidate("authors")
+    return finish(True)
+
+@app.route("/books/batch", methods=["POST"])
+@token_required
+def books_batch():
+    return run_batch("books")
+
+@app.route("/authors/batch", methods=["POST"])
+@token_required
+def authors_batch():
+    return run_batch("authors")
+
+
+# ==================================================
+# LOANS (JSON)
+# ==================================================
+# Copies only move through conditional UPDATEs (available_copies >= n,
+# returned_at IS NULL): concurrent requests queue on the row lock instead
+# of reading and overwriting the count, and it never goes negative.
+# Titles are locked in book_id order, so batches can't deadlock.
+# An Idempotency-Key header is claimed first in the same transaction:
+# a retry waits for the original, then replays its committed response.
+
+class LoanRefused(Exception):
+    def __init__(self, status, body):
+        super().__init__(body["error"])
+        self.status = status
+        self.body = body
+
+def copies_wanted(book_ids):
+    wanted = {}
+    for book_id in book_ids:
+        wanted[book_id] = wanted.get(book_id, 0) + 1
+    return wanted
+
+def sold_out(book_ids):
+    # Plain read before any lock: when the shelf is already empty a hot
+    # title's refusals skip the write lock. The UPDATE still decides.
+    wanted = copies_wanted(book_ids)
+    ids = sorted(wanted)
+    db = get_db(); cur = db.cursor()
+    cur.execute(f"SELECT book_id, available_copies FROM books WHERE book_id IN ({','.join(['%s'] * len(ids))})", ids)
+    copies = dict(cur.fetchall())
+    db.rollback(); db.close()
+    if len(copies) < len(ids):
+        return []       # the transaction reports missing titles
+    return [b for b in ids if (copies[b] or 0) < wanted[b]]
+
+def checkout_books(cur, username, book_ids):
+    # book_ids may repeat a title (several copies); all or nothing
+    wanted = copies_wanted(book_ids)
+    short = []
+    for book_id in sorted(wanted):
+        cur.execute("""
+            UPDATE books SET available_copies=available_copies-%s, updated_at=UTC_TIMESTAMP()
+            WHERE book_id=%s AND available_copies>=%s
+        """, (wanted[book_id], book_id, wanted[book_id]))
+        if cur.rowcount != 1:
+            short.append(book_id)
+
+    ids = sorted(wanted)
+    marks = ",".join(["%s"] * len(ids))
+    cur.execute(f"SELECT book_id, available_copies FROM books WHERE book_id IN ({marks})", ids)
+    copies = dict(cur.fetchall())
+    if short:
+        missing = [b for b in short if b not in copies]
+        if missing:
+            raise LoanRefused(404, {"error": "Book not found", "missing": missing})
+        raise LoanRefused(409, {"error": "No copies available", "unavailable": short})
+
+    loans = []
+    for book_id in book_ids:
+        cur.execute("INSERT INTO loans (book_id, username, checked_out_at) VALUES (%s, %s, UTC_TIMESTAMP())",
+                    (book_id, username))
+        loans.append({"loan_id": cur.lastrowid, "book_id": book_id, "username": username,
+                      "available_copies": copies[book_id]})
+    return loans
+
+def return_loan(cur, username, loan_id):
+    cur.execute("UPDATE loans SET returned_at=UTC_TIMESTAMP() WHERE loan_id=%s AND username=%s AND returned_at IS NULL",
+                (loan_id, username))
+    updated = cur.rowcount
+    cur.execute("SELECT book_id FROM loans WHERE loan_id=%s AND username=%s", (loan_id, username))
+    row = cur.fetchone()
+    if row is None:
+        raise LoanRefused(404, {"error": "Loan not found"})
+    if updated != 1:
+        raise LoanRefused(409, {"error": "Loan already returned"})
+    book_id = row[0]
+    cur.execute("UPDATE books SET available_copies=available_copies+1, updated_at=UTC_TIMESTAMP() WHERE book_id=%s",
+                (book_id,))
+    cur.execute("SELECT available_copies FROM books WHERE book_id=%s", (book_id,))
+    return {"loan_id": loan_id, "book_id": book_id, "username": username, "available_copies": cur.fetchone()[0]}
+
+def idempotency_cutoff():
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+    return now - datetime.timedelta(seconds=app.config["IDEMPOTENCY_TTL"])
+
+def replay_idempotent(db, username, key, fingerprint):
+    # The key is taken: its first request's response, or None to claim it
+    # again (the record expired, or its transaction rolled back)
+    cur = db.cursor()
+    cur.execute("DELETE FROM idempotency_keys WHERE username=%s AND idem_key=%s AND created_at < %s",
+                (username, key, idempotency_cutoff()))
+    expired = cur.rowcount
+    db.commit()
+    if expired:
+        return None
+    cur.execute("SELECT request_hash, status, response FROM idempotency_keys WHERE username=%s AND idem_key=%s",
+                (username, key))
+    row = cur.fetchone()
+    db.rollback()
+    if row is None:
+        return None
+    if row[0] != fingerprint:
+        return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+    resp = app.response_class(row[2], status=row[1], mimetype="application/json")
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+def loan_write(work, checkout=None):
+    # work(cur, username) -> (body, status, book_ids), or raises LoanRefused.
+    # Refusals roll back and aren't remembered, so a retry may succeed later.
+    # checkout: the book_ids to try sold_out() on first (not with a key:
+    # the key's first request may have taken the last copy, so replay it)
+    username = g.claims.get("user")
+    key = request.headers.get("Idempotency-Key")
+    if key is not None and not 0 < len(key) <= 255:
+        return jsonify({"error": "Idempotency-Key must be 1-255 characters"}), 400
+    if checkout and key is None:
+        short = sold_out(checkout)
+        if short:
+            return jsonify({"error": "No copies available", "unavailable": short}), 409
+    fingerprint = hashlib.sha256(f"{request.method} {request.path}\n".encode() + request.get_data()).hexdigest()
+
+    for attempt in range(app.config["LOAN_RETRIES"]):
+        db = get_db(); cur = db.cursor()
+        try:
+            if key is not None:
+                cur.execute("INSERT INTO idempotency_keys (username, idem_key, request_hash, created_at)"
+                            " VALUES (%s, %s, %s, UTC_TIMESTAMP())", (username, key, fingerprint))
+            body, status, books = work(cur, username)
+            if key is not None:
+                cur.execute("UPDATE idempotency_keys SET status=%s, response=%s WHERE username=%s AND idem_key=%s",
+                            (status, json.dumps(body, sort_keys=True), username, key))
+            touch_catalog(cur)
+            db.commit()
+        except LoanRefused as e:
+            db.rollback(); db.close()
+            return jsonify(e.body), e.status
+        except Error as e:
+            db.rollback()
+            duplicate = key is not None and e.errno == 1062
+            replay = replay_idempotent(db, username, key, fingerprint) if duplicate else None
+            db.close()
+            if replay is not None:
+                return replay
+            if not duplicate and e.errno not in (1205, 1213):     # lock wait timeout, deadlock
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+            continue
+
+        catalog_changed(db, books=books)
+        db.close()
+        invalidate(*(f"book:{book_id}" for book_id in books))
+        return jsonify(body), status
+
+    return db_busy()
+
+@app.route("/books/<int:id>/checkout", methods=["POST"])
+@token_required
+def checkout_book(id):
+    return loan_write(lambda cur, username: (checkout_books(cur, username, [id])[0], 201, [id]), [id])
+
+@app.route("/loans/checkout", methods=["POST"])
+@token_required
+def checkout_batch():
+    # {"book_ids": [3, 8, 8]}: one copy per entry, in one transaction
+    body = request.get_json(silent=True)
+    book_ids = body.get("book_ids") if isinstance(body, dict) else None
+    if (not isinstance(book_ids, list) or not book_ids
+            or not all(isinstance(b, int) and not isinstance(b, bool) for b in book_ids)):
+        return jsonify({"error": "'book_ids' must be a non-empty list of integers"}), 400
+    if len(book_ids) > app.config["LOAN_BATCH_MAX"]:
+        return jsonify({"error": f"At most {app.config['LOAN_BATCH_MAX']} copies per checkout"}), 413
+    return loan_write(lambda cur, username: ({"loans": checkout_books(cur, username, book_ids)}, 201,
+                                             sorted(set(book_ids))), book_ids)
+
+@app.route("/loans/<int:id>/return", methods=["POST"])
+@token_required
+def return_book(id):
+    def work(cur, username):
+        loan = return_loan(cur, username, id)
+        return loan, 200, [loan["book_id"]]
+    return loan_write(work)
+
+@app.route("/loans")
+@token_required
+def list_loans():
+    # The caller's open loans; ?all=1 adds returned ones
+    sql = """
+        SELECT l.loan_id, l.book_id, b.title, l.checked_out_at, l.returned_at
+        FROM loans l JOIN books b ON b.book_id = l.book_id
+        WHERE l.username=%s
+    """
+    if request.args.get("all", "").lower() not in ("1", "true", "yes"):
+        sql += " AND l.returned_at IS NULL"
+    db = get_db(); cur = db.cursor()
+    cur.execute(sql + " ORDER BY l.loan_id", (g.claims.get("user"),))
+    rows = cur.fetchall(); columns = [c[0] for c in cur.description]; db.close()
+    return respond_rows(columns, rows, "loans")
+
+
+# ==================================================
+# STATS
+# ==================================================
+@app.route("/pool/stats")
+@token_required
+def pool_stats():
+    router = get_router()
+    return jsonify({**get_storage().stats(), "replicas": router.stats() if router else None})
+
+@app.route("/cache/stats")
+@token_required
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+@app.route("/hash/stats")
+@token_required
+def hash_stats():
+    return jsonify(get_hasher().stats())
+
+@app.route("/catalog/stats")
+@token_required
+def catalog_stats():
+    # ?bytes=1 adds the snapshot's footprint (walks every record)
+    stats = catalog.stats(footprint=request.args.get("bytes") == "1")
+    return jsonify({**stats, "enabled": app.config["CATALOG_SNAPSHOT"]})
+
+
+# ==================================================
+# METRICS (Prometheus text format)
+# ==================================================
+# Every hook checks timing_request() first, so with METRICS_ENABLED
+# off the only cost is one flag lookup per request.
+metrics = Registry()
+REQUEST_SECONDS = metrics.histogram(
+    "library_request_duration_seconds", "Time to build the response, by route",
+    ("route", "method", "status"))
+STAGE_SECONDS = metrics.histogram(
+    "library_request_stage_seconds", "Time per request spent in each stage",
+    ("route", "stage"))
+DB_QUERIES = metrics.histogram(
+    "library_db_queries_per_request", "Queries executed per request",
+    ("route",), buckets=COUNT_BUCKETS)
+
+def timing_request():
+    return has_request_context() and "metric_stages" in g
+
+def record_stage(stage, seconds, queries=0):
+    # stages: db_connect, db_query, db_fetch, serialize, render
+    if not timing_request():
+        return
+    g.metric_stages[stage] = g.metric_stages.get(stage, 0.0) + seconds
+    g.metric_queries += queries
+
+@contextmanager
+def stage(name):
+    if not timing_request():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+@app.before_request
+def start_timing():
+    if app.config["METRICS_ENABLED"]:
+        g.metric_start = time.perf_counter()
+        g.metric_stages = {}
+        g.metric_queries = 0
+
+@app.after_request
+def observe_timing(resp):
+    # Streamed bodies are produced after this runs and aren't included
+    start = g.pop("metric_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method, str(resp.status_code))
+        for name, seconds in g.metric_stages.items():
+            STAGE_SECONDS.observe(seconds, route, name)
+        DB_QUERIES.observe(g.metric_queries, route)
+    return resp
+
+def _render_started(sender, template, context, **extra):
+    if timing_request():
+        g.metric_render_start = time.perf_counter()
+
+def _render_finished(sender, template, context, **extra):
+    start = g.pop("metric_render_start", None) if timing_request() else None
+    if start is not None:
+        record_stage("render", time.perf_counter() - start)
+
+before_render_template.connect(_render_started, app)
+template_rendered.connect(_render_finished, app)
+
+@metrics.collector
+def runtime_gauges():
+    pool = get_storage().stats()
+    cache = get_cache().stats()
+    hasher = get_hasher().stats()
+    return [
+        ("library_db_connections_in_use", "gauge", "DB connections checked out", pool.get("in_use")),
+        ("library_db_connections_open", "gauge", "DB connections open", pool.get("open")),
+        ("library_db_pool_waiting", "gauge", "Requests waiting for a connection", pool.get("waiting")),
+        ("library_db_pool_timeouts_total", "counter", "Checkouts that timed out", pool.get("timeouts")),
+        ("library_cache_hits_total", "counter", "Response cache hits", cache["hits"]),
+        ("library_cache_misses_total", "counter", "Response cache misses", cache["misses"]),
+        ("library_cache_entries", "gauge", "Cached responses", cache["entries"]),
+        ("library_hash_in_flight", "gauge", "bcrypt jobs queued or running", hasher["in_flight"]),
+        ("library_hash_rejected_total", "counter", "Logins rejected with 429", hasher["rejected"]),
+    ]
+
+@app.route("/metrics")
+@token_required
+def metrics_page():
+    if not app.config["METRICS_ENABLED"]:
+        return jsonify({"error": "Metrics are disabled (METRICS_ENABLED)"}), 404
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ==================================================
+# PROFILING (collapsed stacks for flame graphs)
+# ==================================================
+_profiler = None
+_profile_store = None
+_profiler_lock = threading.Lock()
+
+def get_profiler():
+    global _profiler, _profile_store
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profile_store = ProfileStore(app.config["PROFILE_DIR"], keep=app.config["PROFILE_KEEP"])
+                _profiler = Sampler(
+                    interval=app.config["PROFILE_INTERVAL"],
+                    max_concurrent=app.config["PROFILE_MAX_CONCURRENT"],
+                )
+    return _profiler
+
+def profile_requested():
+    # The header only counts for admins, checked before token_required runs
+    if request.headers.get(app.config["PROFILE_HEADER"]) != "1":
+        return False
+    token = request_token()
+    if not token:
+        return False
+    try:
+        claims = verify_token(token)
+    except jwt.InvalidTokenError:
+        return False
+    return claims.get("user") in app.config["PROFILE_ADMINS"]
+
+@app.before_request
+def start_profile():
+    rate = app.config["PROFILE_SAMPLE_RATE"]
+    if (rate and random.random() < rate) or profile_requested():
+        g.profile = get_profiler().start()      # None when at PROFILE_MAX_CONCURRENT
+
+@app.teardown_request
+def finish_profile(exc):
+    # Runs after streamed bodies finish, so they are included
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+    get_profiler().stop(profile)
+    if profile.samples:
+        route = request.url_rule.rule if request.url_rule else request.path
+        _profile_store.save(profile, request.method, route)
+
+@app.route("/profile/stats")
+@token_required
+def profile_stats():
+    stats = get_profiler().stats()
+    return jsonify({**stats, "directory": _profile_store.directory, "files": len(_profile_store.files())})
+
+
+# ==================================================
+# BULK IMPORT (CLI + API)
+# ==================================================
+
+def run_import(path, fmt=None, chunk_size=None, errors=None, progress=None):
+    db = get_db()
+    try:
+        report = CatalogImporter(
+            db,
+            chunk_size=chunk_size or app.config["IMPORT_CHUNK_SIZE"],
+            errors=errors,
+            on_chunk=touch_catalog,
+            progress=progress,
+        ).run(iter_file(path, fmt))
+    finally:
+        db.close()
+        # Anything may have changed: rebuild the index and snapshot lazily, drop cached pages
+        search_index.loaded = False
+        catalog.loaded = False
+        suggest_index.loaded = False
+        invalidate("books", "authors", "search")
+    return report
+
+@app.cli.command("import-catalog")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["xml", "json", "ndjson"]), help="Defaults to the file extension.")
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+@click.option("--errors", "errors_path", type=click.Path(dir_okay=False), help="Rejected rows (NDJSON). Defaults to PATH.errors.ndjson")
+def import_catalog_command(path, fmt, chunk_size, errors_path):
+    """Bulk load books (and their authors) from an XML or JSON file."""
+    errors_path = errors_path or path + ".errors.ndjson"
+
+    def progress(r):
+        click.echo(f"  {r['inserted']:>10} inserted  {r['rejected']:>8} rejected  {r['rows_per_sec']:>10} rows/s")
+
+    with open(errors_path, "w", encoding="utf-8") as errors:
+        report = run_import(path, fmt, chunk_size, errors, progress)
+
+    report.pop("error_samples")
+    click.echo(json.dumps(report, indent=2))
+    if report["rejected"]:
+        click.echo(f"Rejected rows written to {errors_path}")
+    else:
+        os.remove(errors_path)
+
+@app.route("/import", methods=["POST"])
+@token_required
+def import_catalog():
+    # multipart "file" upload or a raw request body; ?format= overrides the extension
+    upload = request.files.get("file")
+    name = upload.filename if upload and upload.filename else "upload"
+    fmt = request.args.get("format", "").lower() or detect_format(name)
+    if fmt not in ("xml", "json", "ndjson"):
+        return jsonify({"error": "format must be xml, json or ndjson"}), 400
+
+    with tempfile.NamedTemporaryFile(suffix="." + fmt) as tmp:
+        if upload:
+            upload.save(tmp)
+        else:
+            for chunk in iter(lambda: request.stream.read(1 << 16), b""):
+                tmp.write(chunk)
+        tmp.flush()
+        report = run_import(tmp.name, fmt, int_arg("chunk_size"))
+    return jsonify(report)
+
+
+# ==================================================
+# BULK EXPORT (CLI + API)
+# ==================================================
+
+EXPORT_SQL = """
+    SELECT b.book_id, b.title, b.author_id, a.first_name, a.last_name,
+           b.genre, b.publish_year, b.available_copies, b.date_added, b.updated_at
+    FROM books b CROSS JOIN authors a ON b.author_id=a.author_id
+    WHERE b.book_id > %s
+    ORDER BY b.book_id
+"""
+EXPORT_COLUMNS = [
+    "book_id", "title", "author_id", "first_name", "last_name",
+    "genre", "publish_year", "available_copies", "date_added", "updated_at",
+]
+EXPORT_TYPES = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xml": ("application/xml", "xml"),
+}
+
+def export_csv(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows([row[c] for c in EXPORT_COLUMNS] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+def export_value(value):
+    # Dates as the CSV / XML exports write them (2026-10-17, 2026-10-17 07:12:17),
+    # not Flask's HTTP dates, so the importer reads them back
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return app.json.default(value)
+
+def export_ndjson(batches):
+    for rows in batches:
+        yield "".join(app.json.dumps(row, default=export_value) + "\n" for row in rows)
+
+def gzip_chunks(chunks, level=6):
+    # wbits=31 -> gzip container, compressed as the rows stream out
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = z.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield z.flush()
+
+def export_chunks(fmt, after=0, gzip=False):
+    # Rows come from an unbuffered cursor in book_id order; resume with after=<last book_id>
+    batches = stream_query(EXPORT_SQL, (after,))
+    if fmt == "csv":
+        chunks = export_csv(batches)
+    elif fmt == "ndjson":
+        chunks = export_ndjson(batches)
+    else:
+        chunks = stream_xml(batches, "books")
+    return gzip_chunks(chunks) if gzip else (c.encode("utf-8") for c in chunks)
+
+@app.route("/export")
+@token_required
+@read_replica
+def export_catalog():
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in EXPORT_TYPES:
+        return jsonify({"error": "format must be csv, ndjson or xml"}), 400
+    after = int_arg("after") or 0
+    gzip = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+
+    mimetype, ext = EXPORT_TYPES[fmt]
+    filename = f"books-after-{after}.{ext}" if after else f"books.{ext}"
+    if gzip:
+        mimetype, filename = "application/gzip", filename + ".gz"
+
+    resp = app.response_class(stream_with_context(export_chunks(fmt, after, gzip)), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return resp
+
+@app.cli.command("export-catalog")
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_TYPES)), default="ndjson")
+@click.option("--after", type=int, default=0, help="Resume after this book_id.")
+@click.option("--gzip", is_flag=True, help="Compress the output.")
+@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Defaults to stdout.")
+def export_catalog_command(fmt, after, gzip, output):
+    """Dump the full catalog (books + authors) as CSV, NDJSON or XML."""
+    out = open(output, "wb") if output else click.get_binary_stream("stdout")
+    try:
+        for chunk in export_chunks(fmt, after, gzip):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
 # ==================================================
 # HOME + RUN
 # ==================================================
@@ -715,4 +2679,5 @@ def index():
 
 if __name__ == "__main__":
     init_db()
+    get_catalog()       # load before the first request, when enabled
     app.run(debug=True)
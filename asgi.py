@@ -0,0 +1,415 @@
+# ==================================================
+# ASGI SERVING MODE
+# The catalog reads (/books, /authors, /books/<id>) and POST
+# /login run as coroutines. Their queries are awaited on an
+# async pool (aiostorage.py) and bcrypt on the hashing process
+# pool, so a slow query or login holds no thread. With
+# DB_REPLICAS the catalog reads use the same router and
+# read-your-writes rules as @read_replica in app.py, each
+# replica through its own async pool. Every other route is
+# the Flask app itself, run on a thread pool.
+#
+#   uvicorn asgi:application --port 8000
+#   python asgi.py
+# ==================================================
+
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, jsonify, request
+
+import app as library
+from aiostorage import AsyncMySQLBackend, AsyncSQLiteBackend
+from hashing import HashQueueFull
+
+app = library.app
+
+_adb = None
+_replica_adbs = {}      # DB_REPLICAS target -> async backend
+_threads = None
+
+
+def make_adb(target=None):
+    # target: a DB_REPLICAS entry, None for the primary (as library.make_backend)
+    if app.config["DB_BACKEND"] == "sqlite":
+        return AsyncSQLiteBackend(
+            target or app.config["SQLITE_PATH"],
+            pragmas=app.config["SQLITE_PRAGMAS"],
+            timeout=app.config["DB_POOL_TIMEOUT"],
+            threads=app.config["ASGI_DB_THREADS"],
+        )
+    if app.config["DB_BACKEND"] == "mysql":
+        return AsyncMySQLBackend(
+            library.mysql_config(target),
+            size=app.config["DB_POOL_SIZE"],
+            timeout=app.config["DB_POOL_TIMEOUT"],
+            recycle=app.config["DB_POOL_RECYCLE"],
+        )
+    raise ValueError(f"unknown DB_BACKEND {app.config['DB_BACKEND']!r}")
+
+
+def get_adb():
+    # Only ever called on the event loop thread
+    global _adb
+    if _adb is None:
+        _adb = make_adb()
+    return _adb
+
+
+def get_replica_adb(replica):
+    if replica.name not in _replica_adbs:
+        _replica_adbs[replica.name] = make_adb(replica.name)
+    return _replica_adbs[replica.name]
+
+
+def get_threads():
+    global _threads
+    if _threads is None:
+        _threads = ThreadPoolExecutor(app.config["ASGI_THREADS"], thread_name_prefix="flask")
+    return _threads
+
+
+async def read_replica(sql, params):
+    # A usable replica's answer, or None: the async side of get_db() in
+    # @read_replica routes, with the same router and read-your-writes check
+    router = library.get_router()
+    if router is None or library.wrote_recently():
+        return None
+    # candidates() may run the blocking health check, so not on the loop
+    loop = asyncio.get_running_loop()
+    for replica in await loop.run_in_executor(get_threads(), router.candidates):
+        start = time.perf_counter()
+        try:
+            result = await get_replica_adb(replica).fetchall(sql, params)
+        except Exception:
+            router.read_failed(replica)
+            continue
+        router.read_ok(replica, time.perf_counter() - start)
+        g.db_replica = True
+        return result
+    router.fell_back()
+    return None
+
+
+async def fetchall(sql, params=(), read_only=False):
+    # read_only: may be answered by a replica (catalog reads)
+    start = time.perf_counter()
+    try:
+        result = await read_replica(sql, params) if read_only else None
+        return result if result is not None else await get_adb().fetchall(sql, params)
+    finally:
+        library.record_stage("db_query", time.perf_counter() - start, 1)
+
+
+async def fetchone(sql, params=(), read_only=False):
+    columns, rows = await fetchall(sql, params, read_only)
+    return rows[0] if rows else None
+
+
+# ==================================================
+# ASYNC VIEWS
+# Same helpers as the Flask routes, with the DB calls awaited
+# ==================================================
+
+async def catalog_page(tags, query, page, from_snapshot):
+    # @token_required + @conditional + @cached for the listings
+    denied = library.check_token()
+    if denied is not None:
+        return denied
+
+    snapshot = library.get_catalog()
+    if snapshot is not None:
+        version, modified = snapshot.version, snapshot.updated_at
+    else:
+        version, modified = await fetchone(library.CATALOG_VERSION_SQL, read_only=True) or (0, None)
+    etag = library.catalog_etag(version)
+    if library.not_modified(etag, modified):
+        return library.with_validators(app.response_class(status=304), etag, modified)
+
+    key = library.cache_key() if library.caching() else None
+    if key is not None:
+        hit = library.cache_hit(key)
+        if hit is not None:
+            return library.with_validators(hit, etag, modified)
+        g.cache_snapshot = library.get_cache().snapshot(tags)
+
+    if snapshot is not None:
+        resp = app.make_response(page(*from_snapshot(snapshot)))
+    else:
+        sql, params, sort, limit = query()
+        columns, rows = await fetchall(sql + " LIMIT %s", params + [limit + 1], read_only=True)
+        resp = app.make_response(page(columns, rows, sort, limit))
+    if key is not None:
+        resp = library.cache_store(key, g.pop("cache_snapshot"), resp)
+    if resp.status_code == 200:
+        library.with_validators(resp, etag, modified)
+    return resp
+
+
+async def books():
+    return await catalog_page(("books",), library.books_query, library.books_page, library.snapshot_books)
+
+
+async def authors():
+    return await catalog_page(("authors",), library.authors_query, library.authors_page, library.snapshot_authors)
+
+
+async def book_detail(id):
+    denied = library.check_token()
+    if denied is not None:
+        return denied
+
+    library.suggest_index.record_view(id)
+    snapshot = library.get_catalog()
+    if snapshot is not None:
+        return library.snapshot_book_detail(snapshot, id)
+
+    version, modified = await fetchone(library.CATALOG_VERSION_SQL, read_only=True) or (0, None)
+    etag = library.catalog_etag(version)
+    if library.not_modified(etag, modified):
+        return library.with_validators(app.response_class(status=304), etag, modified)
+
+    columns, rows = await fetchall(library.BOOK_DETAIL_SQL, (id,), read_only=True)
+    if not rows:
+        return jsonify({"error": "Book not found"}), 404
+    return library.with_validators(library.respond(dict(zip(columns, rows[0])), "book"), etag, modified)
+
+
+async def login():
+    form = request.form
+    user = await fetchone("SELECT id, username, password FROM users WHERE username=%s", (form["username"],))
+
+    hasher = library.get_hasher()
+    if not user or not await hasher.check_async(user[2], form["password"]):
+        return "<h3>Invalid credentials</h3>"
+
+    # Cost factor changed since this hash was made: upgrade it now
+    if hasher.needs_rehash(user[2]):
+        try:
+            pw = await hasher.hash_async(form["password"])
+        except HashQueueFull:
+            pw = None   # try again next login
+        if pw:
+            await get_adb().execute("UPDATE users SET password=%s WHERE id=%s", (pw, user[0]))
+
+    return library.login_success(user[1])
+
+
+# (endpoint, method) -> coroutine; anything else goes to Flask
+ASYNC_VIEWS = {
+    ("books", "GET"): books,
+    ("authors", "GET"): authors,
+    ("book_detail", "GET"): book_detail,
+    ("login", "POST"): login,
+}
+
+
+# ==================================================
+# ASGI <-> WSGI
+# ==================================================
+
+class ReceiveStream(io.RawIOBase):
+    # wsgi.input for a Flask thread: pulls body chunks off the event loop
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b""
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def _more(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        self._buffer += message.get("body", b"")
+        self._done = message["type"] == "http.disconnect" or not message.get("more_body", False)
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._buffer) < size):
+            self._more()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        while b"\n" not in self._buffer and not self._done and (size < 0 or len(self._buffer) < size):
+            self._more()
+        end = self._buffer.find(b"\n") + 1 or len(self._buffer)
+        if size >= 0:
+            end = min(end, size)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if message["type"] == "http.disconnect" or not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def wsgi_environ(scope, receive, loop):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root, path = scope.get("root_path", ""), scope["path"]
+    if root and path.startswith(root):
+        path = path[len(root):]
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": ReceiveStream(receive, loop),
+        "wsgi.input_terminated": True,      # the stream ends with the body, chunked or not
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def response_headers(headers):
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+
+async def run_async_view(environ, receive):
+    # The response, or None when Flask should serve this request
+    with app.request_context(environ):
+        rule = request.url_rule
+        view = rule and ASYNC_VIEWS.get((rule.endpoint, request.method))
+        if view is None or library.wants_stream():
+            return None
+
+        environ["wsgi.input"] = io.BytesIO(await read_body(receive))
+        library.start_timing()
+        try:
+            rv = await view(**request.view_args)
+        except Exception as e:
+            rv = app.handle_user_exception(e)   # registered handlers; re-raises the rest
+        return app.process_response(app.make_response(rv))
+
+
+async def run_flask(environ, send):
+    # The WSGI app on a worker thread. Body chunks come back through a
+    # queue; the semaphore keeps a slow client from buffering a whole export.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(8)
+    stop = threading.Event()
+    head = {}
+
+    def put(item):
+        slots.acquire()
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def start_response(status, headers, exc_info=None):
+        head["status"] = int(status.split(" ", 1)[0])
+        head["headers"] = headers
+        return put
+
+    def run():
+        try:
+            result = app(environ, start_response)
+            try:
+                for chunk in result:
+                    if stop.is_set():
+                        return
+                    if chunk:
+                        put(chunk)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except BaseException as e:
+            put(e)
+            return
+        put(None)
+
+    done = loop.run_in_executor(get_threads(), run)
+    started = False
+    try:
+        while True:
+            item = await queue.get()
+            slots.release()
+            if isinstance(item, BaseException):
+                if started:
+                    raise item      # the server drops the half-sent response
+                await send({"type": "http.response.start", "status": 500,
+                            "headers": [(b"content-type", b"text/plain")]})
+                await send({"type": "http.response.body", "body": b"Internal Server Error"})
+                break
+            if not started:
+                await send({"type": "http.response.start", "status": head["status"],
+                            "headers": response_headers(head["headers"])})
+                started = True
+            if item is None:
+                await send({"type": "http.response.body", "body": b""})
+                break
+            await send({"type": "http.response.body", "body": item, "more_body": True})
+    finally:
+        # Let a thread blocked in put() see the stop flag
+        stop.set()
+        for _ in range(8):
+            slots.release()
+    await done
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # A first get_catalog() would load the snapshot on the loop thread
+            await asyncio.get_running_loop().run_in_executor(get_threads(), library.get_catalog)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            for adb in [_adb, *_replica_adbs.values()]:
+                if adb is not None:
+                    await adb.close()
+            if _threads is not None:
+                _threads.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise RuntimeError(f"unsupported ASGI scope {scope['type']!r}")
+
+    environ = wsgi_environ(scope, receive, asyncio.get_running_loop())
+    resp = await run_async_view(environ, receive)
+    if resp is None:
+        return await run_flask(environ, send)
+
+    await send({"type": "http.response.start", "status": resp.status_code,
+                "headers": response_headers(resp.headers.items())})
+    await send({"type": "http.response.body", "body": resp.get_data()})
+
+
+if __name__ == "__main__":
+    import uvicorn     # pip install uvicorn
+
+    library.init_db()
+    uvicorn.run(application, host="127.0.0.1", port=int(os.environ.get("PORT", 8000)))
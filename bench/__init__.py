@@ -0,0 +1,2 @@
+# Benchmarks for the Library API. Run them as modules from the repo root,
+# e.g. `python -m bench.templates`.
@@ -0,0 +1,255 @@
+# ==================================================
+# CHECKOUT STRESS TEST
+# Hundreds of concurrent clients on one hot title, against a
+# throwaway SQLite database served by app.py (bench.load's
+# server). Counts every copy that moved and checks the books
+# and loans tables agree afterwards, then prints JSON:
+#   adjust     stock corrections (/books/edit copies_delta=-1) racing
+#              each other: none lost, none below zero
+#   drain      everyone checks out once, fewer copies than clients
+#   churn      checkout + return for --duration seconds
+#   idempotent every client sends the same Idempotency-Key
+#
+#   python -m bench.checkout --clients 200 --duration 10
+# ==================================================
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from bench.load import REPO, Client, free_port, login, percentile, seed, start_server
+
+HOT = 1     # book_id every client goes after
+
+
+def run_clients(n, host, port, token, fn):
+    # fn(client, n) in n threads that start together; returns their results
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        client = Client(host, port, token)
+        barrier.wait()
+        results[i] = fn(client, i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def call(client, method, path, body=None, headers=None, samples=None):
+    # -> (status, parsed JSON or None)
+    t0 = time.perf_counter()
+    try:
+        status, raw = client.request(method, path, body, dict(headers or {}, **{"Content-Type": "application/json"}))
+    except (OSError, http.client.HTTPException):
+        return "exception", None
+    if samples is not None:
+        samples.append((time.perf_counter() - t0) * 1000)
+    try:
+        return status, json.loads(raw)
+    except ValueError:
+        return status, None
+
+
+def latency(samples, seconds):
+    samples.sort()
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / seconds, 1),
+        "p50_ms": percentile(samples, 50),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": round(samples[-1], 3) if samples else None,
+    }
+
+
+def count(results, key):
+    out = {}
+    for r in results:
+        for status, n in r[key].items():
+            out[str(status)] = out.get(str(status), 0) + n
+    return out
+
+
+class Database:
+    # Direct reads / resets, next to the server process
+
+    def __init__(self, path):
+        sys.path.insert(0, REPO)
+        from storage import SQLiteBackend
+        self.backend = SQLiteBackend(path)
+
+    def query(self, sql, params=()):
+        with self.backend.acquire() as db:
+            cur = db.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            db.commit()
+            return rows
+
+    def copies(self):
+        return self.query("SELECT available_copies FROM books WHERE book_id=%s", (HOT,))[0][0]
+
+    def open_loans(self):
+        return self.query("SELECT COUNT(*) FROM loans WHERE book_id=%s AND returned_at IS NULL", (HOT,))[0][0]
+
+    def reset(self, copies):
+        self.query("UPDATE loans SET returned_at=UTC_TIMESTAMP() WHERE returned_at IS NULL")
+        self.query("UPDATE books SET available_copies=%s WHERE book_id=%s", (copies, HOT))
+
+
+def adjust(db, host, port, token, args):
+    # Everyone writes off one copy per round through the edit form; the
+    # delta is conditional, so exactly `copies` of them can succeed
+    db.reset(args.copies)
+
+    def client(c, i):
+        done = {}
+        for _ in range(args.rounds):
+            status, book = call(c, "GET", f"/books/{HOT}?format=json")
+            if status != 200:
+                continue
+            form = urllib.parse.urlencode({"title": book["title"], "genre": book["genre"], "copies_delta": -1})
+            try:
+                status, _ = c.request("POST", f"/books/edit/{HOT}", form,
+                                      {"Content-Type": "application/x-www-form-urlencoded"})
+            except (OSError, http.client.HTTPException):
+                status = "exception"
+            done[status] = done.get(status, 0) + 1
+        return {"status": done}
+
+    status = count(run_clients(args.clients, host, port, token, client), "status")
+    final = db.copies()
+    return {
+        "copies": args.copies,
+        "status": status,
+        "final_copies": final,
+        "ok": status.get("302", 0) == args.copies and final == 0,
+    }
+
+
+def drain(db, host, port, token, args):
+    # More clients than copies, one checkout each: exactly `copies` may win
+    copies = args.clients // 2
+    db.reset(copies)
+    samples = []
+
+    def client(c, i):
+        status, body = call(c, "POST", f"/books/{HOT}/checkout", samples=samples)
+        return {"status": {status: 1}, "left": body.get("available_copies") if status == 201 else None}
+
+    start = time.perf_counter()
+    results = run_clients(args.clients, host, port, token, client)
+    seconds = time.perf_counter() - start
+    status = count(results, "status")
+    left = [r["left"] for r in results if r["left"] is not None]
+    final, loans = db.copies(), db.open_loans()
+    return {
+        "copies": copies,
+        "status": status,
+        "final_copies": final,
+        "open_loans": loans,
+        "min_copies_seen": min(left) if left else None,
+        "ok": status.get("201", 0) == copies == loans and final == 0 and all(n >= 0 for n in left),
+        **latency(samples, seconds),
+    }
+
+
+def churn(db, host, port, token, args):
+    # Checkout + return in a loop on the one title, copies < clients
+    db.reset(args.copies)
+    samples = []
+    stop_at = time.monotonic() + args.duration
+
+    def client(c, i):
+        counts = {"checkout": {}, "return": {}, "negative": 0}
+        while time.monotonic() < stop_at:
+            status, body = call(c, "POST", f"/books/{HOT}/checkout", samples=samples)
+            counts["checkout"][status] = counts["checkout"].get(status, 0) + 1
+            if status != 201:
+                continue
+            counts["negative"] += body["available_copies"] < 0
+            status, body = call(c, "POST", f"/loans/{body['loan_id']}/return", samples=samples)
+            counts["return"][status] = counts["return"].get(status, 0) + 1
+        return counts
+
+    start = time.perf_counter()
+    results = run_clients(args.clients, host, port, token, client)
+    seconds = time.perf_counter() - start
+    checkouts, returns = count(results, "checkout"), count(results, "return")
+    out_now = checkouts.get("201", 0) - returns.get("200", 0)
+    final, loans = db.copies(), db.open_loans()
+    return {
+        "copies": args.copies,
+        "checkout_status": checkouts,
+        "return_status": returns,
+        "final_copies": final,
+        "open_loans": loans,
+        "negative_seen": sum(r["negative"] for r in results),
+        "ok": final == args.copies - out_now and loans == out_now,
+        **latency(samples, seconds),
+    }
+
+
+def idempotent(db, host, port, token, args):
+    # One key from every client at once: one loan, one copy
+    db.reset(args.copies)
+    key = f"bench-{random.random()}"
+
+    def client(c, i):
+        return call(c, "POST", f"/books/{HOT}/checkout", headers={"Idempotency-Key": key})
+
+    results = run_clients(args.clients, host, port, token, client)
+    loan_ids = {body["loan_id"] for status, body in results if status == 201}
+    return {
+        "status": count([{"s": {status: 1}} for status, _ in results], "s"),
+        "distinct_loans": len(loan_ids),
+        "copies_taken": args.copies - db.copies(),
+        "ok": len(loan_ids) == 1 and db.open_loans() == 1 and args.copies - db.copies() == 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--copies", type=int, default=20, help="hot title copies for adjust / churn / idempotent")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of churn")
+    parser.add_argument("--rounds", type=int, default=3, help="write-offs per adjust client")
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    args = parser.parse_args()
+    args.no_cache = True    # reads in the adjust phase must see every write
+
+    with tempfile.TemporaryDirectory(prefix="library-checkout-") as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        seed(db_path, max(args.books // 20, 1), args.books, "bench", "bench-password", args.bcrypt_rounds,
+             random.Random(1))
+        port = free_port()
+        proc = start_server(db_path, port, args)
+        try:
+            ok, token = login(Client("127.0.0.1", port), "bench", "bench-password")
+            if not ok:
+                raise SystemExit("login failed")
+            db = Database(db_path)
+            results = {"clients": args.clients, "server": args.server}
+            for phase in (adjust, drain, churn, idempotent):
+                results[phase.__name__] = phase(db, "127.0.0.1", port, token, args)
+        finally:
+            proc.terminate()
+            proc.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
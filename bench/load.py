@@ -0,0 +1,377 @@
+# ==================================================
+# LOAD TEST
+# Seeds a synthetic catalog into a throwaway SQLite database,
+# serves app.py from a separate process and drives the real
+# routes with concurrent keep-alive clients. Prints latency
+# percentiles, throughput and error rates per scenario.
+#
+#   python -m bench.load --books 20000 --workers 8 --duration 10
+#   python -m bench.load --out bench/history.jsonl   # append one line per run
+#   python -m bench.load --url http://host:5000 --username u --password p
+#   python -m bench.load --server asgi --workers 64    # asgi.py under uvicorn
+# ==================================================
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GENRES = ["Fiction", "History", "Science", "Fantasy", "Mystery", "Poetry", "Drama", "Travel"]
+WORDS = [
+    "shadow", "river", "empire", "garden", "winter", "silver", "storm", "island", "machine",
+    "letters", "night", "ocean", "stone", "forest", "memory", "signal", "harvest", "tower",
+    "glass", "journey", "kingdom", "mountain", "secret", "summer", "thunder", "voyage",
+]
+FIRST_NAMES = ["Ada", "Boris", "Clara", "Dmitri", "Elena", "Farid", "Grace", "Hugo", "Iris", "Jonas"]
+LAST_NAMES = ["Archer", "Baker", "Castillo", "Dubois", "Eriksen", "Fujita", "Garcia", "Haddad",
+              "Ivanova", "Jensen", "Kowalski", "Lindqvist", "Moreau", "Nakamura", "Okafor"]
+
+TOKEN_RE = re.compile(r"<textarea readonly>([^<]+)</textarea>")
+
+
+# ---------- SEED ----------
+
+def seed(path, n_authors, n_books, username, password, rounds, rng):
+    # Goes straight to the storage layer; only the traffic goes through the app
+    sys.path.insert(0, REPO)
+    import migrate
+    from hashing import hash_password
+    from storage import SQLiteBackend
+
+    backend = SQLiteBackend(path)
+    with backend.acquire() as db:
+        migrate.upgrade(db)
+        cur = db.cursor()
+        cur.executemany(
+            "INSERT INTO authors (first_name, last_name) VALUES (%s, %s)",
+            [(rng.choice(FIRST_NAMES), f"{rng.choice(LAST_NAMES)}{i}") for i in range(n_authors)],
+        )
+        today = datetime.date.today()
+        for start in range(0, n_books, 5000):
+            cur.executemany(
+                "INSERT INTO books (title, author_id, genre, publish_year, available_copies, date_added, updated_at)"
+                " VALUES (%s, %s, %s, %s, %s, %s, UTC_TIMESTAMP())",
+                [
+                    (
+                        f"The {rng.choice(WORDS).title()} of {rng.choice(WORDS).title()} {i}",
+                        rng.randint(1, n_authors), rng.choice(GENRES),
+                        rng.randint(1850, 2024), rng.randint(0, 12), today,
+                    )
+                    for i in range(start, min(start + 5000, n_books))
+                ],
+            )
+        cur.execute(
+            "INSERT INTO users (username, password) VALUES (%s, %s)",
+            (username, hash_password(password, rounds)),
+        )
+        db.commit()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path, port, args):
+    env = dict(os.environ, DB_BACKEND="sqlite", SQLITE_PATH=db_path, DB_REPLICAS="")
+    cmd = [sys.executable, "-m", "bench.load", "--serve", "--port", str(port),
+           "--bcrypt-rounds", str(args.bcrypt_rounds), "--server", args.server]
+    if args.no_cache:
+        cmd.append("--no-cache")
+    proc = subprocess.Popen(cmd, cwd=REPO, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with code {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("server did not start within 30s")
+
+
+def serve(args):
+    # Runs in the child process
+    import logging
+    from werkzeug.serving import make_server
+
+    sys.path.insert(0, REPO)
+    from app import app
+
+    app.config.update(CACHE_ENABLED=not args.no_cache, BCRYPT_LOG_ROUNDS=args.bcrypt_rounds)
+    if args.server == "asgi":
+        import uvicorn      # pip install uvicorn
+        from asgi import application
+        uvicorn.run(application, host="127.0.0.1", port=args.port, log_level="error")
+        return
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", args.port, app, threaded=True).serve_forever()
+
+
+# ---------- TRAFFIC ----------
+
+class Client:
+    # One keep-alive connection per worker
+
+    def __init__(self, host, port, token=None):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.token = token
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = "Bearer " + self.token
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            return resp.status, resp.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()   # reconnects on the next request
+            raise
+
+
+def login(client, username, password):
+    status, body = client.request(
+        "POST", "/login",
+        body=urllib.parse.urlencode({"username": username, "password": password}),
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    m = TOKEN_RE.search(body.decode("utf-8", "replace"))
+    return status == 200 and m is not None, m.group(1) if m else None
+
+
+# Each scenario returns (method, path, body, headers); weights are relative
+def _books(fmt):
+    def build(rng, ctx):
+        params = {"limit": 50}
+        if fmt:
+            params["format"] = fmt
+        if rng.random() < 0.5:
+            params["genre"] = rng.choice(GENRES)
+        if rng.random() < 0.3:
+            params["sort"] = rng.choice(["title", "publish_year"])
+        return "GET", "/books?" + urllib.parse.urlencode(params), None, None
+    return build
+
+
+def _search(rng, ctx):
+    q = rng.choice(WORDS) if rng.random() < 0.7 else rng.choice(WORDS)[:3]
+    return "GET", f"/books/search?format=json&q={q}", None, None
+
+
+def _detail(rng, ctx):
+    return "GET", f"/books/{rng.randint(1, ctx['books'])}?format=json", None, None
+
+
+def _write(rng, ctx):
+    body = {"operations": [{"op": "update", "id": rng.randint(1, ctx["books"]),
+                            "data": {"publish_year": rng.randint(1850, 2024)}}]}
+    return "POST", "/books/batch", json.dumps(body), {"Content-Type": "application/json"}
+
+
+def _login(rng, ctx):
+    body = urllib.parse.urlencode({"username": ctx["username"], "password": ctx["password"]})
+    return "POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+SCENARIOS = {
+    "books_json": (30, _books("json")),
+    "books_xml": (10, _books("xml")),
+    "books_html": (10, _books(None)),
+    "search": (20, _search),
+    "book_detail": (20, _detail),
+    "write": (5, _write),
+    "login": (1, _login),
+}
+
+
+def worker(n, host, port, token, ctx, mix, start_at, stop_at, results):
+    rng = random.Random(ctx["seed"] * 1000 + n)
+    names = [name for name, _ in mix]
+    weights = [w for _, w in mix]
+    client = Client(host, port, token)
+    local = {name: {"ms": [], "errors": 0, "status": {}} for name in names}
+    while time.monotonic() < stop_at:
+        name = rng.choices(names, weights)[0]
+        method, path, body, headers = SCENARIOS[name][1](rng, ctx)
+        t0 = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, headers)
+        except (OSError, http.client.HTTPException):
+            status = "exception"
+        elapsed = (time.perf_counter() - t0) * 1000
+        if time.monotonic() < start_at:
+            continue    # warm-up
+        entry = local[name]
+        entry["ms"].append(elapsed)
+        entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+        if status == "exception" or status >= 400:
+            entry["errors"] += 1
+    results.append(local)
+
+
+def percentile(samples, p):
+    # Nearest rank on a sorted list
+    if not samples:
+        return None
+    k = max(0, min(len(samples) - 1, int(round(p / 100 * len(samples) + 0.5)) - 1))
+    return round(samples[k], 3)
+
+
+def summarize(results, seconds):
+    scenarios = {}
+    total = errors = 0
+    for name in sorted({n for r in results for n in r}):
+        ms = sorted(x for r in results for x in r[name]["ms"])
+        errs = sum(r[name]["errors"] for r in results)
+        status = {}
+        for r in results:
+            for code, count in r[name]["status"].items():
+                status[code] = status.get(code, 0) + count
+        if not ms:
+            continue
+        total += len(ms)
+        errors += errs
+        scenarios[name] = {
+            "count": len(ms),
+            "rps": round(len(ms) / seconds, 1),
+            "errors": errs,
+            "error_rate": round(errs / len(ms), 4),
+            "mean_ms": round(statistics.fmean(ms), 3),
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "max_ms": round(ms[-1], 3),
+            "status": status,
+        }
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "rps": round(total / seconds, 1),
+    }, scenarios
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    # "books_json=5,search=1" -> [("books_json", 5), ("search", 1)]
+    if not text:
+        return [(name, weight) for name, (weight, _) in SCENARIOS.items()]
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds discarded first")
+    parser.add_argument("--mix", help="scenario weights, e.g. books_json=5,search=1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--url", help="target a running server instead of a local one")
+    parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi",
+                        help="wsgi: app.py on a threaded server; asgi: asgi.py on uvicorn")
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--out", help="append the result as one JSON line to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    proc = tmp = None
+    try:
+        if args.url:
+            target = urllib.parse.urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+        else:
+            tmp = tempfile.TemporaryDirectory(prefix="library-bench-")
+            db_path = os.path.join(tmp.name, "bench.sqlite3")
+            t0 = time.perf_counter()
+            seed(db_path, args.authors, args.books, args.username, args.password, args.bcrypt_rounds, rng)
+            seed_seconds = time.perf_counter() - t0
+            host, port = "127.0.0.1", free_port()
+            proc = start_server(db_path, port, args)
+
+        ok, token = login(Client(host, port), args.username, args.password)
+        if not ok:
+            raise SystemExit("login failed; check --username / --password")
+
+        ctx = {"books": args.books, "username": args.username, "password": args.password, "seed": args.seed}
+        results = []
+        start_at = time.monotonic() + args.warmup
+        stop_at = start_at + args.duration
+        threads = [
+            threading.Thread(target=worker, args=(n, host, port, token, ctx, mix, start_at, stop_at, results))
+            for n in range(args.workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        totals, scenarios = summarize(results, args.duration)
+        report = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "target": args.url or "local-sqlite",
+            "server": None if args.url else args.server,
+            "books": args.books,
+            "authors": args.authors,
+            "workers": args.workers,
+            "duration_s": args.duration,
+            "cache": not args.no_cache,
+            "seed_s": None if args.url else round(seed_seconds, 3),
+            "totals": totals,
+            "scenarios": scenarios,
+        }
+        print(json.dumps(report, indent=2))
+        if args.out:
+            with open(args.out, "a", encoding="utf-8") as fp:
+                fp.write(json.dumps(report) + "\n")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# ==================================================
+# CATALOG SNAPSHOT BENCHMARK
+# Seeds a synthetic catalog into a throwaway SQLite database,
+# loads the in-memory snapshot (catalog.py) from it and reports
+# its memory next to the latency of the list and detail routes
+# served by SQL and by the snapshot.
+#
+#   python -m bench.snapshot [books] [iterations]
+# ==================================================
+
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.load import seed
+
+
+def timed(fn, iterations):
+    fn()    # warm up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+    }
+
+
+def main():
+    n_books = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    n_authors = max(n_books // 20, 1)
+
+    with tempfile.TemporaryDirectory(prefix="library-snapshot-") as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        seed(db_path, n_authors, n_books, "bench", "bench-password", 4, random.Random(1))
+        os.environ.update(DB_BACKEND="sqlite", SQLITE_PATH=db_path)
+
+        import jwt
+        import app as library
+        app = library.app
+        app.config.update(CACHE_ENABLED=False, CATALOG_SNAPSHOT=True)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        library.get_catalog()
+        load_ms = (time.perf_counter() - start) * 1000
+        traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = library.catalog
+
+        token = jwt.encode(
+            {"user": "bench", "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)},
+            app.config["SECRET_KEY"], algorithm="HS256",
+        )
+        client = app.test_client()
+        headers = {"Authorization": "Bearer " + token}
+        urls = {
+            "first_page": "/books?format=json",
+            "title_desc": "/books?format=json&sort=title&order=desc",
+            "genre": "/books?format=json&genre=Poetry&sort=publish_year",
+            "year_range": "/books?format=json&year_from=1990&year_to=1994&sort=title",
+            "author_prefix": "/books?format=json&author=Nak&sort=title",
+            "authors": "/authors?format=json&sort=last_name",
+            "detail": f"/books/{n_books // 2}?format=json",
+        }
+
+        routes = {}
+        for name, url in urls.items():
+            for mode in (False, True):
+                app.config["CATALOG_SNAPSHOT"] = mode
+
+                def get():
+                    resp = client.get(url, headers=headers)
+                    assert resp.status_code == 200, (url, resp.status_code)
+
+                routes.setdefault(name, {})["snapshot" if mode else "sql"] = timed(get, iterations)
+
+        row = (n_books + 1, "The Bench of Deltas", 1, "Poetry", 2001, 3, datetime.datetime.now())
+        results = {
+            "books": n_books,
+            "authors": n_authors,
+            "iterations": iterations,
+            "load_ms": round(load_ms, 1),
+            "footprint_bytes": snapshot.footprint(),
+            "tracemalloc_bytes": traced,
+            "bytes_per_book": round(snapshot.footprint() / n_books),
+            "put_book": timed(lambda: snapshot.put_book(row), iterations),
+            "routes": routes,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# ==================================================
+# SUGGEST BENCHMARK
+# Builds the type-ahead index (suggest.py) over a synthetic
+# catalog with skewed view counts, then times lookups for
+# every prefix a user types on the way to a real title or
+# author name, next to the full-text search it replaces. Then
+# times the /books/suggest route itself on a seeded SQLite
+# catalog: token check, catalog version check, lookup, JSON.
+#
+#   python -m bench.suggest [books] [lookups]
+# ==================================================
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from bench.load import FIRST_NAMES, GENRES, LAST_NAMES, REPO, WORDS, seed
+from search_index import SearchIndex
+from suggest import SuggestIndex
+
+
+def percentiles(samples):
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def timed(fn, args):
+    samples = []
+    for a in args:
+        start = time.perf_counter()
+        fn(a)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def route(n_authors, n_books, typed):
+    # -> {"version_ttl_default": ..., "version_ttl_0": ...}; TTL 0 reads
+    # catalog_meta on every request, as the route did before
+    sys.path.insert(0, REPO)
+    import jwt
+    import app as library
+
+    with tempfile.TemporaryDirectory(prefix="library-suggest-") as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        seed(path, n_authors, n_books, "bench", "bench-password", 4, random.Random(1))
+        app = library.app
+        app.config.update(DB_BACKEND="sqlite", SQLITE_PATH=path, DB_REPLICAS=[], CACHE_ENABLED=False)
+        library._storage = None
+        token = jwt.encode({"user": "bench", "exp": int(time.time()) + 3600}, app.config["SECRET_KEY"],
+                           algorithm="HS256")
+        headers = {"Authorization": "Bearer " + token}
+        client = app.test_client()
+
+        def get(prefix):
+            resp = client.get("/books/suggest?format=json&prefix=" + urllib.parse.quote(prefix), headers=headers)
+            assert resp.status_code == 200, resp.status_code
+
+        get("warm")     # builds the index
+        results = {"version_ttl_default": timed(get, typed)}
+        default_ttl = app.config["CATALOG_VERSION_TTL"]
+        app.config["CATALOG_VERSION_TTL"] = 0
+        results["version_ttl_0"] = timed(get, typed)
+        app.config["CATALOG_VERSION_TTL"] = default_ttl
+        library._storage = None
+        return results
+
+
+def main():
+    n_books = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    n_authors = max(n_books // 20, 1)
+    rng = random.Random(1)
+
+    authors = [(i, rng.choice(FIRST_NAMES), f"{rng.choice(LAST_NAMES)}{i}") for i in range(1, n_authors + 1)]
+    books = [
+        (i, f"The {rng.choice(WORDS).title()} of {rng.choice(WORDS).title()} {i}", rng.randint(1, n_authors))
+        for i in range(1, n_books + 1)
+    ]
+
+    index = SuggestIndex()
+    start = time.perf_counter()
+    index.load(authors, books)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Zipf-like views: a few titles get most of the traffic
+    views = [min(int(rng.paretovariate(1.2)), n_books) for _ in range(n_books)]
+    start = time.perf_counter()
+    for n in views:
+        index.record_view(n)
+    view_us = (time.perf_counter() - start) / len(views) * 1e6
+
+    # What a user types: every prefix of a title or name, up to 12 characters
+    targets = [rng.choice(books)[1] if rng.random() < 0.7 else " ".join(rng.choice(authors)[1:]) for _ in range(lookups)]
+    typed = [t[:rng.randint(1, min(12, len(t)))] for t in targets]
+    suggest = timed(lambda p: index.suggest(p, 10), typed)
+
+    search = SearchIndex()
+    search.load({"book_id": b[0], "title": b[1], "author": None, "genre": rng.choice(GENRES), "publish_year": 2000}
+                for b in books)
+    full_text = timed(lambda p: search.search(p, 10), typed[:2000])
+
+    edits = [(rng.randint(1, n_books), f"The {rng.choice(WORDS).title()} Edition", rng.randint(1, n_authors))
+             for _ in range(500)]
+    put_book = timed(index.put_book, edits)
+
+    suggest_route = route(n_authors, n_books, typed[:2000])
+
+    print(json.dumps({
+        "books": n_books,
+        "authors": n_authors,
+        "entries": index.stats()["entries"],
+        "cached_prefixes": index.stats()["cached_prefixes"],
+        "load_ms": round(load_ms, 1),
+        "lookups": lookups,
+        "suggest": suggest,
+        "search_index_same_prefixes": full_text,
+        "record_view_us": round(view_us, 1),
+        "put_book": put_book,
+        "suggest_route": suggest_route,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# ==================================================
+# TEMPLATE RENDER BENCHMARK
+# Old path: render_template_string() compiles the page source on every
+# request. New path: render_template() reuses the compiled template.
+#
+#   python -m bench.templates [iterations] [rows]
+# ==================================================
+
+import json
+import statistics
+import sys
+import time
+
+from flask import render_template, render_template_string
+
+from app import app
+
+
+def sample_books(rows):
+    return [
+        {
+            "book_id": i,
+            "title": f"Book {i}",
+            "author": f"Author {i % 50}",
+            "genre": ("Fiction", "History", "Science")[i % 3],
+            "publish_year": 1900 + i % 120,
+        }
+        for i in range(1, rows + 1)
+    ]
+
+
+def timed(fn, iterations):
+    fn()    # warm up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+    }
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    books = sample_books(rows)
+
+    with app.test_request_context("/books"):
+        source = app.jinja_env.loader.get_source(app.jinja_env, "books.html")[0]
+        results = {
+            "iterations": iterations,
+            "rows": rows,
+            "render_template_string": timed(
+                lambda: render_template_string(source, books=books, next_url=None), iterations
+            ),
+            "render_template": timed(
+                lambda: render_template("books.html", books=books, next_url=None), iterations
+            ),
+        }
+
+    before = results["render_template_string"]["mean_ms"]
+    after = results["render_template"]["mean_ms"]
+    results["speedup"] = round(before / after, 2) if after else None
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# ==================================================
+# RESPONSE CACHE
+# LRU + TTL store for rendered catalog responses, with
+# tag versions so write routes can evict precisely.
+# ==================================================
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# ---------- BACKENDS ----------
+# A backend stores entries and per-tag version counters.
+# Versions must never be evicted, otherwise a stale entry
+# could look current again.
+
+class LocalBackend:
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.entries = LRUCache(maxsize, ttl)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def versions(self, tags):
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    @property
+    def evictions(self):
+        return self.entries.evictions
+
+    def size(self):
+        return len(self.entries)
+
+
+class SharedBackend:
+    # Any client with get / set(ex=) / mget / incr works (redis.Redis does).
+
+    def __init__(self, client, ttl=60, prefix="library:cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0    # expiry happens inside the shared store
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def versions(self, tags):
+        if not tags:
+            return []
+        raw = self.client.mget([self.prefix + "tag:" + t for t in tags])
+        return [int(v) if v is not None else 0 for v in raw]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.client.incr(self.prefix + "tag:" + tag)
+
+    def size(self):
+        return None
+
+
+class MemoryClient:
+    # Local stand-in for a shared store (tests, single box)
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+
+    def mget(self, keys):
+        return [self.get(k) for k in keys]
+
+    def incr(self, key):
+        with self._lock:
+            expires, value = self._data.get(key, (None, 0))
+            value = int(value) + 1
+            self._data[key] = (expires, value)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# ---------- CACHE ----------
+
+class ResponseCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0          # dropped because a tag was invalidated
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count("misses")
+            return None
+        value, tags, versions = entry
+        if self.backend.versions(tags) != versions:
+            self._count("stale")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value
+
+    def snapshot(self, tags):
+        # Take this *before* reading the data the tags describe, so a
+        # write landing while the response is built still invalidates it
+        tags = list(tags)
+        return dict(zip(tags, self.backend.versions(tags)))
+
+    def set(self, key, value, snapshot):
+        tags = list(snapshot)
+        self.backend.set(key, (value, tags, [snapshot[t] for t in tags]))
+
+    def invalidate(self, *tags):
+        self.backend.bump(tags)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": self.backend.size(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.backend.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
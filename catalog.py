@@ -0,0 +1,358 @@
+# ==================================================
+# CATALOG SNAPSHOT
+# In-process read model of books and authors: __slots__
+# records, one sorted list per sort order, and secondary
+# indexes by genre, year and author. app.py applies the
+# write routes' changes to it and reloads it when the
+# database's catalog version moves on without us.
+# ==================================================
+
+import bisect
+import sys
+import threading
+import time
+
+# Same columns, in the same order, as the SQL the routes run
+BOOK_COLUMNS = ["book_id", "title", "author", "genre", "publish_year", "available_copies"]
+DETAIL_COLUMNS = BOOK_COLUMNS + ["updated_at"]
+AUTHOR_COLUMNS = ["author_id", "first_name", "last_name"]
+
+
+class Book:
+    __slots__ = ("book_id", "title", "author_id", "genre", "publish_year", "available_copies", "updated_at")
+
+    def __init__(self, book_id, title, author_id, genre, publish_year, available_copies, updated_at):
+        self.book_id = book_id
+        self.title = title
+        self.author_id = author_id
+        self.genre = sys.intern(genre) if isinstance(genre, str) else genre
+        self.publish_year = publish_year
+        self.available_copies = available_copies
+        self.updated_at = updated_at
+
+
+class Author:
+    __slots__ = ("author_id", "first_name", "last_name", "name")
+
+    def __init__(self, author_id, first_name, last_name):
+        self.author_id = author_id
+        self.first_name = first_name
+        self.last_name = last_name
+        # CONCAT(first_name,' ',last_name): NULL if either part is
+        self.name = None if first_name is None or last_name is None else f"{first_name} {last_name}"
+
+
+def sort_key(value, row_id):
+    # MySQL order: NULLs first ascending, the id breaks ties
+    return (value is not None, value, row_id)
+
+
+BOOK_KEYS = {
+    "book_id": lambda b: b.book_id,
+    "title": lambda b: sort_key(b.title, b.book_id),
+    "publish_year": lambda b: sort_key(b.publish_year, b.book_id),
+}
+AUTHOR_KEYS = {
+    "author_id": lambda a: a.author_id,
+    "last_name": lambda a: sort_key(a.last_name, a.author_id),
+}
+
+
+def _add(index, key, row_id):
+    index.setdefault(key, set()).add(row_id)
+
+
+def _discard(index, key, row_id):
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(row_id)
+        if not ids:
+            del index[key]
+
+
+def _insert(order, record, keyfn):
+    order.insert(bisect.bisect_left(order, keyfn(record), key=keyfn), record)
+
+
+def _delete(order, record, keyfn):
+    i = bisect.bisect_left(order, keyfn(record), key=keyfn)
+    if i < len(order) and order[i] is record:
+        del order[i]
+
+
+def _name_key(author):
+    # Entry in the last-name prefix index; None for a NULL last name
+    return (author.last_name.lower(), author.author_id) if author.last_name else None
+
+
+def _page(order, keyfn, cursor_key, desc, limit, keep):
+    # Walks the sorted records from just past the cursor
+    if desc:
+        i = len(order) - 1 if cursor_key is None else bisect.bisect_left(order, cursor_key, key=keyfn) - 1
+        step = -1
+    else:
+        i = 0 if cursor_key is None else bisect.bisect_right(order, cursor_key, key=keyfn)
+        step = 1
+    found = []
+    while 0 <= i < len(order) and len(found) < limit:
+        if keep(order[i]):
+            found.append(order[i])
+        i += step
+    return found
+
+
+def _cursor_key(cursor, sort, id_key):
+    if cursor is None:
+        return None
+    if sort == id_key:
+        return cursor[0]
+    return sort_key(cursor[0], cursor[1])
+
+
+class CatalogSnapshot:
+
+    def __init__(self):
+        self.loaded = False
+        self.version = None         # catalog_meta.version the data matches
+        self.updated_at = None
+        self.loaded_at = None
+
+        self._lock = threading.RLock()
+        self._books = {}            # book_id -> Book
+        self._authors = {}          # author_id -> Author
+        self._book_order = {sort: [] for sort in BOOK_KEYS}
+        self._author_order = {sort: [] for sort in AUTHOR_KEYS}
+        self._by_genre = {}         # genre -> {book_id}
+        self._by_year = {}          # publish_year -> {book_id}
+        self._by_author = {}        # author_id -> {book_id}
+        self._names = []            # sorted (lower(last_name), author_id)
+
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.deltas = 0
+
+    def __len__(self):
+        return len(self._books)
+
+    # ---------- WRITES ----------
+    def load(self, authors, books, version, updated_at):
+        # authors: (author_id, first_name, last_name) rows; books:
+        # (book_id, title, author_id, genre, publish_year, available_copies, updated_at).
+        # Built aside and swapped in, so reads carry on meanwhile.
+        start = time.perf_counter()
+        author_map = {row[0]: Author(*row) for row in authors}
+        book_map = {}
+        by_genre, by_year, by_author = {}, {}, {}
+        for row in books:
+            book = book_map[row[0]] = Book(*row)
+            _add(by_genre, book.genre, book.book_id)
+            _add(by_year, book.publish_year, book.book_id)
+            _add(by_author, book.author_id, book.book_id)
+        book_order = {sort: sorted(book_map.values(), key=keyfn) for sort, keyfn in BOOK_KEYS.items()}
+        author_order = {sort: sorted(author_map.values(), key=keyfn) for sort, keyfn in AUTHOR_KEYS.items()}
+        names = sorted(filter(None, map(_name_key, author_map.values())))
+
+        with self._lock:
+            self._books, self._authors = book_map, author_map
+            self._book_order, self._author_order = book_order, author_order
+            self._by_genre, self._by_year, self._by_author = by_genre, by_year, by_author
+            self._names = names
+            self.version, self.updated_at = version, updated_at
+            self.loaded_at = time.time()
+            self.loaded = True
+            self.loads += 1
+            self.load_seconds = time.perf_counter() - start
+
+    def set_version(self, version, updated_at):
+        with self._lock:
+            self.version, self.updated_at = version, updated_at
+
+    def put_book(self, row):
+        # Insert or replace; row as for load()
+        with self._lock:
+            self._drop_book(row[0])
+            book = self._books[row[0]] = Book(*row)
+            for sort, keyfn in BOOK_KEYS.items():
+                _insert(self._book_order[sort], book, keyfn)
+            _add(self._by_genre, book.genre, book.book_id)
+            _add(self._by_year, book.publish_year, book.book_id)
+            _add(self._by_author, book.author_id, book.book_id)
+            self.deltas += 1
+
+    def remove_book(self, book_id):
+        with self._lock:
+            if self._drop_book(book_id):
+                self.deltas += 1
+
+    def _drop_book(self, book_id):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return False
+        for sort, keyfn in BOOK_KEYS.items():
+            _delete(self._book_order[sort], book, keyfn)
+        _discard(self._by_genre, book.genre, book_id)
+        _discard(self._by_year, book.publish_year, book_id)
+        _discard(self._by_author, book.author_id, book_id)
+        return True
+
+    def put_author(self, row):
+        with self._lock:
+            self._drop_author(row[0])
+            author = self._authors[row[0]] = Author(*row)
+            for sort, keyfn in AUTHOR_KEYS.items():
+                _insert(self._author_order[sort], author, keyfn)
+            if _name_key(author):
+                bisect.insort(self._names, _name_key(author))
+            self.deltas += 1
+
+    def remove_author(self, author_id):
+        with self._lock:
+            if self._drop_author(author_id):
+                self.deltas += 1
+
+    def _drop_author(self, author_id):
+        author = self._authors.pop(author_id, None)
+        if author is None:
+            return False
+        for sort, keyfn in AUTHOR_KEYS.items():
+            _delete(self._author_order[sort], author, keyfn)
+        key = _name_key(author)
+        if key:
+            del self._names[bisect.bisect_left(self._names, key)]
+        return True
+
+    # ---------- READS ----------
+    def _row(self, book, author):
+        return (book.book_id, book.title, author.name, book.genre, book.publish_year, book.available_copies)
+
+    def books(self, sort, desc, cursor, limit, genre=None, year_from=None, year_to=None,
+              author_id=None, author_prefix=None):
+        # -> (BOOK_COLUMNS, row tuples), like the /books query with LIMIT limit.
+        # Raises ValueError for a cursor that doesn't fit the sort.
+        with self._lock:
+            # Equality filters narrow to a candidate set through the indexes
+            sets = []
+            if genre is not None:
+                sets.append(self._by_genre.get(genre, frozenset()))
+            if author_id is not None:
+                sets.append(self._by_author.get(author_id, frozenset()))
+            prefixed = None
+            if author_prefix:
+                prefix = author_prefix.lower()
+                prefixed = set()
+                for i in range(bisect.bisect_left(self._names, (prefix,)), len(self._names)):
+                    name, author = self._names[i]
+                    if not name.startswith(prefix):
+                        break
+                    prefixed.add(author)
+                # A narrow prefix is a candidate set; a broad one is checked per record
+                if len(prefixed) <= 64:
+                    sets.append({b for a in prefixed for b in self._by_author.get(a, ())})
+                    prefixed = None
+            if not sets and (year_from is not None or year_to is not None):
+                years = [y for y in self._by_year if y is not None
+                         and (year_from is None or y >= year_from) and (year_to is None or y <= year_to)]
+                if len(years) <= 5:
+                    sets.append({b for y in years for b in self._by_year[y]})
+
+            match = None
+            for ids in sorted(sets, key=len):
+                match = ids if match is None else match.intersection(ids)
+
+            authors = self._authors
+
+            def keep(b):
+                if match is not None and b.book_id not in match:
+                    return False
+                if year_from is not None and (b.publish_year is None or b.publish_year < year_from):
+                    return False
+                if year_to is not None and (b.publish_year is None or b.publish_year > year_to):
+                    return False
+                if prefixed is not None and b.author_id not in prefixed:
+                    return False
+                return b.author_id in authors      # the SQL is an inner join
+
+            keyfn = BOOK_KEYS[sort]
+            order = self._book_order[sort]
+            # Few candidates: sorting them beats walking the full order to find a page
+            if match is not None and 2 * len(match) ** 2 < limit * max(len(order), 1):
+                order = sorted((self._books[b] for b in match), key=keyfn)
+            try:
+                found = _page(order, keyfn, _cursor_key(cursor, sort, "book_id"), desc, limit, keep)
+            except TypeError:
+                raise ValueError("Cursor does not match sort")
+            return list(BOOK_COLUMNS), [self._row(b, authors[b.author_id]) for b in found]
+
+    def authors(self, sort, desc, cursor, limit):
+        with self._lock:
+            keyfn = AUTHOR_KEYS[sort]
+            try:
+                found = _page(self._author_order[sort], keyfn, _cursor_key(cursor, sort, "author_id"),
+                              desc, limit, lambda a: True)
+            except TypeError:
+                raise ValueError("Cursor does not match sort")
+            return list(AUTHOR_COLUMNS), [(a.author_id, a.first_name, a.last_name) for a in found]
+
+    def book(self, book_id):
+        # -> (DETAIL_COLUMNS, row) or None
+        with self._lock:
+            book = self._books.get(book_id)
+            author = book and self._authors.get(book.author_id)
+            if author is None:
+                return None
+            return list(DETAIL_COLUMNS), self._row(book, author) + (book.updated_at,)
+
+    def search_rows(self):
+        # Documents for SearchIndex.load(), same shape as SEARCH_SQL rows
+        with self._lock:
+            return [
+                {"book_id": b.book_id, "title": b.title, "author": self._authors[b.author_id].name,
+                 "genre": b.genre, "publish_year": b.publish_year}
+                for b in self._books.values() if b.author_id in self._authors
+            ]
+
+    # ---------- STATS ----------
+    def footprint(self):
+        # Bytes held by the snapshot: records, their values, the orders and
+        # indexes. Shared objects (interned genres, small ints) count once.
+        seen = set()
+
+        def size(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+
+        with self._lock:
+            total = 0
+            for records in (self._books, self._authors):
+                total += size(records)
+                for key, record in records.items():
+                    total += size(key) + size(record)
+                    total += sum(size(getattr(record, slot)) for slot in type(record).__slots__)
+            for orders in (self._book_order, self._author_order):
+                total += sum(size(order) for order in orders.values())
+            total += size(self._names) + sum(size(entry) + size(entry[0]) for entry in self._names)
+            for index in (self._by_genre, self._by_year, self._by_author):
+                total += size(index)
+                for key, ids in index.items():
+                    total += size(key) + size(ids)
+            return total
+
+    def stats(self, footprint=False):
+        with self._lock:
+            stats = {
+                "loaded": self.loaded,
+                "books": len(self._books),
+                "authors": len(self._authors),
+                "genres": len(self._by_genre),
+                "years": len(self._by_year),
+                "version": self.version,
+                "loaded_at": self.loaded_at,
+                "loads": self.loads,
+                "last_load_ms": round(self.load_seconds * 1000, 1),
+                "deltas": self.deltas,
+            }
+        if footprint:
+            stats["bytes"] = self.footprint()
+        return stats
@@ -0,0 +1,41 @@
+# ==================================================
+# RESPONSE COMPRESSION
+# Content-Encoding negotiation plus the encoders. Brotli is
+# offered only when the optional `brotli` package is installed.
+# ==================================================
+
+import gzip
+import zlib
+
+try:
+    import brotli   # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Server preference when the client rates several encodings equally
+ENCODINGS = ("br", "gzip", "deflate") if brotli else ("gzip", "deflate")
+
+# Encodings stored next to cached bodies; deflate-only clients are rare
+PRECOMPRESSED = ("br", "gzip") if brotli else ("gzip",)
+
+
+def negotiate(accept, offered=ENCODINGS):
+    # accept: werkzeug Accept (request.accept_encodings); None = send as is
+    if not accept:
+        return None
+    return accept.best_match(offered)
+
+
+def compress(data, encoding, level=6):
+    # level uses the zlib scale (1-9) for every encoding
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(data, level)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    raise ValueError(f"unsupported encoding {encoding!r}")
+
+
+def precompress(data, level=9):
+    return {encoding: compress(data, encoding, level) for encoding in PRECOMPRESSED}
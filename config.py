@@ -1,11 +1,17 @@
 import os
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 class Config:
 # Change these values for production
     SECRET_KEY = os.environ.get('SECRET_KEY', 'replace_this_with_a_secure_random_string')
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')     # 'mysql' or 'sqlite'
     MYSQL_HOST = os.environ.get('MYSQL_HOST', 'localhost')
     MYSQL_USER = os.environ.get('MYSQL_USER', 'root')
-    MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', '')
+    MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD', 'root')
     MYSQL_DB = os.environ.get('MYSQL_DB', 'library_db')
-    JWT_EXP_HOURS = int(os.environ.get('JWT_EXP_HOURS', '2'))
\ No newline at end of file
+    # Comma separated MySQL hosts ("db2,db3:3307") or SQLite paths for read-only routes
+    DB_REPLICAS = [r.strip() for r in os.environ.get('DB_REPLICAS', '').split(',') if r.strip()]
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(BASE_DIR, 'library.sqlite3'))
+    JWT_EXP_HOURS = int(os.environ.get('JWT_EXP_HOURS', '2'))
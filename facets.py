@@ -0,0 +1,225 @@
+# ==================================================
+# FACET COUNTS
+# In-memory aggregates behind /stats: books and available
+# copies per (genre, publish_year) cell, each split by
+# author, plus running totals per genre, decade and author.
+# app.py applies the write routes' changes through
+# catalog_changed(), so no request runs a GROUP BY.
+# ==================================================
+
+import heapq
+import threading
+
+
+def decade(year):
+    return None if year is None else year // 10 * 10
+
+
+def _bump(counts, key, books, copies):
+    pair = counts.get(key)
+    if pair is None:
+        pair = counts[key] = [0, 0]
+    pair[0] += books
+    pair[1] += copies
+    if not pair[0]:
+        del counts[key]
+
+
+class FacetCounts:
+
+    def __init__(self):
+        self.loaded = False
+        self.version = None         # catalog_meta.version the counts match
+
+        self._lock = threading.RLock()
+        self._books = {}            # book_id -> (genre, publish_year, author_id, copies)
+        self._authors = {}          # author_id -> (first_name, last_name)
+        self._cells = {}            # (genre, year) -> [books, copies]
+        self._cell_authors = {}     # (genre, year) -> {author_id: [books, copies]}
+        self._by_author = {}        # author_id -> {(genre, year): [books, copies]}, same lists
+        self._total = [0, 0]
+        self._genres = {}           # genre -> [books, copies]
+        self._decades = {}
+        self._author_totals = {}
+        self._genre_authors = {}    # genre -> {author_id: [books, copies]}
+
+    # ---------- WRITES ----------
+    def load(self, authors, books, version):
+        # Same rows as CatalogSnapshot.load()
+        with self._lock:
+            self._books, self._cells, self._cell_authors, self._by_author = {}, {}, {}, {}
+            self._total, self._genres, self._decades = [0, 0], {}, {}
+            self._author_totals, self._genre_authors = {}, {}
+            self._authors = {row[0]: (row[1], row[2]) for row in authors}
+            for row in books:
+                self._add(row)
+            self.version = version
+            self.loaded = True
+
+    def set_version(self, version, updated_at=None):
+        with self._lock:
+            self.version = version
+
+    def put_book(self, row):
+        with self._lock:
+            self._drop(row[0])
+            self._add(row)
+
+    def remove_book(self, book_id):
+        with self._lock:
+            self._drop(book_id)
+
+    def put_author(self, row):
+        with self._lock:
+            self._authors[row[0]] = (row[1], row[2])
+
+    def remove_author(self, author_id):
+        with self._lock:
+            self._authors.pop(author_id, None)
+
+    def _add(self, row):
+        # row: (book_id, title, author_id, genre, publish_year, available_copies, ...)
+        book_id, _, author_id, genre, year, copies = row[:6]
+        copies = copies or 0
+        self._books[book_id] = (genre, year, author_id, copies)
+        self._count(genre, year, author_id, 1, copies)
+
+    def _drop(self, book_id):
+        old = self._books.pop(book_id, None)
+        if old is not None:
+            genre, year, author_id, copies = old
+            self._count(genre, year, author_id, -1, -copies)
+
+    def _count(self, genre, year, author_id, books, copies):
+        key = (genre, year)
+        cell = self._cell_authors.setdefault(key, {})
+        pair = cell.get(author_id)
+        if pair is None:
+            pair = cell[author_id] = [0, 0]
+            self._by_author.setdefault(author_id, {})[key] = pair
+        pair[0] += books
+        pair[1] += copies
+        if not pair[0]:
+            del cell[author_id]
+            if not cell:
+                del self._cell_authors[key]
+            del self._by_author[author_id][key]
+            if not self._by_author[author_id]:
+                del self._by_author[author_id]
+
+        self._total[0] += books
+        self._total[1] += copies
+        _bump(self._cells, key, books, copies)
+        _bump(self._genres, genre, books, copies)
+        _bump(self._decades, decade(year), books, copies)
+        _bump(self._author_totals, author_id, books, copies)
+        _bump(self._genre_authors.setdefault(genre, {}), author_id, books, copies)
+        if not self._genre_authors[genre]:
+            del self._genre_authors[genre]
+
+    # ---------- READS ----------
+    def facets(self, genre=None, year_from=None, year_to=None, author_id=None, author_prefix=None,
+               book_ids=None, top=10):
+        # Same filters as /books; book_ids narrows to a search's matches.
+        # Unfiltered counts are the running totals; filtered ones add up
+        # only the cells (or books) the filters select.
+        with self._lock:
+            if (genre is None and year_from is None and year_to is None and author_id is None
+                    and not author_prefix and book_ids is None):
+                return self._result(self._total, self._genres, self._decades, self._author_totals, top)
+
+            def year_ok(year):
+                if year_from is not None and (year is None or year < year_from):
+                    return False
+                return year_to is None or (year is not None and year <= year_to)
+
+            authors = None
+            if author_id is not None:
+                authors = {author_id}
+            elif author_prefix:
+                prefix = author_prefix.lower()
+                authors = {a for a, (_, last) in self._authors.items() if last and last.lower().startswith(prefix)}
+
+            total, genres, decades, by_author = [0, 0], {}, {}, {}
+
+            def add(g, year, a, books, copies):
+                total[0] += books
+                total[1] += copies
+                _bump(genres, g, books, copies)
+                _bump(decades, decade(year), books, copies)
+                _bump(by_author, a, books, copies)
+
+            if book_ids is not None:
+                for book_id in book_ids:
+                    book = self._books.get(book_id)
+                    if book is None:
+                        continue
+                    g, year, a, copies = book
+                    if (genre is None or g == genre) and year_ok(year) and (authors is None or a in authors):
+                        add(g, year, a, 1, copies)
+            elif authors is not None:
+                for a in authors:
+                    for (g, year), (books, copies) in self._by_author.get(a, {}).items():
+                        if (genre is None or g == genre) and year_ok(year):
+                            add(g, year, a, books, copies)
+            else:
+                return self._cell_facets(genre, year_from, year_to, year_ok, top)
+
+            return self._result(total, genres, decades, by_author, top)
+
+    def _cell_facets(self, genre, year_from, year_to, year_ok, top):
+        # Genre and year filters select whole cells: totals come from the
+        # cells alone, authors from the genre's running counts less what the
+        # year range leaves out, or from the selected cells when fewer
+        total, genres, decades = [0, 0], {}, {}
+        selected, excluded = [], []
+        for key, (books, copies) in self._cells.items():
+            if genre is not None and key[0] != genre:
+                continue
+            if not year_ok(key[1]):
+                excluded.append(key)
+                continue
+            selected.append(key)
+            total[0] += books
+            total[1] += copies
+            _bump(genres, key[0], books, copies)
+            _bump(decades, decade(key[1]), books, copies)
+
+        base = self._author_totals if genre is None else self._genre_authors.get(genre, {})
+        if not top or (year_from is None and year_to is None):
+            by_author = base
+        elif len(selected) <= len(excluded):
+            by_author = {}
+            for key in selected:
+                for a, (books, copies) in self._cell_authors[key].items():
+                    _bump(by_author, a, books, copies)
+        else:
+            by_author = {a: list(pair) for a, pair in base.items()}
+            for key in excluded:
+                for a, (books, copies) in self._cell_authors[key].items():
+                    _bump(by_author, a, -books, -copies)
+        return self._result(total, genres, decades, by_author, top)
+
+    def _author_name(self, author_id):
+        # CONCAT(first_name,' ',last_name), as the book listings show it
+        first, last = self._authors.get(author_id, (None, None))
+        return None if first is None or last is None else f"{first} {last}"
+
+    def _result(self, total, genres, decades, by_author, top):
+        authors = heapq.nsmallest(top, by_author.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return {
+            "books": total[0],
+            "available_copies": total[1],
+            "genres": [
+                {"genre": g, "books": b, "available_copies": c}
+                for g, (b, c) in sorted(genres.items(), key=lambda kv: (-kv[1][0], str(kv[0])))
+            ],
+            "decades": [
+                {"decade": d, "books": b, "available_copies": c}
+                for d, (b, c) in sorted(decades.items(), key=lambda kv: (kv[0] is not None, kv[0] or 0))
+            ],
+            "authors": [
+                {"author_id": a, "author": self._author_name(a), "books": b, "available_copies": c}
+                for a, (b, c) in authors
+            ],
+        }
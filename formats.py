@@ -0,0 +1,57 @@
+# ==================================================
+# BINARY + COLUMNAR FORMATS
+# MessagePack (only when the optional `msgpack` package is
+# installed) and a column-oriented JSON layout. List routes
+# hand over cursor tuples plus column names, so neither
+# format needs a dict per row.
+# ==================================================
+
+import datetime
+import decimal
+
+try:
+    import msgpack   # optional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+MIMETYPES = {
+    "json": "application/json",
+    "xml": "application/xml",
+    "msgpack": "application/x-msgpack",
+    "columnar": "application/vnd.library.columnar+json",
+}
+
+# Formats that send lists as a header plus row / column arrays
+TABULAR = ("msgpack", "columnar")
+
+
+def available(fmt):
+    return fmt != "msgpack" or msgpack is not None
+
+
+def _default(value):
+    # Types msgpack has no native encoding for
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)    # the DB stores UTC
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"cannot serialize {type(value).__name__}")
+
+
+def pack(obj):
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def table(columns, rows, root, meta=None, layout="rows"):
+    # "rows": {"columns": [...], root: [[v, ...], ...]}
+    # "columns": {"columns": [...], root: {column: [v, ...]}}
+    if layout == "columns":
+        arrays = zip(*rows) if rows else ([] for _ in columns)
+        body = dict(zip(columns, map(list, arrays)))
+    else:
+        body = rows
+    return {"columns": list(columns), root: body, **(meta or {})}
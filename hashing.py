@@ -0,0 +1,159 @@
+# ==================================================
+# PASSWORD HASHING
+# bcrypt runs on a bounded process pool so a login burst
+# doesn't pin the request workers.
+# ==================================================
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+class HashQueueFull(Exception):
+    """Raised when too many hash jobs are already queued or running."""
+
+
+class HashTimeout(HashQueueFull):
+    """Raised when a hash job doesn't finish within the timeout (pool saturated)."""
+
+
+# Module-level so the pool can pickle them
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def check_password(pw_hash, password):
+    return bcrypt.checkpw(password.encode("utf-8"), pw_hash.encode("utf-8"))
+
+
+def hash_rounds(pw_hash):
+    # "$2b$12$..." -> 12
+    try:
+        return int(pw_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+
+    def __init__(self, rounds=12, workers=2, max_queue=32, timeout=10):
+        self.rounds = rounds
+        self.workers = workers          # 0 runs bcrypt inline (dev / tests)
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._in_flight = 0
+        self._rejected = 0
+        self._timings = {"hash": [0, 0.0, 0.0], "check": [0, 0.0, 0.0]}  # count, total, max
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def _enter(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashQueueFull("Too many password checks in progress")
+        with self._lock:
+            self._in_flight += 1
+        return time.perf_counter()
+
+    def _leave(self, op, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._in_flight -= 1
+            t = self._timings[op]
+            t[0] += 1; t[1] += elapsed; t[2] = max(t[2], elapsed)
+        self._slots.release()
+
+    def _broken(self):
+        # A worker died; start a fresh pool on the next call
+        with self._lock:
+            self._executor = None
+
+    def _run(self, op, fn, *args):
+        start = self._enter()
+        try:
+            if not self.workers:
+                return fn(*args)
+            future = self._pool().submit(fn, *args)
+            try:
+                return future.result(self.timeout)
+            except FutureTimeout:
+                future.cancel()     # only helps while it's still queued
+                raise HashTimeout("Password check timed out") from None
+            except BrokenProcessPool:
+                self._broken()
+                raise
+        finally:
+            self._leave(op, start)
+
+    async def _run_async(self, op, fn, *args):
+        # Same slots and stats; the event loop awaits the pool instead of a thread blocking
+        start = self._enter()
+        try:
+            if not self.workers:
+                return fn(*args)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(self._pool().submit(fn, *args)), self.timeout)
+            except asyncio.TimeoutError:
+                raise HashTimeout("Password check timed out") from None
+            except BrokenProcessPool:
+                self._broken()
+                raise
+        finally:
+            self._leave(op, start)
+
+    def hash(self, password):
+        return self._run("hash", hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self._run("check", check_password, pw_hash, password)
+
+    async def hash_async(self, password):
+        return await self._run_async("hash", hash_password, password, self.rounds)
+
+    async def check_async(self, pw_hash, password):
+        return await self._run_async("check", check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        return hash_rounds(pw_hash) != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        with self._lock:
+            ops = {
+                op: {
+                    "count": count,
+                    "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+                    "max_ms": round(peak * 1000, 3),
+                }
+                for op, (count, total, peak) in self._timings.items()
+            }
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "max_queue": self.max_queue,
+                "rejected": self._rejected,
+                **ops,
+            }
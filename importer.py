@@ -0,0 +1,370 @@
+# ==================================================
+# BULK IMPORT
+# Stream-parses library.xml / library.json style files and
+# loads them in chunked executemany() transactions.
+# ==================================================
+
+import datetime
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from mysql.connector import Error
+
+BOOK_INSERT = """
+    INSERT INTO books
+    (title,author_id,genre,publish_year,available_copies,date_added,updated_at)
+    VALUES (%s,%s,%s,%s,%s,%s,UTC_TIMESTAMP())
+"""
+
+LOOKUP_BATCH = 500      # pairs / ids per author lookup query
+
+
+# ==================================================
+# READERS (constant memory)
+# ==================================================
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xml":
+        return "xml"
+    if ext in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return "json"
+
+
+def iter_xml(fp):
+    # Every direct child of the root element is one record:
+    # <library><book><title>..</title>..</book>..</library>
+    depth = 0
+    root = None
+    for event, el in ET.iterparse(fp, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if root is None:
+                root = el
+            continue
+        depth -= 1
+        if depth == 1:
+            yield {child.tag: child.text for child in el}
+            root.clear()    # drop parsed records so memory stays flat
+
+
+def iter_ndjson(fp):
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"invalid JSON: {e}")
+
+
+class _JSONStream:
+    # Minimal pull parser: decodes one value at a time from a growing buffer
+
+    def __init__(self, fp, chunk=1 << 16):
+        self.fp = fp
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, "" at end of input
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def take(self, ch):
+        found = self.peek()
+        if found != ch:
+            raise ValueError(f"expected {ch!r} but found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may be cut short
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def array(self):
+        self.take("[")
+        if self.peek() == "]":
+            self.take("]")
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.take(",")
+                continue
+            self.take("]")
+            return
+
+
+def iter_json(fp):
+    # Top-level array of records, or an object whose array values hold
+    # records ({"library_db": [...]} like read_data.py expects)
+    stream = _JSONStream(fp)
+    first = stream.peek()
+    if first == "[":
+        yield from stream.array()
+    elif first == "{":
+        stream.take("{")
+        while stream.peek() != "}":
+            stream.value()      # key
+            stream.take(":")
+            if stream.peek() == "[":
+                yield from stream.array()
+            else:
+                stream.value()
+            if stream.peek() == ",":
+                stream.take(",")
+        stream.take("}")
+    else:
+        raise ValueError("expected a JSON array or object")
+
+
+def iter_file(path, fmt=None):
+    fmt = fmt or detect_format(path)
+    if fmt == "xml":
+        with open(path, "rb") as fp:
+            yield from iter_xml(fp)
+    else:
+        with open(path, "r", encoding="utf-8") as fp:
+            yield from (iter_ndjson(fp) if fmt == "ndjson" else iter_json(fp))
+
+
+# ==================================================
+# VALIDATION
+# ==================================================
+
+def _int(value, field):
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} must be an integer")
+
+
+def split_name(name):
+    # "F. Scott Fitzgerald" -> ("F. Scott", "Fitzgerald")
+    first, _, last = name.strip().rpartition(" ")
+    return first.strip(), last.strip()
+
+
+def normalize(raw):
+    # Accepts the app's column names and the library.json ones (author/year/date)
+    if isinstance(raw, Exception):
+        raise ValueError(str(raw))
+    if not isinstance(raw, dict):
+        raise ValueError("record is not an object")
+
+    title = str(raw.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    if len(title) > 255:
+        raise ValueError("title is longer than 255 characters")
+
+    genre = raw.get("genre")
+    genre = str(genre).strip() if genre not in (None, "", "N/A") else None
+
+    copies = _int(raw.get("available_copies"), "available_copies")
+    if copies is not None and copies < 0:
+        raise ValueError("available_copies cannot be negative")
+
+    date_added = raw.get("date_added", raw.get("date"))
+    if date_added in (None, "", "N/A"):
+        date_added = None
+    else:
+        try:
+            date_added = datetime.date.fromisoformat(str(date_added).strip())
+        except ValueError:
+            raise ValueError("date_added must be YYYY-MM-DD")
+
+    row = {
+        "title": title,
+        "genre": genre,
+        "publish_year": _int(raw.get("publish_year", raw.get("year")), "publish_year"),
+        "available_copies": copies or 0,
+        "date_added": date_added,
+        "author_id": _int(raw.get("author_id"), "author_id"),
+        "author_name": None,
+    }
+    if row["author_id"] is None:
+        if raw.get("author"):
+            name = split_name(str(raw["author"]))
+        else:
+            name = (str(raw.get("first_name") or "").strip(), str(raw.get("last_name") or "").strip())
+        if not any(name):
+            raise ValueError("author or author_id is required")
+        row["author_name"] = name
+    return row
+
+
+# ==================================================
+# IMPORTER
+# ==================================================
+
+class CatalogImporter:
+
+    def __init__(self, db, chunk_size=1000, errors=None, on_chunk=None, progress=None):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.errors = errors            # file-like, gets one JSON line per rejected record
+        self.on_chunk = on_chunk        # called with the cursor before each commit
+        self.progress = progress        # called with the running report after each chunk
+
+        self.author_ids = {}            # (first, last) -> author_id
+        self.known_ids = set()          # author_ids confirmed to exist
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.authors_created = 0
+        self.chunks = 0
+        self.error_samples = []
+        self._start = None
+
+    def run(self, records):
+        self._start = time.perf_counter()
+        chunk = []
+        for n, raw in enumerate(records, 1):
+            self.read = n
+            try:
+                chunk.append((n, raw, normalize(raw)))
+            except ValueError as e:
+                self.reject(n, raw, e)
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+        if chunk:
+            self._flush(chunk)
+        return self.report()
+
+    def reject(self, n, raw, error):
+        self.rejected += 1
+        entry = {"record": n, "error": str(error), "row": raw if isinstance(raw, dict) else None}
+        if len(self.error_samples) < 20:
+            self.error_samples.append(entry)
+        if self.errors is not None:
+            self.errors.write(json.dumps(entry, default=str) + "\n")
+
+    def report(self):
+        elapsed = time.perf_counter() - self._start if self._start else 0.0
+        return {
+            "read": self.read,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "authors_created": self.authors_created,
+            "chunks": self.chunks,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(self.inserted / elapsed, 1) if elapsed else 0.0,
+            "error_samples": self.error_samples,
+        }
+
+    # ---------- CHUNK ----------
+    def _flush(self, chunk):
+        cur = self.db.cursor()
+        chunk = self._resolve_authors(cur, chunk)
+        # New authors are committed first so a bad book row can't undo them
+        self.db.commit()
+
+        params = [
+            (r["title"], r["author_id"], r["genre"], r["publish_year"],
+             r["available_copies"], r["date_added"])
+            for _, _, r in chunk
+        ]
+        if params:
+            try:
+                cur.executemany(BOOK_INSERT, params)
+                self.inserted += len(params)
+            except Error:
+                # Something in the batch is bad: redo it row by row to find it
+                self.db.rollback()
+                cur = self.db.cursor()
+                for (n, raw, _), p in zip(chunk, params):
+                    try:
+                        cur.execute(BOOK_INSERT, p)
+                        self.inserted += 1
+                    except Error as e:
+                        self.reject(n, raw, e)
+            if self.on_chunk:
+                self.on_chunk(cur)
+        self.db.commit()
+        self.chunks += 1
+        if self.progress:
+            self.progress(self.report())
+
+    def _resolve_authors(self, cur, chunk):
+        # Fills in author_id for every row; rows that can't be resolved are rejected
+        wanted_ids = {r["author_id"] for _, _, r in chunk if r["author_id"] is not None} - self.known_ids
+        for batch in _batches(sorted(wanted_ids), LOOKUP_BATCH):
+            cur.execute(
+                f"SELECT author_id FROM authors WHERE author_id IN ({','.join(['%s'] * len(batch))})",
+                batch,
+            )
+            self.known_ids.update(r[0] for r in cur.fetchall())
+
+        names = {r["author_name"] for _, _, r in chunk if r["author_name"]} - set(self.author_ids)
+        if names:
+            self._lookup_names(cur, names)
+            missing = [n for n in names if n not in self.author_ids]
+            if missing:
+                cur.executemany("INSERT INTO authors (first_name,last_name) VALUES (%s,%s)", missing)
+                self.authors_created += len(missing)
+                self._lookup_names(cur, missing)
+
+        resolved = []
+        for n, raw, r in chunk:
+            if r["author_name"]:
+                r["author_id"] = self.author_ids[r["author_name"]]
+            elif r["author_id"] not in self.known_ids:
+                self.reject(n, raw, f"author_id {r['author_id']} does not exist")
+                continue
+            resolved.append((n, raw, r))
+        return resolved
+
+    def _lookup_names(self, cur, names):
+        for batch in _batches(sorted(names), LOOKUP_BATCH):
+            cur.execute(
+                "SELECT author_id, first_name, last_name FROM authors WHERE "
+                + " OR ".join(["(first_name=%s AND last_name=%s)"] * len(batch))
+                + " ORDER BY author_id",
+                [v for name in batch for v in name],
+            )
+            for author_id, first, last in cur.fetchall():
+                self.author_ids.setdefault((first or "", last or ""), author_id)
+                self.known_ids.add(author_id)
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,181 @@
+# ==================================================
+# METRICS
+# Histograms in the Prometheus text format, plus cursor /
+# connection proxies that time DB work per request.
+# ==================================================
+
+import bisect
+import threading
+import time
+
+# Seconds; roughly x2.5 steps from 0.5 ms to 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}       # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, counts in sorted(series.items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {running}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {running}"
+
+
+class Registry:
+
+    def __init__(self):
+        self._histograms = []
+        self._collectors = []
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        h = Histogram(name, help, labels, buckets)
+        self._histograms.append(h)
+        return h
+
+    def collector(self, fn):
+        # fn() -> [(name, "gauge" | "counter", help, value)], read at scrape time
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for h in self._histograms:
+            lines.extend(h.lines())
+        for fn in self._collectors:
+            for name, kind, help, value in fn():
+                if value is None:
+                    continue
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# ---------- DB TIMING ----------
+# record(stage, seconds, queries) is called after each operation
+
+class TimedCursor:
+
+    def __init__(self, cur, record):
+        self._cur = cur
+        self._record = record
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cur.execute(*args, **kwargs)
+        finally:
+            self._record("db_query", time.perf_counter() - start, 1)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cur.executemany(*args, **kwargs)
+        finally:
+            self._record("db_query", time.perf_counter() - start, 1)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return self._cur.fetchone()
+        finally:
+            self._record("db_fetch", time.perf_counter() - start, 0)
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cur.fetchmany(*args, **kwargs)
+        finally:
+            self._record("db_fetch", time.perf_counter() - start, 0)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return self._cur.fetchall()
+        finally:
+            self._record("db_fetch", time.perf_counter() - start, 0)
+
+    def __iter__(self):
+        # Only time spent pulling rows counts, not the caller's loop body
+        rows = iter(self._cur)
+        spent = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - start
+                yield row
+        finally:
+            self._record("db_fetch", spent, 0)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class TimedConnection:
+
+    def __init__(self, conn, record):
+        self._conn = conn
+        self._record = record
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._record)
+
+    def close(self):
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,156 @@
+# ==================================================
+# MIGRATIONS
+# Applies migrations/NNNN_name.py in order and records
+# each one in schema_migrations.
+# ==================================================
+
+import importlib
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+def discover():
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        m = MIGRATION_RE.match(filename)
+        if m:
+            module = importlib.import_module(f"migrations.{filename[:-3]}")
+            found.append((int(m.group(1)), m.group(2), module))
+    return found
+
+
+def applied_versions(db):
+    cur = db.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL
+    )""")
+    cur.execute("SELECT version FROM schema_migrations")
+    versions = {r[0] for r in cur.fetchall()}
+    db.commit()
+    return versions
+
+
+def upgrade(db, target=None, log=None):
+    # DDL commits implicitly in MySQL, so each migration is recorded
+    # as soon as it has run
+    done = applied_versions(db)
+    ran = []
+    for version, name, module in discover():
+        if version in done or (target is not None and version > target):
+            continue
+        cur = db.cursor()
+        module.up(cur)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, UTC_TIMESTAMP())",
+            (version, name),
+        )
+        db.commit()
+        ran.append(version)
+        if log:
+            log(f"applied {version:04d}_{name}")
+    return ran
+
+
+def downgrade(db, target, log=None):
+    # Reverts every applied migration newer than target
+    done = applied_versions(db)
+    ran = []
+    for version, name, module in reversed(discover()):
+        if version not in done or version <= target:
+            continue
+        cur = db.cursor()
+        module.down(cur)
+        cur.execute("DELETE FROM schema_migrations WHERE version=%s", (version,))
+        db.commit()
+        ran.append(version)
+        if log:
+            log(f"reverted {version:04d}_{name}")
+    return ran
+
+
+def status(db):
+    done = applied_versions(db)
+    return [
+        {"version": version, "name": name, "applied": version in done}
+        for version, name, _ in discover()
+    ]
+
+
+# ==================================================
+# INDEX CHECK
+# EXPLAINs the hot queries from app.py and verifies the
+# optimizer can use the index each one relies on.
+# ==================================================
+
+BOOKS_SELECT = """
+    SELECT b.book_id, b.title,
+    CONCAT(a.first_name,' ',a.last_name) AS author,
+    b.genre, b.publish_year, b.available_copies
+    FROM books b {join} authors a ON b.author_id=a.author_id
+"""
+# books_query() joins this way unless it filters by an author prefix
+BOOKS_CROSS = BOOKS_SELECT.format(join="CROSS JOIN")
+BOOKS_JOIN = BOOKS_SELECT.format(join="JOIN")
+
+HOT_QUERIES = [
+    # (label, sql, params, table alias, index)
+    ("books() genre filter",
+     BOOKS_CROSS + " WHERE b.genre = %s AND b.book_id > %s ORDER BY b.book_id ASC LIMIT 51",
+     ("Fiction", 0), "b", "idx_books_genre"),
+    ("books() publish_year range",
+     BOOKS_CROSS + " WHERE b.publish_year >= %s AND b.publish_year <= %s ORDER BY b.book_id ASC LIMIT 51",
+     (1900, 1950), "b", "idx_books_publish_year"),
+    ("books() sort=title",
+     BOOKS_CROSS + " WHERE (b.title >= %s AND (b.title > %s OR (b.title = %s AND b.book_id > %s)))"
+     " ORDER BY b.title ASC, b.book_id ASC LIMIT 51",
+     ("M", "M", "M", 0), "b", "idx_books_title"),
+    # SQLite's LIKE is case-insensitive, so only the NOCASE copy serves it there
+    ("books() author name prefix",
+     BOOKS_JOIN + " WHERE a.last_name LIKE %s ESCAPE '!' ORDER BY b.book_id ASC LIMIT 51",
+     ("Orw%",), "a", ("idx_authors_name", "idx_authors_last_name_nocase")),
+    ("search_books() index sync",
+     BOOKS_CROSS + " WHERE b.book_id = %s",
+     (1,), "b", "PRIMARY"),
+]
+
+
+# "SEARCH b USING INDEX idx_books_genre (genre=?)" -> table b, key idx_books_genre
+SQLITE_PLAN_RE = re.compile(r"^(?:SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?INDEX (\w+)|( USING INTEGER PRIMARY KEY))?")
+
+
+def explain(db, sql, params):
+    # MySQL EXPLAIN rows, or SQLite's query plan reshaped to look like them
+    cur = db.cursor(dictionary=True)
+    if getattr(db, "dialect", "mysql") != "sqlite":
+        cur.execute("EXPLAIN " + sql, params)
+        return cur.fetchall()
+    cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+    rows = []
+    for step in cur.fetchall():
+        m = SQLITE_PLAN_RE.match(step["detail"])
+        if m:
+            key = m.group(2) or ("PRIMARY" if m.group(3) else None)
+            rows.append({"table": m.group(1), "possible_keys": None, "key": key})
+    return rows
+
+
+def check_indexes(db):
+    # Returns one result per hot query; ok is False if no wanted index is usable
+    results = []
+    for label, sql, params, alias, index in HOT_QUERIES:
+        wanted = (index,) if isinstance(index, str) else index
+        usable = set()
+        for row in explain(db, sql, params):
+            if row.get("table") == alias:
+                usable.update(k for k in (row.get("possible_keys") or "").split(",") if k)
+                if row.get("key"):
+                    usable.add(row["key"])
+        results.append({"query": label, "index": " or ".join(wanted),
+                        "ok": any(i in usable for i in wanted), "usable": sorted(usable)})
+    return results
@@ -0,0 +1,36 @@
+# Original schema (what init_db() used to create).
+# IF NOT EXISTS so databases created by init_db() adopt it cleanly.
+
+
+def up(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100) UNIQUE,
+        password VARCHAR(255)
+    )""")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS authors (
+        author_id INT AUTO_INCREMENT PRIMARY KEY,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100)
+    )""")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS books (
+        book_id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(255),
+        author_id INT,
+        genre VARCHAR(100),
+        publish_year INT,
+        available_copies INT,
+        date_added DATE,
+        FOREIGN KEY (author_id) REFERENCES authors(author_id)
+    )""")
+
+
+def down(cur):
+    cur.execute("DROP TABLE IF EXISTS books")
+    cur.execute("DROP TABLE IF EXISTS authors")
+    cur.execute("DROP TABLE IF EXISTS users")
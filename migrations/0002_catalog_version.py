@@ -0,0 +1,24 @@
+# books.updated_at + the catalog_meta version counter used for ETags.
+
+from mysql.connector import Error
+
+
+def up(cur):
+    try:
+        cur.execute("ALTER TABLE books ADD COLUMN updated_at DATETIME")
+    except Error as e:
+        if e.errno != 1060:   # already added by the old init_db()
+            raise
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS catalog_meta (
+        id INT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at DATETIME NOT NULL
+    )""")
+    cur.execute("INSERT IGNORE INTO catalog_meta (id, version, updated_at) VALUES (1, 0, UTC_TIMESTAMP())")
+
+
+def down(cur):
+    cur.execute("DROP TABLE IF EXISTS catalog_meta")
+    cur.execute("ALTER TABLE books DROP COLUMN updated_at")
@@ -0,0 +1,22 @@
+# Secondary indexes for the hot catalog queries:
+#   /books?genre=         idx_books_genre (InnoDB appends book_id for the keyset)
+#   /books?year_from=     idx_books_publish_year, also sort=publish_year
+#   /books?sort=title     idx_books_title
+#   /books?author=<name>  idx_authors_name, also author lookups in the importer
+
+INDEXES = [
+    ("idx_books_genre", "books", "genre"),
+    ("idx_books_publish_year", "books", "publish_year"),
+    ("idx_books_title", "books", "title"),
+    ("idx_authors_name", "authors", "last_name, first_name"),
+]
+
+
+def up(cur):
+    for name, table, columns in INDEXES:
+        cur.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+def down(cur):
+    for name, table, _ in reversed(INDEXES):
+        cur.execute(f"DROP INDEX {name} ON {table}")
@@ -0,0 +1,36 @@
+# library.sqlite3 predates the authors table: books.author holds the
+# full name. Moves those names into authors and fills in author_id.
+# Databases created by 0001 have no author column and are left alone.
+
+from importer import split_name
+
+
+def columns(cur, table):
+    cur.execute(f"SELECT * FROM {table} WHERE 1=0")
+    cur.fetchall()
+    return [c[0] for c in cur.description]
+
+
+def up(cur):
+    cols = columns(cur, "books")
+    if "author" not in cols:
+        return
+    if "author_id" not in cols:
+        cur.execute("ALTER TABLE books ADD COLUMN author_id INT")
+
+    cur.execute("SELECT DISTINCT author FROM books WHERE author_id IS NULL AND author IS NOT NULL")
+    for (name,) in cur.fetchall():
+        first, last = split_name(name)
+        cur.execute("SELECT author_id FROM authors WHERE first_name=%s AND last_name=%s", (first, last))
+        found = cur.fetchall()
+        if found:
+            author_id = found[0][0]
+        else:
+            cur.execute("INSERT INTO authors (first_name, last_name) VALUES (%s, %s)", (first, last))
+            author_id = cur.lastrowid
+        cur.execute("UPDATE books SET author_id=%s WHERE author=%s AND author_id IS NULL", (author_id, name))
+
+
+def down(cur):
+    # The author column is kept, so there is nothing to undo
+    pass
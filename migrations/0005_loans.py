@@ -0,0 +1,34 @@
+# Loans behind /books/<id>/checkout and /loans/<id>/return, plus the
+# Idempotency-Key records that make retried checkouts / returns safe.
+# A book can't be deleted while it has loans; delete_book() clears the
+# returned ones first and refuses (409) while any are open.
+
+
+def up(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS loans (
+        loan_id INT AUTO_INCREMENT PRIMARY KEY,
+        book_id INT NOT NULL,
+        username VARCHAR(100) NOT NULL,
+        checked_out_at DATETIME NOT NULL,
+        returned_at DATETIME,
+        FOREIGN KEY (book_id) REFERENCES books(book_id) ON DELETE RESTRICT
+    )""")
+    cur.execute("CREATE INDEX idx_loans_user ON loans (username, returned_at)")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        username VARCHAR(100) NOT NULL,
+        idem_key VARCHAR(255) NOT NULL,
+        request_hash CHAR(64) NOT NULL,
+        status INT,
+        response TEXT,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (username, idem_key)
+    )""")
+    cur.execute("CREATE INDEX idx_idempotency_created ON idempotency_keys (created_at)")
+
+
+def down(cur):
+    cur.execute("DROP TABLE IF EXISTS idempotency_keys")
+    cur.execute("DROP TABLE IF EXISTS loans")
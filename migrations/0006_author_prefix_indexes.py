@@ -0,0 +1,22 @@
+# /books?author=<prefix> filters a.last_name LIKE 'Orw%' and joins to books.
+# SQLite only; MySQL already has both through InnoDB's foreign key index
+# on books.author_id and idx_authors_name under its _ci collation.
+#   idx_books_author               lets the join start from the matching authors
+#   idx_authors_last_name_nocase   SQLite's LIKE is case-insensitive and can
+#                                  only use a NOCASE index
+
+
+def sqlite(cur):
+    return getattr(cur, "dialect", "mysql") == "sqlite"
+
+
+def up(cur):
+    if sqlite(cur):
+        cur.execute("CREATE INDEX idx_books_author ON books (author_id)")
+        cur.execute("CREATE INDEX idx_authors_last_name_nocase ON authors (last_name COLLATE NOCASE)")
+
+
+def down(cur):
+    if sqlite(cur):
+        cur.execute("DROP INDEX idx_authors_last_name_nocase ON authors")
+        cur.execute("DROP INDEX idx_books_author ON books")
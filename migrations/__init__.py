@@ -0,0 +1,2 @@
+# Numbered schema migrations, applied in order by migrate.py.
+# Each NNNN_name.py module defines up(cur) and down(cur).
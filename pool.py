@@ -0,0 +1,183 @@
+# ==================================================
+# CONNECTION POOL
+# Keeps DB connections open between requests so routes
+# don't pay the TCP + auth handshake on every hit.
+# ==================================================
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the checkout timeout."""
+
+
+class PooledConnection:
+    # Proxy handed out by the pool: close() gives the connection back
+    # instead of disconnecting, everything else goes to the real connection.
+
+    def __init__(self, pool, conn, created):
+        self._pool = pool
+        self._conn = conn
+        self._created = created
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._conn, self._created)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, size=10, timeout=5.0, recycle=1800, ping=None):
+        self._connect = connect
+        self._ping = ping
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._opened = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._broken = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ---------- CHECKOUT ----------
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        entry = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"no database connection available after {self.timeout}s"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        # Health check / recycle / connect happen outside the lock
+        try:
+            if entry is not None:
+                conn, created = entry
+                if time.monotonic() - created > self.recycle:
+                    self._recycled += 1
+                    self._discard(conn)
+                    entry = None
+                elif not self._healthy(conn):
+                    self._broken += 1
+                    self._discard(conn)
+                    entry = None
+
+            if entry is None:
+                conn, created = self._connect(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        return PooledConnection(self, conn, created)
+
+    def _healthy(self, conn):
+        if self._ping is None:
+            return True
+        try:
+            return self._ping(conn) is not False
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ---------- RETURN ----------
+    def _release(self, conn, created):
+        try:
+            # Never hand an open transaction to the next request
+            if getattr(conn, "in_transaction", False):
+                conn.rollback()
+        except Exception:
+            self._broken += 1
+            self._discard(conn)
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append((conn, created))
+            self._in_use -= 1
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._opened -= 1
+                self._discard(conn)
+
+    # ---------- STATS ----------
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "broken": self._broken,
+                "wait_ms_avg": round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+            }
@@ -0,0 +1,155 @@
+# ==================================================
+# SAMPLING PROFILER
+# One background thread samples the stacks of the request
+# threads being profiled and writes them as collapsed stacks
+# ("a;b;c 12" lines) that flamegraph.pl / speedscope read.
+# ==================================================
+
+import os
+import re
+import sys
+import threading
+import time
+
+
+class Profile:
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.samples = 0
+        self.stacks = {}        # "frame;frame;frame" -> samples
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Sampler:
+
+    def __init__(self, interval=0.005, max_depth=128, max_concurrent=4):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_concurrent = max_concurrent    # caps how many requests pay for sampling
+
+        self._targets = {}      # thread id -> Profile
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self.profiles = 0
+        self.skipped = 0        # wanted a profile but hit max_concurrent
+        self.samples = 0
+        self.sampling_seconds = 0.0     # time the sampler itself spent walking stacks
+        self.profiled_seconds = 0.0     # wall time of the profiled requests
+
+    def start(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            if len(self._targets) >= self.max_concurrent:
+                self.skipped += 1
+                return None
+            profile = self._targets[thread_id] = Profile(thread_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return profile
+
+    def stop(self, profile):
+        with self._lock:
+            self._targets.pop(profile.thread_id, None)
+            profile.seconds = time.perf_counter() - profile.started
+            self.profiles += 1
+            self.profiled_seconds += profile.seconds
+        return profile
+
+    def _stack(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = list(self._targets.values())
+            if not targets:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            start = time.perf_counter()
+            frames = sys._current_frames()
+            taken = []
+            for profile in targets:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    taken.append((profile, self._stack(frame)))
+            del frames
+            spent = time.perf_counter() - start
+            with self._lock:
+                # Only profiles not stopped meanwhile: a stopped one is
+                # being written out by its request thread
+                for profile, stack in taken:
+                    if self._targets.get(profile.thread_id) is profile:
+                        profile.stacks[stack] = profile.stacks.get(stack, 0) + 1
+                        profile.samples += 1
+                self.samples += len(targets)
+                self.sampling_seconds += spent
+            time.sleep(self.interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval_ms": self.interval * 1000,
+                "active": len(self._targets),
+                "max_concurrent": self.max_concurrent,
+                "profiles": self.profiles,
+                "skipped": self.skipped,
+                "samples": self.samples,
+                "sampling_ms": round(self.sampling_seconds * 1000, 3),
+                "avg_sample_us": round(self.sampling_seconds / self.samples * 1e6, 1) if self.samples else 0.0,
+                # Share of the profiled requests' wall time the sampler held the GIL
+                "overhead_ratio": round(self.sampling_seconds / self.profiled_seconds, 4) if self.profiled_seconds else 0.0,
+            }
+
+
+class ProfileStore:
+    # Writes one .folded file per profile, keeping the newest `keep`
+
+    def __init__(self, directory, keep=200):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def save(self, profile, method, route):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = "%s-%06d-%s-%s-%dms.folded" % (
+            time.strftime("%Y%m%dT%H%M%S"), profile.thread_id % 1000000,
+            method, slug, round(profile.seconds * 1000),
+        )
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(profile.collapsed())
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        with self._lock:
+            files = sorted(f for f in os.listdir(self.directory) if f.endswith(".folded"))
+            for name in files[:max(0, len(files) - self.keep)]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def files(self):
+        return sorted(f for f in os.listdir(self.directory) if f.endswith(".folded"))
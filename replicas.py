@@ -0,0 +1,169 @@
+# ==================================================
+# READ REPLICAS
+# Spreads read-only routes over replica backends and falls
+# back to the primary when a replica lags, fails its health
+# check or can't hand out a connection.
+# ==================================================
+
+import itertools
+import threading
+import time
+
+LATENCY_ALPHA = 0.2     # weight of the newest sample in the latency EWMA
+
+
+class Replica:
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self.healthy = True         # optimistic until the first check
+        self.lag = None             # seconds behind the primary
+        self.latency = None         # EWMA of checkout + check time (seconds)
+        self.reads = 0
+        self.errors = 0
+
+    def observe(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_ALPHA * (seconds - self.latency)
+
+
+class ReplicaRouter:
+
+    def __init__(self, primary, replicas, strategy="round_robin", max_lag=5, check_interval=10):
+        if strategy not in ("round_robin", "least_latency"):
+            raise ValueError(f"unknown replica strategy {strategy!r}")
+        self.primary = primary
+        self.replicas = [Replica(name, backend) for name, backend in replicas]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._checked = None
+        self._last_write = None
+        self._user_writes = {}      # user -> monotonic time their reads stay on the primary until
+        self.fallbacks = 0          # reads that wanted a replica but got the primary
+
+    # ---------- WRITES ----------
+    def note_write(self, user=None, hold=0):
+        # user: who wrote; their reads stay on the primary for hold seconds
+        now = time.monotonic()
+        self._last_write = now
+        if user is None:
+            return
+        with self._lock:
+            self._user_writes[user] = now + hold
+            if len(self._user_writes) > 1024:
+                self._user_writes = {u: t for u, t in self._user_writes.items() if t > now}
+
+    def user_wrote_recently(self, user):
+        until = self._user_writes.get(user) if user is not None else None
+        return until is not None and time.monotonic() < until
+
+    def recent_write(self):
+        # True while replicas may still be missing this process's last write
+        last = self._last_write
+        return last is not None and time.monotonic() - last < self.max_lag
+
+    # ---------- READS ----------
+    def acquire(self):
+        # Returns (connection, replica), replica is None for the primary
+        for replica in self.candidates():
+            start = time.perf_counter()
+            try:
+                conn = replica.backend.acquire()
+            except Exception:
+                self.read_failed(replica)
+                continue
+            self.read_ok(replica, time.perf_counter() - start)
+            return conn, replica
+
+        self.fell_back()
+        return self.primary.acquire(), None
+
+    # For callers that reach replicas through other connections (asgi.py's
+    # async pools): try candidates() in order, report each outcome, and
+    # fell_back() when none was usable
+    def candidates(self):
+        self._maybe_check()
+        return self._candidates()
+
+    def read_ok(self, replica, seconds):
+        with self._lock:
+            replica.observe(seconds)
+            replica.reads += 1
+
+    def read_failed(self, replica):
+        with self._lock:
+            replica.healthy = False     # until the next check
+            replica.errors += 1
+
+    def fell_back(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def _candidates(self):
+        live = [r for r in self.replicas if r.healthy]
+        if not live:
+            return []
+        if self.strategy == "least_latency":
+            return sorted(live, key=lambda r: r.latency or 0.0)
+        start = next(self._rr) % len(live)
+        return live[start:] + live[:start]
+
+    # ---------- HEALTH ----------
+    def _maybe_check(self):
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return
+        # One request runs the check, the rest carry on with the last result
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked = now
+            self.check()
+        finally:
+            self._check_lock.release()
+
+    def check(self):
+        for replica in self.replicas:
+            start = time.perf_counter()
+            try:
+                with replica.backend.acquire() as conn:
+                    lag = replica.backend.replica_lag(conn)
+            except Exception:
+                with self._lock:
+                    replica.healthy = False
+                    replica.lag = None
+                    replica.errors += 1
+                continue
+            with self._lock:
+                replica.observe(time.perf_counter() - start)
+                replica.lag = lag
+                replica.healthy = lag is not None and lag <= self.max_lag
+
+    # ---------- STATS ----------
+    def stats(self):
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "max_lag": self.max_lag,
+                "fallbacks": self.fallbacks,
+                "replicas": [
+                    {
+                        "name": r.name,
+                        "healthy": r.healthy,
+                        "lag": r.lag,
+                        "latency_ms": round(r.latency * 1000, 3) if r.latency is not None else None,
+                        "reads": r.reads,
+                        "errors": r.errors,
+                        **r.backend.stats(),
+                    }
+                    for r in self.replicas
+                ],
+            }
@@ -0,0 +1,174 @@
+# ==================================================
+# SEARCH INDEX
+# In-process inverted index over title, genre and author
+# name. Kept in sync by the write routes in app.py; version
+# says which catalog_meta.version it matches.
+# ==================================================
+
+import bisect
+import heapq
+import math
+import re
+import threading
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Title hits rank above author hits, author above genre
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "genre": 1.0}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text or "").lower())
+
+
+class SearchIndex:
+
+    def __init__(self, fields=FIELD_WEIGHTS, max_expansions=50, min_prefix=2):
+        self.fields = fields
+        self.max_expansions = max_expansions    # terms a prefix may expand to
+        self.min_prefix = min_prefix            # shorter tokens only match exactly
+        self.loaded = False
+        self.version = None         # catalog_meta.version the index matches
+
+        self._lock = threading.RLock()
+        self._docs = {}        # book_id -> row
+        self._doc_terms = {}   # book_id -> {term: weight}
+        self._postings = {}    # term -> {book_id: weight}
+        self._vocab = []       # sorted terms, for prefix lookups
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ---------- WRITES ----------
+    def load(self, rows, version=None):
+        with self._lock:
+            self._docs.clear(); self._doc_terms.clear(); self._postings.clear()
+            for row in rows:
+                self._index(row)
+            self._vocab = sorted(self._postings)
+            self.version = version
+            self.loaded = True
+
+    def set_version(self, version, updated_at=None):
+        with self._lock:
+            self.version = version
+
+    def add(self, row):
+        # Also used for updates: the previous version is dropped first
+        with self._lock:
+            gone = set(self._unindex(row["book_id"]))
+            new = set(self._index(row))
+            for term in gone - new:
+                self._drop_term(term)
+            for term in new - gone:
+                bisect.insort(self._vocab, term)
+
+    def remove(self, book_id):
+        with self._lock:
+            for term in self._unindex(book_id):
+                self._drop_term(term)
+
+    def _drop_term(self, term):
+        i = bisect.bisect_left(self._vocab, term)
+        if i < len(self._vocab) and self._vocab[i] == term:
+            del self._vocab[i]
+
+    def _index(self, row):
+        # Returns terms that did not exist before
+        weights = {}
+        for field, weight in self.fields.items():
+            for term in tokenize(row.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+
+        new_terms = []
+        book_id = row["book_id"]
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                new_terms.append(term)
+            postings[book_id] = weight
+        self._docs[book_id] = row
+        self._doc_terms[book_id] = weights
+        return new_terms
+
+    def _unindex(self, book_id):
+        # Returns terms that no longer have any postings
+        self._docs.pop(book_id, None)
+        gone = []
+        for term in self._doc_terms.pop(book_id, {}):
+            postings = self._postings[term]
+            del postings[book_id]
+            if not postings:
+                del self._postings[term]
+                gone.append(term)
+        return gone
+
+    # ---------- READS ----------
+    def _expand(self, token):
+        # Exact term plus up to max_expansions terms it prefixes
+        if len(token) < self.min_prefix:
+            return [token] if token in self._postings else []
+        terms = []
+        i = bisect.bisect_left(self._vocab, token)
+        while i < len(self._vocab) and len(terms) < self.max_expansions:
+            term = self._vocab[i]
+            if not term.startswith(token):
+                break
+            terms.append(term)
+            i += 1
+        return terms
+
+    def _scores(self, query):
+        # {book_id: score} for books matching every query token
+        # (exactly or as a prefix). Caller holds the lock.
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return {}
+
+        n_docs = len(self._docs) or 1
+        per_token = []
+        for token in tokens:
+            terms = self._expand(token)
+            if not terms:
+                return {}
+            size = sum(len(self._postings[t]) for t in terms)
+            per_token.append((size, token, terms))
+
+        # Start from the rarest token so later ones only score candidates
+        per_token.sort()
+        scores = None
+        for _, token, terms in per_token:
+            matched = {}
+            for term in terms:
+                postings = self._postings[term]
+                idf = math.log(1 + n_docs / len(postings))
+                boost = 1.0 if term == token else 0.5
+                if scores is None:
+                    items = postings.items()
+                else:
+                    items = ((b, postings[b]) for b in scores if b in postings)
+                for book_id, weight in items:
+                    score = weight * idf * boost
+                    if score > matched.get(book_id, 0.0):
+                        matched[book_id] = score
+            if scores is None:
+                scores = matched
+            else:
+                scores = {b: scores[b] + s for b, s in matched.items()}
+            if not scores:
+                return {}
+        return scores
+
+    def search(self, query, limit=50, offset=0):
+        # Returns (rows with a "score" key, total matches)
+        with self._lock:
+            scores = self._scores(query)
+            top = heapq.nlargest(offset + limit, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+            rows = [dict(self._docs[b], score=round(s, 4)) for b, s in top[offset:]]
+            return rows, len(scores)
+
+    def matches(self, query):
+        # Ids of every matching book, unranked
+        with self._lock:
+            return set(self._scores(query))
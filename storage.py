@@ -0,0 +1,316 @@
+# ==================================================
+# STORAGE BACKENDS
+# The routes write MySQL-dialect SQL against DB-API
+# connections. A backend hands those connections out:
+# MySQL through the pool, SQLite (embedded, no server)
+# through a small per-thread connection cache.
+# ==================================================
+
+import datetime
+import functools
+import re
+import sqlite3
+import threading
+import weakref
+
+import mysql.connector
+from mysql.connector import errors
+
+from pool import ConnectionPool, PooledConnection
+
+
+class MySQLBackend:
+    dialect = "mysql"
+
+    def __init__(self, config, size=10, timeout=5.0, recycle=1800):
+        self.config = config
+        self.pool = ConnectionPool(
+            self.connect, size=size, timeout=timeout, recycle=recycle,
+            ping=lambda conn: conn.ping(reconnect=False),
+        )
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    def replica_lag(self, conn):
+        # Seconds behind the source; None if replication is stopped.
+        # No status row means this isn't a classic replica (group member, proxy).
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("SHOW REPLICA STATUS")
+        except errors.Error:
+            cur.execute("SHOW SLAVE STATUS")    # MySQL < 8.0.22
+        rows = cur.fetchall()
+        if not rows:
+            return 0
+        return rows[0].get("Seconds_Behind_Source", rows[0].get("Seconds_Behind_Master"))
+
+    def close(self):
+        self.pool.close()
+
+    def stats(self):
+        return {"backend": self.dialect, **self.pool.stats()}
+
+
+# ---------- SQLITE ----------
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",      # readers never block the writer
+    "synchronous": "NORMAL",    # fsync at checkpoints only (safe with WAL)
+    "foreign_keys": "ON",       # same FK behaviour as InnoDB
+    "busy_timeout": 5000,       # ms to wait for the write lock
+    "cache_size": -16000,       # KiB of page cache per connection
+    "temp_store": "MEMORY",
+    "mmap_size": 134217728,     # 128 MiB of memory-mapped reads
+}
+
+# MySQL-only syntax the app and migrations use -> SQLite
+_REWRITES = [
+    (re.compile(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bINSERT IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bDROP INDEX (\w+) ON \w+", re.I), r"DROP INDEX \1"),
+    (re.compile(r"\s+FOR UPDATE\b", re.I), ""),    # writes lock the whole file anyway
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql):
+    for pattern, repl in _REWRITES:
+        sql = pattern.sub(repl, sql)
+    return sql.replace("%s", "?")
+
+
+def _concat(*args):
+    # MySQL CONCAT() is NULL if any argument is
+    if any(a is None for a in args):
+        return None
+    return "".join(str(a) for a in args)
+
+
+def _utc_timestamp():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _converter(parse):
+    def convert(raw):
+        try:
+            return parse(raw.decode())
+        except ValueError:
+            return raw.decode()
+    return convert
+
+
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", _converter(datetime.date.fromisoformat))
+sqlite3.register_converter("DATETIME", _converter(datetime.datetime.fromisoformat))
+
+
+def _error(e):
+    # sqlite3 errors -> mysql.connector errors with the MySQL errno,
+    # so the routes' "except Error" / e.errno checks work unchanged
+    msg = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        if msg.startswith("UNIQUE") or msg.startswith("PRIMARY KEY"):
+            return errors.IntegrityError(msg=msg, errno=1062)
+        if msg.startswith("NOT NULL"):
+            return errors.IntegrityError(msg=msg, errno=1048)
+        return errors.IntegrityError(msg=msg, errno=1452)
+    if msg.startswith("duplicate column name"):
+        return errors.ProgrammingError(msg=msg, errno=1060)
+    if msg.startswith("no such table"):
+        return errors.ProgrammingError(msg=msg, errno=1146)
+    if msg.startswith("no such column"):
+        return errors.ProgrammingError(msg=msg, errno=1054)
+    if msg.startswith("database is locked"):
+        return errors.OperationalError(msg=msg, errno=1205)
+    if isinstance(e, sqlite3.OperationalError):
+        return errors.OperationalError(msg=msg)
+    return errors.DatabaseError(msg=msg)
+
+
+def _dict_row(cur, row):
+    return dict(zip([c[0] for c in cur.description], row))
+
+
+class SQLiteCursor:
+    # mysql.connector cursor surface over sqlite3.Cursor
+    dialect = "sqlite"      # lets migrations tell the backends apart
+
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cur = conn.raw.cursor()
+        if dictionary:
+            self._cur.row_factory = _dict_row
+
+    def execute(self, sql, params=()):
+        self._conn.begin()
+        try:
+            self._cur.execute(translate(sql), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def executemany(self, sql, seq_params):
+        self._conn.begin()
+        try:
+            self._cur.executemany(translate(sql), [tuple(p) for p in seq_params])
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cur.fetchmany(size)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def close(self):
+        self._cur.close()
+
+
+class SQLiteConnection:
+    # Like MySQL with autocommit off: the first statement opens a
+    # transaction that lasts until commit() / rollback()
+    dialect = "sqlite"
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def begin(self):
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN")
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self, dictionary)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1")
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLiteBackend:
+    dialect = "sqlite"
+
+    def __init__(self, path, pragmas=None, timeout=5.0, max_idle=2):
+        self.path = path
+        self.pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+        self.timeout = timeout
+        self.max_idle = max_idle        # idle connections kept per thread
+
+        self._local = threading.local()
+        self._open = weakref.WeakSet()  # dies with its thread's cache
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._reused = 0
+
+    def connect(self):
+        raw = sqlite3.connect(
+            self.path, timeout=self.timeout, isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+        )
+        for name, value in self.pragmas.items():
+            raw.execute(f"PRAGMA {name}={value}")
+        raw.create_function("CONCAT", -1, _concat, deterministic=True)
+        raw.create_function("UTC_TIMESTAMP", 0, _utc_timestamp)
+        raw.create_function("NOW", 0, _now)
+        conn = SQLiteConnection(raw)
+        with self._lock:
+            self._open.add(conn)
+        return conn
+
+    def _idle(self):
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def acquire(self):
+        idle = self._idle()
+        conn = idle.pop() if idle else None
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            if conn is not None:
+                self._reused += 1
+        if conn is None:
+            try:
+                conn = self.connect()
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._in_use -= 1
+                raise _error(e) from e
+        return PooledConnection(self, conn, None)
+
+    def _release(self, conn, created):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        idle = self._idle()
+        if len(idle) < self.max_idle:
+            idle.append(conn)
+        else:
+            conn.close()
+
+    def replica_lag(self, conn):
+        # A copy of the file (e.g. shipped by Litestream) has no lag to report
+        return 0
+
+    def close(self):
+        # Closes the calling thread's idle connections
+        idle = self._idle()
+        while idle:
+            idle.pop().close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.dialect,
+                "path": self.path,
+                "open": len(self._open),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "reused": self._reused,
+                "pragmas": self.pragmas,
+            }
@@ -0,0 +1,272 @@
+# ==================================================
+# SUGGEST INDEX
+# Type-ahead over book titles and author names. One sorted
+# array holds every normalized name plus its later word
+# suffixes; a prefix is a bisect range of it. Ranges larger
+# than scan_limit keep their top-k, merged from their
+# children's, so no lookup ranks more than scan_limit entries.
+# app.py applies catalog writes through catalog_changed(); version
+# says which catalog_meta.version the index matches.
+# ==================================================
+
+import bisect
+import threading
+import unicodedata
+
+from search_index import tokenize
+
+# Word positions a name is also found by ("storm" finds "The Storm of Stone")
+MAX_SUFFIXES = 6
+STOPWORDS = frozenset({"a", "an", "and", "of", "the", "in", "on", "to", "for"})
+TAIL_BOOST = 0.5        # matching a later word counts half
+_END = "\U0010ffff"     # sorts after any text that starts with the prefix
+
+
+def normalize(text):
+    # "Les Misérables!" -> "les miserables"
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return " ".join(tokenize("".join(c for c in text if not unicodedata.combining(c))))
+
+
+def suffixes(name):
+    words = name.split(" ")
+    texts = [name]
+    for i in range(1, len(words)):
+        if len(texts) >= MAX_SUFFIXES:
+            break
+        if words[i] not in STOPWORDS:
+            texts.append(" ".join(words[i:]))
+    return texts
+
+
+class Item:
+    __slots__ = ("kind", "id", "name", "label", "texts", "author_id")
+
+    def __init__(self, kind, id, label, author_id=None):
+        self.kind = kind
+        self.id = id
+        self.label = label
+        self.name = normalize(label)
+        self.texts = suffixes(self.name) if self.name else []
+        self.author_id = author_id
+
+
+class SuggestIndex:
+
+    def __init__(self, k=50, scan_limit=256):
+        self.k = k                      # most suggestions a lookup can return
+        self.scan_limit = scan_limit    # ranges this small are ranked directly
+        self.loaded = False
+        self.version = None     # catalog_meta.version the index matches
+
+        self._lock = threading.RLock()
+        self._entries = []      # sorted (text, kind, id)
+        self._items = {}        # (kind, id) -> Item
+        self._book_counts = {}  # author_id -> books
+        self._views = {}        # (kind, id) -> views; survives reloads
+        self._top = {}          # prefix -> [(-score, kind, id)], best first
+
+    def __len__(self):
+        return len(self._items)
+
+    # ---------- WRITES ----------
+    def load(self, authors, books, version=None):
+        # Same rows as CatalogSnapshot.load(): authors (author_id, first_name,
+        # last_name), books (book_id, title, author_id, ...)
+        items, counts = {}, {}
+        for row in authors:
+            items[("author", row[0])] = Item("author", row[0], self._author_label(row))
+        for row in books:
+            items[("book", row[0])] = Item("book", row[0], row[1] or "", row[2])
+            counts[row[2]] = counts.get(row[2], 0) + 1
+        entries = sorted((text, item.kind, item.id) for item in items.values() for text in item.texts)
+
+        with self._lock:
+            self._items, self._book_counts, self._entries = items, counts, entries
+            self._top = {}
+            self._range_top("", 0, len(entries))    # fills the top-k of every large prefix
+            self.version = version
+            self.loaded = True
+
+    def set_version(self, version, updated_at=None):
+        with self._lock:
+            self.version = version
+
+    @staticmethod
+    def _author_label(row):
+        return " ".join(part for part in row[1:3] if part)
+
+    def put_book(self, row):
+        with self._lock:
+            old = self._items.get(("book", row[0]))
+            if old is not None and old.label == (row[1] or "") and old.author_id == row[2]:
+                return      # e.g. only available_copies changed
+            self._replace(old, Item("book", row[0], row[1] or "", row[2]))
+            if old is None or old.author_id != row[2]:
+                if old is not None:
+                    self._count(old.author_id, -1)
+                self._count(row[2], 1)
+
+    def remove_book(self, book_id):
+        with self._lock:
+            old = self._items.get(("book", book_id))
+            if old is not None:
+                self._replace(old, None)
+                self._count(old.author_id, -1)
+
+    def put_author(self, row):
+        with self._lock:
+            self._replace(self._items.get(("author", row[0])), Item("author", row[0], self._author_label(row)))
+
+    def remove_author(self, author_id):
+        with self._lock:
+            self._replace(self._items.get(("author", author_id)), None)
+
+    def record_view(self, book_id):
+        # A detail view makes the book, and its author, rank higher
+        with self._lock:
+            book = self._items.get(("book", book_id))
+            if book is None:
+                return
+            for key in (("book", book_id), ("author", book.author_id)):
+                self._views[key] = self._views.get(key, 0) + 1
+                if key in self._items:
+                    item = self._items[key]
+                    self._raise(item, self._weight(item) - 1)
+
+    def _replace(self, old, new):
+        if old is not None:
+            del self._items[(old.kind, old.id)]
+            for text in old.texts:
+                del self._entries[bisect.bisect_left(self._entries, (text, old.kind, old.id))]
+            self._lower(old)
+        if new is not None:
+            self._items[(new.kind, new.id)] = new
+            for text in new.texts:
+                bisect.insort(self._entries, (text, new.kind, new.id))
+            self._raise(new)
+
+    def _count(self, author_id, delta):
+        self._book_counts[author_id] = self._book_counts.get(author_id, 0) + delta
+        author = self._items.get(("author", author_id))
+        if author is not None:
+            self._raise(author, self._weight(author) - 1) if delta > 0 else self._lower(author)
+
+    @staticmethod
+    def _prefixes(item):
+        return {text[:i] for text in item.texts for i in range(len(text) + 1)}
+
+    def _raise(self, item, old_weight=None):
+        # Weight went up from old_weight, or the item is new (None):
+        # fix the cached lists in place
+        weight = self._weight(item)
+        for prefix in self._prefixes(item):
+            top = self._top.get(prefix)
+            if top is None:
+                continue
+            boost = 1 if item.name.startswith(prefix) else TAIL_BOOST
+            entry = (-weight * boost, item.kind, item.id)
+            if len(top) == self.k and entry > top[-1]:
+                continue    # still below the cut, so it wasn't listed before either
+            if old_weight is not None:
+                old = (-old_weight * boost, item.kind, item.id)
+                i = bisect.bisect_left(top, old)
+                if i < len(top) and top[i] == old:
+                    del top[i]
+            bisect.insort(top, entry)
+            del top[self.k:]
+
+    def _lower(self, item):
+        # Score went down, or the item is gone: rebuild the lists it was in,
+        # longest prefix first so each merge finds its children's lists current
+        key = (item.kind, item.id)
+        stale = [p for p in self._prefixes(item) if any((e[1], e[2]) == key for e in self._top.get(p, ()))]
+        for prefix in stale:
+            del self._top[prefix]
+        for prefix in sorted(stale, key=len, reverse=True):
+            self._lookup(prefix)
+
+    # ---------- RANKING ----------
+    def _weight(self, item):
+        weight = 1 + self._views.get((item.kind, item.id), 0)
+        if item.kind == "author":
+            weight += self._book_counts.get(item.id, 0)
+        return weight
+
+    @staticmethod
+    def _score(item, text, weight):
+        return weight if text == item.name else weight * TAIL_BOOST
+
+    def _best(self, scored):
+        # Best k distinct items; an item found through several texts keeps its best
+        top, seen = [], set()
+        for entry in sorted(scored):
+            if (entry[1], entry[2]) not in seen:
+                seen.add((entry[1], entry[2]))
+                top.append(entry)
+                if len(top) == self.k:
+                    break
+        return top
+
+    def _rank(self, entries):
+        items = self._items
+        scored = []
+        for text, kind, id in entries:
+            item = items[(kind, id)]
+            scored.append((-self._score(item, text, self._weight(item)), kind, id))
+        return self._best(scored)
+
+    def _range_top(self, prefix, lo, hi):
+        if hi - lo <= self.scan_limit:
+            return self._rank(self._entries[lo:hi])
+        top = self._top.get(prefix)
+        if top is None:
+            entries, n = self._entries, len(prefix)
+            i = lo
+            while i < hi and len(entries[i][0]) == n:      # the prefix is the whole text
+                i += 1
+            candidates = self._rank(entries[lo:i])
+            while i < hi:
+                child = entries[i][0][:n + 1]
+                j = bisect.bisect_left(entries, (child + _END,), i, hi)
+                candidates += self._range_top(child, i, j)
+                i = j
+            top = self._top[prefix] = self._best(candidates)
+        return top
+
+    def _lookup(self, prefix):
+        lo = bisect.bisect_left(self._entries, (prefix,))
+        hi = bisect.bisect_left(self._entries, (prefix + _END,), lo)
+        return self._range_top(prefix, lo, hi)
+
+    # ---------- READS ----------
+    def suggest(self, prefix, limit=10):
+        # -> [{"kind", "id", "text", "author", "score"}], best first
+        query = normalize(prefix)
+        if query and prefix[-1:].isspace():
+            query += " "        # "war " should not match "warden"
+        if not query:
+            return []
+        with self._lock:
+            found = []
+            for neg_score, kind, id in self._lookup(query)[:limit]:
+                item = self._items[(kind, id)]
+                author = self._items.get(("author", item.author_id)) if kind == "book" else None
+                found.append({
+                    "kind": kind,
+                    "id": id,
+                    "text": item.label,
+                    "author": author.label if author else None,
+                    "score": round(-neg_score, 2),
+                })
+            return found
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "items": len(self._items),
+                "entries": len(self._entries),
+                "cached_prefixes": len(self._top),
+                "viewed": len(self._views),
+            }
@@ -0,0 +1,44 @@
+# A hash job that outlives HASH_TIMEOUT is answered like a full queue
+# (429 + Retry-After), not with a 500.
+
+import asyncio
+import random
+
+import pytest
+
+import app as library
+from bench.load import seed
+from hashing import HashTimeout, PasswordHasher
+
+
+@pytest.fixture
+def slow_hasher():
+    # The first job waits for a worker process to spawn, far longer than this
+    hasher = PasswordHasher(rounds=4, workers=1, timeout=0.001)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_timeout_raises_hash_timeout(slow_hasher):
+    with pytest.raises(HashTimeout):
+        slow_hasher.hash("secret")
+    assert slow_hasher.stats()["in_flight"] == 0
+
+
+def test_async_timeout_raises_hash_timeout(slow_hasher):
+    with pytest.raises(HashTimeout):
+        asyncio.run(slow_hasher.hash_async("secret"))
+    assert slow_hasher.stats()["in_flight"] == 0
+
+
+def test_login_timeout_is_busy(slow_hasher, tmp_path, monkeypatch):
+    path = str(tmp_path / "library.sqlite3")
+    seed(path, 1, 1, "u", "p", 4, random.Random(1))
+    monkeypatch.setitem(library.app.config, "DB_BACKEND", "sqlite")
+    monkeypatch.setitem(library.app.config, "SQLITE_PATH", path)
+    monkeypatch.setattr(library, "_storage", None)
+    monkeypatch.setattr(library, "_hasher", slow_hasher)
+
+    resp = library.app.test_client().post("/login", data={"username": "u", "password": "p"})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "1"
@@ -0,0 +1,151 @@
+# Concurrent checkouts of one title on SQLite, through the routes:
+# no copy is handed out twice, the count never goes below zero, and
+# copies on the shelf + open loans stay what the title started with.
+
+import random
+import threading
+import time
+
+import jwt
+import pytest
+
+import app as library
+from bench.load import seed
+from storage import SQLiteBackend
+
+BOOK = 1
+THREADS = 24
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    path = str(tmp_path / "library.sqlite3")
+    seed(path, 5, 20, "u", "p", 4, random.Random(1))
+    monkeypatch.setitem(library.app.config, "DB_BACKEND", "sqlite")
+    monkeypatch.setitem(library.app.config, "SQLITE_PATH", path)
+    monkeypatch.setitem(library.app.config, "CACHE_ENABLED", False)
+    monkeypatch.setitem(library.app.config, "CATALOG_SNAPSHOT", False)
+    monkeypatch.setattr(library, "_storage", None)
+    return SQLiteBackend(path)
+
+
+def query(backend, sql, params=()):
+    with backend.acquire() as db:
+        cur = db.cursor()
+        cur.execute(sql, params)
+        row = cur.fetchone()
+        db.commit()
+        return row[0]
+
+
+def set_copies(backend, copies):
+    with backend.acquire() as db:
+        db.cursor().execute("UPDATE books SET available_copies=%s WHERE book_id=%s", (copies, BOOK))
+        db.commit()
+
+
+def stock(backend):
+    # Shelf + open loans, read in one statement so both come from the same snapshot
+    return query(backend, """
+        SELECT available_copies + (SELECT COUNT(*) FROM loans WHERE book_id=%s AND returned_at IS NULL)
+        FROM books WHERE book_id=%s
+    """, (BOOK, BOOK))
+
+
+def headers(**extra):
+    token = jwt.encode({"user": "u", "exp": int(time.time()) + 600}, library.app.config["SECRET_KEY"],
+                       algorithm="HS256")
+    return {"Authorization": "Bearer " + token, **extra}
+
+
+def run_threads(fn):
+    # fn(client) in THREADS threads that start together; returns their results
+    results = [None] * THREADS
+    barrier = threading.Barrier(THREADS)
+
+    def run(i):
+        client = library.app.test_client()
+        barrier.wait()
+        results[i] = fn(client)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_checkout_hands_out_exactly_the_copies(catalog):
+    copies = THREADS // 3
+    set_copies(catalog, copies)
+
+    def checkout(client):
+        resp = client.post(f"/books/{BOOK}/checkout", headers=headers())
+        return resp.status_code, resp.get_json()
+
+    results = run_threads(checkout)
+    statuses = [status for status, _ in results]
+    assert statuses.count(201) == copies
+    assert statuses.count(409) == THREADS - copies
+    assert all(body["available_copies"] >= 0 for status, body in results if status == 201)
+    assert query(catalog, "SELECT available_copies FROM books WHERE book_id=%s", (BOOK,)) == 0
+    assert stock(catalog) == copies
+
+
+def test_checkout_and_return_keep_the_stock(catalog):
+    copies = 4
+    set_copies(catalog, copies)
+    seen, done = [], threading.Event()
+
+    def watch():
+        while not done.is_set():
+            seen.append((stock(catalog),
+                         query(catalog, "SELECT available_copies FROM books WHERE book_id=%s", (BOOK,))))
+
+    def churn(client):
+        # Counts checkout / return statuses and negative counts seen; an
+        # assert here would only end the thread
+        counts = {"negative": 0}
+        for _ in range(10):
+            resp = client.post(f"/books/{BOOK}/checkout", headers=headers())
+            counts[resp.status_code] = counts.get(resp.status_code, 0) + 1
+            if resp.status_code == 201:
+                loan = resp.get_json()
+                counts["negative"] += loan["available_copies"] < 0
+                resp = client.post(f"/loans/{loan['loan_id']}/return", headers=headers())
+                key = ("return", resp.status_code)
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        results = run_threads(churn)
+    finally:
+        done.set()
+        watcher.join()
+
+    checkouts = sum(r.get(201, 0) for r in results)
+    assert checkouts > 0
+    assert all(set(r) <= {"negative", 201, 409, ("return", 200)} for r in results)
+    assert sum(r.get(("return", 200), 0) for r in results) == checkouts
+    assert sum(r["negative"] for r in results) == 0
+    assert seen and all(total == copies and shelf >= 0 for total, shelf in seen)
+    assert stock(catalog) == copies
+    assert query(catalog, "SELECT available_copies FROM books WHERE book_id=%s", (BOOK,)) == copies
+
+
+def test_shared_idempotency_key_makes_one_loan(catalog):
+    copies = 5
+    set_copies(catalog, copies)
+
+    def checkout(client):
+        resp = client.post(f"/books/{BOOK}/checkout", headers=headers(**{"Idempotency-Key": "same-key"}))
+        return resp.status_code, resp.get_json()
+
+    results = run_threads(checkout)
+    assert {status for status, _ in results} == {201}
+    assert len({body["loan_id"] for _, body in results}) == 1
+    assert query(catalog, "SELECT COUNT(*) FROM loans WHERE book_id=%s", (BOOK,)) == 1
+    assert query(catalog, "SELECT available_copies FROM books WHERE book_id=%s", (BOOK,)) == copies - 1